@@ -1,16 +1,89 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from email.utils import formatdate, parsedate_to_datetime
+import asyncio
+import codecs
+import collections
+import csv
+import hashlib
+import io
+import json
+import secrets
+import time
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import sys, os
 
 # Add src folder to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from src.logic import UserOperations, CropsOperations, MarketOperations, WeatherOperations, NegotiationOperations
+from src.query import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, SELECTABLE_COLUMNS, select_columns, to_columns
+from src.compression import CompressionMiddleware
+from src.metrics import MetricsMiddleware, metrics
+from src.tracing import TracingMiddleware
+from src.cache import CACHE_BACKEND, async_redis_client, table_versions
+from src.events import broker, TOPICS, ROLES
+from src.sessions import sessions
+from src.db import warm_up
+from src.async_logic import (
+    AsyncUserOperations, AsyncCropsOperations, AsyncMarketOperations, AsyncWeatherOperations,
+    AsyncNegotiationOperations, AsyncDashboardOperations, AsyncMarketAnalyticsOperations,
+)
 
 # ======================
 # ===== APP SETUP ======
 # ======================
-app = FastAPI(title="Smart Farming Portal API", version="1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_up()
+    if CACHE_BACKEND == "redis":
+        # Other workers' events reach this worker's subscribers too
+        broker.relay_through_redis(asyncio.get_running_loop())
+    yield
+    if CACHE_BACKEND == "redis":
+        await async_redis_client().aclose()
+
+# JSON routes are annotated ``-> dict``: with a response model FastAPI
+# serializes straight to bytes in pydantic-core, which is faster than
+# json.dumps on the large row lists and needs no custom response class
+app = FastAPI(title="Smart Farming Portal API", version="1.0", lifespan=lifespan)
+
+# Tables changed by a successful write under each top-level path
+WRITE_TABLES = {
+    "users": ("users",),
+    "crops": ("crops",),
+    "market_prices": ("market_prices",),
+    "weather": ("weather",),
+    "negotiations": ("negotiations",),
+}
+
+class TableVersionMiddleware:
+    """Bump table versions when a write request succeeds.
+
+    The bump happens as the response starts, before the client can issue a
+    follow-up GET that would otherwise be answered from a stale ETag.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            return await self.app(scope, receive, send)
+        tables = WRITE_TABLES.get(scope["path"].strip("/").split("/", 1)[0])
+        if not tables:
+            return await self.app(scope, receive, send)
+
+        async def send_and_bump(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                await table_versions.bump(*tables)
+            await send(message)
+
+        await self.app(scope, receive, send_and_bump)
+
+app.add_middleware(TableVersionMiddleware)
+
+app.add_middleware(CompressionMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,14 +93,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Adds Server-Timing and logs slow and repeated queries per request
+app.add_middleware(TracingMiddleware)
+
+# Outermost, so the timings include compression and the other middleware
+app.add_middleware(MetricsMiddleware)
+
 # ======================
 # ===== OPERATIONS =====
 # ======================
-user_op = UserOperations()
-crop_op = CropsOperations()
-market_op = MarketOperations()
-weather_op = WeatherOperations()
-negotiation_op = NegotiationOperations()
+user_op = AsyncUserOperations()
+crop_op = AsyncCropsOperations()
+market_op = AsyncMarketOperations()
+weather_op = AsyncWeatherOperations()
+negotiation_op = AsyncNegotiationOperations()
+dashboard_op = AsyncDashboardOperations()
+analytics_op = AsyncMarketAnalyticsOperations()
 
 # ======================
 # ===== SCHEMAS ========
@@ -38,6 +119,10 @@ class UserCreate(BaseModel):
     password: str
     is_admin: bool = False
 
+class LoginRequest(BaseModel):
+    phone: str
+    password: str
+
 class UserUpdate(BaseModel):
     data: dict
 
@@ -80,103 +165,410 @@ class NegotiationCreate(BaseModel):
 
 class NegotiationUpdate(BaseModel):
     data: dict
+    # Version the client last read; the update fails with 409 if it changed since
+    version: int
 
 # ======================
-# ===== HOME ===========
+# ===== CONDITIONAL GET =
+# ======================
+async def _validators(request: Request, *tables):
+    """ETag/Last-Modified headers for a read of ``tables``, and whether the client copy is current.
+
+    The ETag is derived from the table versions and the full query, so an
+    unchanged resource is answered with 304 before touching the database.
+
+    Last-Modified has whole-second resolution, so it is only sent, and
+    If-Modified-Since only honoured, once the second of the last change
+    is over: a copy stamped with that second then includes every write
+    made in it, and any later write falls in a later second.
+    """
+    versions = await asyncio.gather(*(table_versions.get(table) for table in tables))
+    query = sorted(request.query_params.multi_items())
+    seed = "|".join(version for version, _ in versions) + f"|{request.url.path}?{query}"
+    etag = '"' + hashlib.sha256(seed.encode()).hexdigest()[:32] + '"'
+    last_modified = max(modified for _, modified in versions)
+    settled = int(last_modified) < int(time.time())
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if settled:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return headers, etag in tags or "*" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and settled:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return headers, False
+        return headers, int(last_modified) <= since
+    return headers, False
+
+# ======================
+# ===== RESPONSE FORMAT =
+# ======================
+def _shaped(result, fmt):
+    """``result`` with its row list turned into {column: [values]} for format=columnar.
+
+    Column names are sent once instead of once per row, which shrinks
+    long price and weather histories several times before compression.
+    """
+    if fmt != "columnar" or not isinstance(result.get("data"), list):
+        return result
+    return {**result, "data": to_columns(result["data"]), "format": "columnar"}
+
+# ======================
+# ===== PUSH EVENTS ====
+# ======================
+# Seconds between SSE comments that keep idle connections open through proxies
+EVENT_KEEPALIVE = float(os.getenv("EVENT_KEEPALIVE", "15"))
+
+def _sse(event):
+    data = json.dumps(event.data, default=str, separators=(",", ":"))
+    return f"id: {event.id}\nevent: {event.topic}\ndata: {data}\n\n"
+
+async def _event_stream(subscription):
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), EVENT_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield _sse(event)
+    finally:
+        # Runs when the client disconnects and the response is cancelled
+        broker.unsubscribe(subscription)
+
+# ======================
+# ===== BULK UPLOADS ===
+# ======================
+async def _csv_rows(request: Request):
+    """Yield dict rows from a streamed text/csv body, keyed by its header line.
+
+    A single ``csv.reader`` reads the whole body. Lines are handed to it one
+    record at a time: while a record has an odd number of quotes it is still
+    inside a quoted field, so it stays pending across lines and chunks.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    records = collections.deque()
+    reader = csv.reader(iter(records.popleft, None))
+    header, pending = None, ""
+
+    def parse(record):
+        nonlocal header
+        records.append(record)
+        values = next(reader)
+        if header is None:
+            header = [name.strip() for name in values]
+            return None
+        return dict(zip(header, values))
+
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        *lines, rest = pending.split("\n")
+        record, quotes = "", 0
+        for line in lines:
+            record += line + "\n"
+            quotes += line.count('"')
+            if quotes % 2:
+                continue
+            if record.strip() and (row := parse(record)) is not None:
+                yield row
+            record, quotes = "", 0
+        pending = record + rest
+    pending += decoder.decode(b"", final=True)
+    if pending.strip() and header is not None:
+        yield parse(pending)
+
+async def _bulk_rows(request: Request):
+    """Rows of a bulk upload: a streamed CSV body or a JSON array."""
+    if request.headers.get("content-type", "").startswith("text/csv"):
+        return _csv_rows(request)
+    try:
+        rows = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or text/csv")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or text/csv")
+    return rows
+
 # ======================
+# ===== SESSIONS =======
+# ======================
+def _bearer(authorization):
+    scheme, _, token = (authorization or "").partition(" ")
+    return token.strip() if scheme.lower() == "bearer" else None
+
+async def current_user(authorization: str = Header(None)):
+    """The caller's Identity from ``Authorization: Bearer <token>``; no database lookup."""
+    identity = await sessions.resolve(_bearer(authorization))
+    if identity is None:
+        raise HTTPException(status_code=401, detail="Not logged in or session expired", headers={"WWW-Authenticate": "Bearer"})
+    return identity
+
+def _require_owner(caller, user_id):
+    if caller.user_id != user_id and not caller.is_admin:
+        raise HTTPException(status_code=403, detail="Not allowed for this user")
+
+def _require_admin(caller):
+    if not caller.is_admin:
+        raise HTTPException(status_code=403, detail="Only buyers can do this")
+
+# ======================
+# ===== HOME ===========
 @app.get("/")
-def home():
+async def home() -> dict:
     return {"message": "Smart Farming Portal API is running!"}
 
+# ======================
+# ===== AUTH ===========
+# ======================
+@app.post("/auth/login")
+async def login(credentials: LoginRequest) -> dict:
+    result = await user_op.login(credentials.phone, credentials.password)
+    if not result['success']:
+        raise HTTPException(status_code=401, detail=result['message'])
+    # Later requests send the token instead of being trusted with a user id
+    return {**result, "token": sessions.issue(result['data']), "expires_in": sessions.ttl}
+
+@app.post("/auth/logout")
+async def logout(authorization: str = Header(None)) -> dict:
+    if not await sessions.revoke(_bearer(authorization)):
+        raise HTTPException(status_code=401, detail="Not logged in or session expired")
+    return {"success": True, "message": "Logged out"}
+
+# ======================
+# ===== DASHBOARD ======
+# ======================
+@app.get("/dashboard/{user_id}")
+async def get_dashboard(request: Request, response: Response, user_id: int, caller=Depends(current_user)) -> dict:
+    _require_owner(caller, user_id)
+    headers, not_modified = await _validators(request, "crops", "market_prices", "weather", "users")
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    result = await dashboard_op.get_summary(user_id)
+    if not result['success']:
+        raise HTTPException(status_code=400, detail=result['message'])
+    return result
+
+# ======================
+# ===== CACHE ==========
+# ======================
+@app.get("/cache/stats")
+async def get_cache_stats(caller=Depends(current_user)) -> dict:
+    _require_admin(caller)
+    return {"success": True, "data": {"market_prices": market_op.cache_stats(), "weather": weather_op.cache_stats()}}
+
+# ======================
+# ===== METRICS ========
+# ======================
+# Lets a Prometheus scraper read /metrics without an admin session
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+@app.get("/metrics")
+async def get_metrics(authorization: str = Header(None)):
+    token = _bearer(authorization)
+    if not (METRICS_TOKEN and token and secrets.compare_digest(token, METRICS_TOKEN)):
+        _require_admin(await current_user(authorization))
+    # Prometheus text exposition format 0.0.4
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# ======================
+# ===== EVENTS =========
+# ======================
+@app.get("/events")
+async def stream_events(user_id: int, role: str, topics: str = None, caller=Depends(current_user)):
+    """Server-sent events for price changes and the user's own negotiations."""
+    if caller.user_id != user_id or caller.role != role:
+        raise HTTPException(status_code=403, detail="Not allowed for this user")
+    if role not in ROLES:
+        raise HTTPException(status_code=400, detail=f"role must be one of: {', '.join(ROLES)}")
+    wanted = [topic.strip() for topic in topics.split(",")] if topics else list(TOPICS)
+    unknown = set(wanted) - set(TOPICS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown topics: {', '.join(sorted(unknown))}")
+    subscription = broker.subscribe(user_id, role, wanted)
+    return StreamingResponse(
+        _event_stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/events/stats")
+async def get_event_stats(caller=Depends(current_user)) -> dict:
+    _require_admin(caller)
+    return {"success": True, "data": broker.stats()}
+
 # ======================
 # ===== USERS ==========
 # ======================
 @app.get("/users")
-def get_all_users():
-    result = user_op.get_all()
+async def get_all_users(request: Request, response: Response, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: str = None, order_by: str = None, fields: str = None, fmt: str = Query("rows", alias="format", pattern="^(rows|columnar)$"), caller=Depends(current_user)) -> dict:
+    _require_admin(caller)
+    headers, not_modified = await _validators(request, "users")
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    result = await user_op.get_all(limit, after, order_by, fields)
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
-    return result
+    return _shaped(result, fmt)
 
 @app.post("/users")
-def add_user(user: UserCreate):
-    result = user_op.add_user(user.name, user.phone, user.password, user.is_admin)
+async def add_user(user: UserCreate) -> dict:
+    result = await user_op.add_user(user.name, user.phone, user.password, user.is_admin)
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
     return result
 
 @app.put("/users/{user_id}")
-def update_user(user_id: int, user_update: UserUpdate):
-    result = user_op.update_user(user_id, user_update.data)
+async def update_user(user_id: int, user_update: UserUpdate, caller=Depends(current_user)) -> dict:
+    _require_owner(caller, user_id)
+    if "is_admin" in user_update.data:
+        _require_admin(caller)
+    result = await user_op.update_user(user_id, user_update.data)
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
+    if {"is_admin", "password"} & set(user_update.data):
+        # Sessions carry the role and were opened with the old password
+        await sessions.revoke_user(user_id)
     return result
 
 @app.delete("/users/{user_id}")
-def delete_user(user_id: int):
-    result = user_op.delete_user(user_id)
+async def delete_user(user_id: int, caller=Depends(current_user)) -> dict:
+    _require_owner(caller, user_id)
+    result = await user_op.delete_user(user_id)
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
+    await sessions.revoke_user(user_id)
     return result
 
 # ======================
 # ===== CROPS ==========
 # ======================
 @app.get("/crops/{user_id}")
-def get_user_crops(user_id: int):
-    result = crop_op.get_crops_by_user(user_id)
+async def get_user_crops(request: Request, response: Response, user_id: int, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: str = None, order_by: str = None, fields: str = None, fmt: str = Query("rows", alias="format", pattern="^(rows|columnar)$"), caller=Depends(current_user)) -> dict:
+    _require_owner(caller, user_id)
+    headers, not_modified = await _validators(request, "crops")
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    result = await crop_op.get_crops_by_user(user_id, limit, after, order_by, fields)
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
-    return result
+    return _shaped(result, fmt)
 
 @app.post("/crops")
-def add_crop(crop: CropCreate):
-    result = crop_op.add_crop(crop.user_id, crop.crop_name, crop.area, crop.sow_date, crop.fertilizer, crop.expected_yield)
+async def add_crop(crop: CropCreate, caller=Depends(current_user)) -> dict:
+    _require_owner(caller, crop.user_id)
+    result = await crop_op.add_crop(crop.user_id, crop.crop_name, crop.area, crop.sow_date, crop.fertilizer, crop.expected_yield)
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
     return result
 
 @app.put("/crops/{crop_id}")
-def update_crop(crop_id: int, crop_update: CropUpdate):
-    result = crop_op.update_crop(crop_id, crop_update.data)
+async def update_crop(crop_id: int, crop_update: CropUpdate, caller=Depends(current_user)) -> dict:
+    result = await crop_op.update_crop(crop_id, crop_update.data, owner_id=None if caller.is_admin else caller.user_id)
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
     return result
 
 @app.delete("/crops/{crop_id}")
-def delete_crop(crop_id: int):
-    result = crop_op.delete_crop(crop_id)
+async def delete_crop(crop_id: int, caller=Depends(current_user)) -> dict:
+    result = await crop_op.delete_crop(crop_id, owner_id=None if caller.is_admin else caller.user_id)
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
     return result
 
+# ======================
+# ===== INSIGHTS =======
+# ======================
+@app.get("/insights/crops")
+async def get_crop_insights(request: Request, response: Response, fmt: str = Query("rows", alias="format", pattern="^(rows|columnar)$")) -> dict:
+    headers, not_modified = await _validators(request, "crops")
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    result = await crop_op.get_insights()
+    if not result['success']:
+        raise HTTPException(status_code=400, detail=result['message'])
+    return _shaped(result, fmt)
+
 # ======================
 # ===== MARKET PRICES ===
 # ======================
 @app.get("/market_prices")
-def get_market_prices(crop_name: str = None):
-    result = market_op.get_prices(crop_name)
+async def get_market_prices(request: Request, response: Response, crop_name: str = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: str = None, order_by: str = None, fields: str = None, fmt: str = Query("rows", alias="format", pattern="^(rows|columnar)$")) -> dict:
+    headers, not_modified = await _validators(request, "market_prices")
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    result = await market_op.get_prices(crop_name, limit, after, order_by, fields)
+    if not result['success']:
+        raise HTTPException(status_code=400, detail=result['message'])
+    return _shaped(result, fmt)
+
+@app.get("/market_prices/latest")
+async def get_latest_market_prices(request: Request, response: Response, buyer_id: int = None, fields: str = None, fmt: str = Query("rows", alias="format", pattern="^(rows|columnar)$")) -> dict:
+    headers, not_modified = await _validators(request, "market_prices")
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    result = await market_op.get_latest_prices(buyer_id, fields)
+    if not result['success']:
+        raise HTTPException(status_code=400, detail=result['message'])
+    return _shaped(result, fmt)
+
+@app.get("/market_prices/{crop_name}/stats")
+async def get_market_price_stats(request: Request, response: Response, crop_name: str, date_from: str = Query(None, alias="from"), date_to: str = Query(None, alias="to"), window: int = Query(7, ge=1, le=365)) -> dict:
+    headers, not_modified = await _validators(request, "market_prices")
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    result = await analytics_op.get_price_stats(crop_name, date_from, date_to, window)
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
     return result
 
 @app.post("/market_prices")
-def add_market_price(price: MarketPriceCreate):
-    result = market_op.add_price(price.crop_name, price.date, price.price_per_kg, price.buyer_id)
+async def add_market_price(price: MarketPriceCreate, caller=Depends(current_user)) -> dict:
+    _require_admin(caller)
+    if price.buyer_id != caller.user_id:
+        raise HTTPException(status_code=403, detail="Buyers can only post their own prices")
+    result = await market_op.add_price(price.crop_name, price.date, price.price_per_kg, price.buyer_id)
+    if not result['success']:
+        raise HTTPException(status_code=400, detail=result['message'])
+    return result
+
+@app.post("/market_prices/bulk")
+async def add_market_prices_bulk(request: Request, caller=Depends(current_user)) -> dict:
+    _require_admin(caller)
+    result = await market_op.add_prices_bulk(await _bulk_rows(request), buyer_id=caller.user_id)
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
     return result
 
 @app.put("/market_prices/{price_id}")
-def update_market_price(price_id: int, price_update: MarketPriceUpdate):
-    result = market_op.update_price(price_id, price_update.data)
+async def update_market_price(price_id: int, price_update: MarketPriceUpdate, caller=Depends(current_user)) -> dict:
+    _require_admin(caller)
+    result = await market_op.update_price(price_id, price_update.data, owner_id=caller.user_id)
+    if result.get('not_found'):
+        raise HTTPException(status_code=404, detail=result['message'])
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
     return result
 
 @app.delete("/market_prices/{price_id}")
-def delete_market_price(price_id: int):
-    result = market_op.delete_price(price_id)
+async def delete_market_price(price_id: int, caller=Depends(current_user)) -> dict:
+    _require_admin(caller)
+    result = await market_op.delete_price(price_id, owner_id=caller.user_id)
+    if result.get('not_found'):
+        raise HTTPException(status_code=404, detail=result['message'])
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
     return result
@@ -185,29 +577,48 @@ def delete_market_price(price_id: int):
 # ===== WEATHER ========
 # ======================
 @app.get("/weather")
-def get_weather(date: str = None):
-    result = weather_op.get_weather(date)
+async def get_weather(request: Request, response: Response, date: str = None, date_from: str = Query(None, alias="from"), date_to: str = Query(None, alias="to"), granularity: str = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: str = None, order_by: str = None, fields: str = None, fmt: str = Query("rows", alias="format", pattern="^(rows|columnar)$")) -> dict:
+    headers, not_modified = await _validators(request, "weather")
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    if granularity:
+        # Aggregated per day/week/month instead of one row per record
+        result = await weather_op.get_rollup(date_from, date_to, granularity)
+    else:
+        result = await weather_op.get_weather(date, limit, after, order_by, date_from, date_to, fields)
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
-    return result
+    return _shaped(result, fmt)
 
 @app.post("/weather")
-def add_weather(weather: WeatherCreate):
-    result = weather_op.add_weather(weather.date, weather.temperature, weather.rainfall, weather.humidity)
+async def add_weather(weather: WeatherCreate, caller=Depends(current_user)) -> dict:
+    _require_admin(caller)
+    result = await weather_op.add_weather(weather.date, weather.temperature, weather.rainfall, weather.humidity)
+    if not result['success']:
+        raise HTTPException(status_code=400, detail=result['message'])
+    return result
+
+@app.post("/weather/bulk")
+async def add_weather_bulk(request: Request, caller=Depends(current_user)) -> dict:
+    _require_admin(caller)
+    result = await weather_op.add_weather_bulk(await _bulk_rows(request))
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
     return result
 
 @app.put("/weather/{weather_id}")
-def update_weather(weather_id: int, weather_update: WeatherUpdate):
-    result = weather_op.update_weather(weather_id, weather_update.data)
+async def update_weather(weather_id: int, weather_update: WeatherUpdate, caller=Depends(current_user)) -> dict:
+    _require_admin(caller)
+    result = await weather_op.update_weather(weather_id, weather_update.data)
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
     return result
 
 @app.delete("/weather/{weather_id}")
-def delete_weather(weather_id: int):
-    result = weather_op.delete_weather(weather_id)
+async def delete_weather(weather_id: int, caller=Depends(current_user)) -> dict:
+    _require_admin(caller)
+    result = await weather_op.delete_weather(weather_id)
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
     return result
@@ -216,22 +627,133 @@ def delete_weather(weather_id: int):
 # ===== NEGOTIATIONS ===
 # ======================
 @app.post("/negotiations")
-def create_negotiation(neg: NegotiationCreate):
-    result = negotiation_op.add_negotiation(neg.farmer_id, neg.buyer_id, neg.crop_name, neg.quantity_kg, neg.proposed_price, neg.notes)
+async def create_negotiation(neg: NegotiationCreate, caller=Depends(current_user)) -> dict:
+    if caller.user_id not in (neg.farmer_id, neg.buyer_id) and not caller.is_admin:
+        raise HTTPException(status_code=403, detail="Not allowed for this user")
+    result = await negotiation_op.add_negotiation(neg.farmer_id, neg.buyer_id, neg.crop_name, neg.quantity_kg, neg.proposed_price, neg.notes, created_by=caller.user_id)
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
     return result
 
 @app.get("/negotiations")
-def get_negotiations(user_id: int, role: str):
-    result = negotiation_op.get_negotiations_for_user(user_id, role)
+async def get_negotiations(request: Request, response: Response, user_id: int, role: str, status: str = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: str = None, order_by: str = None, fields: str = None, fmt: str = Query("rows", alias="format", pattern="^(rows|columnar)$"), caller=Depends(current_user)) -> dict:
+    _require_owner(caller, user_id)
+    if role not in ROLES:
+        raise HTTPException(status_code=400, detail=f"role must be one of: {', '.join(ROLES)}")
+    headers, not_modified = await _validators(request, "negotiations")
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    # Per-status counts come with the first page only
+    result = await negotiation_op.get_negotiations_for_user(user_id, role, limit, after, order_by, status, with_counts=not after, fields=fields)
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
-    return result
+    return _shaped(result, fmt)
 
 @app.put("/negotiations/{neg_id}")
-def update_negotiation(neg_id: int, upd: NegotiationUpdate):
-    result = negotiation_op.update_negotiation(neg_id, upd.data)
+async def update_negotiation(neg_id: int, upd: NegotiationUpdate, caller=Depends(current_user)) -> dict:
+    result = await negotiation_op.update_negotiation(neg_id, upd.data, upd.version, party_id=None if caller.is_admin else caller.user_id, actor_id=caller.user_id)
+    if result.get('not_found'):
+        raise HTTPException(status_code=404, detail=result['message'])
+    if result.get('conflict'):
+        raise HTTPException(status_code=409, detail=result['message'])
     if not result['success']:
         raise HTTPException(status_code=400, detail=result['message'])
     return result
+
+# ======================
+# ===== REPORTS ========
+# ======================
+CROP_REPORT_COLUMNS = ["id", "crop_name", "area", "sow_date", "fertilizer", "expected_yield", "created_at"]
+PRICE_REPORT_COLUMNS = ["id", "crop_name", "date", "price_per_kg", "buyer_id"]
+
+# Flush the export buffer to the client once it holds this many characters
+REPORT_FLUSH_SIZE = 64 * 1024
+
+async def _csv_stream(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for row in rows:
+        writer.writerow([row.get(column) for column in columns])
+        if buffer.tell() >= REPORT_FLUSH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+async def _ndjson_stream(rows, columns):
+    lines = []
+    size = 0
+    async for row in rows:
+        line = json.dumps({column: row.get(column) for column in columns}, default=str) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= REPORT_FLUSH_SIZE:
+            yield "".join(lines)
+            lines, size = [], 0
+    yield "".join(lines)
+
+def _report(rows, columns, filename, fmt):
+    if fmt == "csv":
+        body, media_type = _csv_stream(rows, columns), "text/csv"
+    else:
+        body, media_type = _ndjson_stream(rows, columns), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
+
+def _report_columns(table, fields, default):
+    """Columns of a report: the requested ``fields`` in table order, else ``default``."""
+    if not fields:
+        return default
+    try:
+        select_columns(table, fields)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    wanted = {field.strip() for field in fields.split(",")}
+    return [column for column in SELECTABLE_COLUMNS[table] if column in wanted]
+
+@app.get("/reports/crops/{user_id}.csv")
+async def export_crops_csv(user_id: int, fields: str = None, caller=Depends(current_user)):
+    _require_owner(caller, user_id)
+    columns = _report_columns("crops", fields, CROP_REPORT_COLUMNS)
+    return _report(crop_op.iter_crops(user_id, fields=",".join(columns)), columns, f"crops_{user_id}", "csv")
+
+@app.get("/reports/crops/{user_id}.ndjson")
+async def export_crops_ndjson(user_id: int, fields: str = None, caller=Depends(current_user)):
+    _require_owner(caller, user_id)
+    columns = _report_columns("crops", fields, CROP_REPORT_COLUMNS)
+    return _report(crop_op.iter_crops(user_id, fields=",".join(columns)), columns, f"crops_{user_id}", "ndjson")
+
+@app.get("/reports/market_prices.csv")
+async def export_market_prices_csv(crop_name: str = None, fields: str = None):
+    columns = _report_columns("market_prices", fields, PRICE_REPORT_COLUMNS)
+    return _report(market_op.iter_prices(crop_name, fields=",".join(columns)), columns, "market_prices", "csv")
+
+@app.get("/reports/market_prices.ndjson")
+async def export_market_prices_ndjson(crop_name: str = None, fields: str = None):
+    columns = _report_columns("market_prices", fields, PRICE_REPORT_COLUMNS)
+    return _report(market_op.iter_prices(crop_name, fields=",".join(columns)), columns, "market_prices", "ndjson")
+
+# ======================
+# ===== SERVER =========
+# ======================
+if __name__ == "__main__":
+    import uvicorn
+
+    workers = int(os.getenv("API_WORKERS", "1"))
+    if workers > 1:
+        if CACHE_BACKEND != "redis":
+            sys.exit("API_WORKERS > 1 needs CACHE_BACKEND=redis so workers share caches, ETags, logouts and events")
+        # Every worker must sign and accept the same session tokens
+        os.environ.setdefault("SESSION_SECRET", secrets.token_hex(32))
+    uvicorn.run(
+        "main:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=os.getenv("API_HOST", "127.0.0.1"),
+        port=int(os.getenv("API_PORT", "8000")),
+        workers=workers,
+    )
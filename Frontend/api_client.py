@@ -0,0 +1,337 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Seconds a GET response is reused without asking the API, by resource
+# prefix. Other responses are kept too, but revalidated on every use.
+DEFAULT_TTLS = {
+    "/market_prices": 60,
+    "/weather": 300,
+    "/crops": 30,
+    "/dashboard": 15,
+    "/negotiations": 10,
+    "/insights": 300,
+}
+
+# Seconds without a byte from /events before the listener reconnects; the
+# API sends a keep-alive comment well within this
+EVENT_READ_TIMEOUT = 60
+
+# Most /events listeners one client keeps open; users beyond it rely on the TTLs
+MAX_EVENT_LISTENERS = 100
+
+# Resources the API only returns to an authorized caller; their cached
+# responses are kept apart per session token
+PRIVATE_RESOURCES = {"/dashboard", "/users", "/crops", "/negotiations"}
+
+# Writes to a resource also change what these other resources return
+DEPENDENT_RESOURCES = {
+    "/crops": ["/dashboard", "/insights"],
+    "/market_prices": ["/dashboard"],
+    "/weather": ["/dashboard"],
+    "/users": ["/dashboard"],
+}
+
+
+def resource_prefix(path):
+    """'/crops/42' -> '/crops'"""
+    return "/" + path.lstrip("/").split("/", 1)[0]
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of GET responses with per-resource TTLs."""
+
+    def __init__(self, ttls=None, max_entries=512):
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(path, params=None, token=None):
+        items = tuple(sorted((k, str(v)) for k, v in (params or {}).items() if v is not None))
+        scope = token if resource_prefix(path) in PRIVATE_RESOURCES else None
+        return (path, items, scope)
+
+    def ttl_for(self, path):
+        return self.ttls.get(resource_prefix(path), 0)
+
+    def get(self, key):
+        """Return the cached value while it is fresh, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def get_stale(self, key):
+        """Return (value, (etag, last_modified)) of an entry even after it expired, else None.
+
+        Expired entries stay until evicted so they can be revalidated with a
+        conditional GET instead of downloaded again.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            return entry[1], entry[2]
+
+    def set(self, key, value, validators=(None, None)):
+        ttl = self.ttl_for(key[0])
+        if ttl <= 0 and not any(validators):
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value, validators)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path):
+        """Drop every entry under the resource of ``path`` and its dependents."""
+        prefix = resource_prefix(path)
+        prefixes = [prefix] + DEPENDENT_RESOURCES.get(prefix, [])
+        with self._lock:
+            for key in [k for k in self._entries if resource_prefix(k[0]) in prefixes]:
+                del self._entries[key]
+
+    def forget_token(self, token):
+        """Drop the private entries cached for a session that ended."""
+        with self._lock:
+            for key in [k for k in self._entries if k[2] == token]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ApiClient:
+    """Keep-alive HTTP client for the Smart Farming Portal API.
+
+    A single instance is shared by every session of the Streamlit server
+    process, so TCP connections are pooled and reused across reruns.
+    """
+
+    def __init__(self, base_url, connect_timeout=3.05, read_timeout=10.0, pool_size=10, cache=None):
+        self.base_url = base_url.rstrip("/")
+        self.cache = cache if cache is not None else ResponseCache()
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="api-client")
+        self._watchers = {}
+        self._watch_lock = threading.Lock()
+
+    def _send(self, method, path, params=None, payload=None, headers=None, token=None):
+        if token:
+            headers = {**(headers or {}), "Authorization": f"Bearer {token}"}
+        return self.session.request(
+            method,
+            f"{self.base_url}{path}",
+            params=params,
+            json=payload,
+            headers=headers,
+            timeout=self.timeout,
+        )
+
+    def request(self, method, path, params=None, payload=None, token=None):
+        try:
+            res = self._send(method, path, params, payload, token=token)
+            result = res.json()
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+        if res.status_code == 401:
+            # The session token expired or was revoked
+            result = {"success": False, "message": result.get("detail", "Not logged in"), "unauthorized": True}
+        return result
+
+    def get(self, path, params=None, token=None):
+        """GET ``path``; responses of private resources are only reused for the same token."""
+        key = self.cache.make_key(path, params, token)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return dict(cached)
+
+        # Revalidate an expired copy instead of downloading it again
+        stale = self.cache.get_stale(key)
+        headers = {}
+        if stale:
+            etag, last_modified = stale[1]
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        try:
+            res = self._send("GET", path, params=params, headers=headers, token=token)
+            if res.status_code == 304 and stale:
+                self.cache.set(key, stale[0], stale[1])
+                return dict(stale[0])
+            result = res.json()
+        except Exception as e:
+            return {"success": False, "message": str(e), "data": []}
+
+        if result.get("success"):
+            self.cache.set(key, result, (res.headers.get("ETag"), res.headers.get("Last-Modified")))
+        elif res.status_code == 401:
+            result = {"success": False, "message": result.get("detail", "Not logged in"), "data": [], "unauthorized": True}
+        else:
+            result.setdefault("data", [])
+        return dict(result)
+
+    def download(self, path, params=None, token=None):
+        """Return the raw body of a report endpoint, or None if it failed."""
+        try:
+            res = self._send("GET", path, params=params, token=token)
+            res.raise_for_status()
+            return res.content
+        except Exception:
+            return None
+
+    def _write(self, method, path, payload=None, token=None):
+        result = self.request(method, path, payload=payload, token=token)
+        if result.get("success"):
+            # Users must see their own writes on the next rerun
+            self.cache.invalidate(path)
+        return result
+
+    def post(self, path, payload, token=None):
+        return self._write("POST", path, payload, token)
+
+    def put(self, path, payload, token=None):
+        return self._write("PUT", path, payload, token)
+
+    def delete(self, path, token=None):
+        return self._write("DELETE", path, token=token)
+
+    # -------- CONCURRENT FETCHES --------
+    def submit_get(self, path, params=None, token=None):
+        """Start a GET in the background and return its Future."""
+        return self.executor.submit(self.get, path, params, token)
+
+    def get_many(self, calls, token=None):
+        """Run independent GETs concurrently and wait for all of them.
+
+        ``calls`` maps a name to ``(path, params)``; the result maps the
+        same names to the decoded responses.
+        """
+        futures = {name: self.submit_get(path, params, token) for name, (path, params) in calls.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+    # -------- PUSH EVENTS --------
+    def watch(self, user_id, role, token, max_listeners=MAX_EVENT_LISTENERS):
+        """Drop cached responses as soon as the API reports a change.
+
+        Keeps one background listener on /events per (user_id, role) while
+        at least one of that user's sessions is logged in; each login adds
+        its token and unwatch() on logout removes it. Cached prices and
+        negotiations are then reused until something actually changes,
+        instead of being refetched. Returns False when ``max_listeners``
+        are already open.
+        """
+        key = (user_id, role)
+        with self._watch_lock:
+            watcher = self._watchers.get(key)
+            if watcher is not None:
+                if token not in watcher.tokens:
+                    watcher.tokens.append(token)
+                return True
+            if len(self._watchers) >= max_listeners:
+                return False
+            watcher = self._watchers[key] = _Watcher(token)
+        threading.Thread(target=self._listen, args=(key, watcher), daemon=True, name=f"api-events-{role}-{user_id}").start()
+        return True
+
+    def unwatch(self, user_id, role, token):
+        """Forget a session's token and its cached responses; the listener stops with the user's last session."""
+        self.cache.forget_token(token)
+        self._drop_token((user_id, role), token)
+
+    def _drop_token(self, key, token):
+        with self._watch_lock:
+            watcher = self._watchers.get(key)
+            if watcher is None:
+                return
+            if token in watcher.tokens:
+                watcher.tokens.remove(token)
+            if watcher.tokens:
+                return
+            del self._watchers[key]
+            watcher.stopped.set()
+            response = watcher.response
+        if response is not None:
+            # Unblocks the listener's read so the thread ends now
+            response.close()
+
+    def _listen(self, key, watcher):
+        user_id, role = key
+        delay = 1
+        while not watcher.stopped.is_set():
+            with self._watch_lock:
+                token = watcher.tokens[-1] if watcher.tokens else None
+            if token is None:
+                return
+            try:
+                # Not through self.session: a stream would hold a pooled connection forever
+                with requests.get(
+                    f"{self.base_url}/events",
+                    params={"user_id": user_id, "role": role},
+                    headers={"Authorization": f"Bearer {token}"},
+                    stream=True,
+                    timeout=(self.timeout[0], EVENT_READ_TIMEOUT),
+                ) as res:
+                    if res.status_code in (401, 403):
+                        # That session is over; nothing was missed on its behalf
+                        self._drop_token(key, token)
+                        continue
+                    res.raise_for_status()
+                    watcher.response = res
+                    delay = 1
+                    topic = None
+                    for line in res.iter_lines(decode_unicode=True):
+                        if line.startswith("event:"):
+                            topic = line[len("event:"):].strip()
+                        elif not line and topic:
+                            try:
+                                self._on_event(topic)
+                            except Exception:
+                                # One bad event is skipped; the stream stays open
+                                logger.warning("Skipping event %r from /events", topic, exc_info=True)
+                            topic = None
+            except Exception:
+                if not watcher.stopped.is_set():
+                    logger.warning("Lost the /events stream; reconnecting in %ss", delay, exc_info=True)
+            finally:
+                watcher.response = None
+            if watcher.stopped.is_set():
+                return
+            # Anything missed while disconnected is unknown, so start clean
+            self._on_event("resync")
+            watcher.stopped.wait(delay)
+            delay = min(delay * 2, 60)
+
+    def _on_event(self, topic):
+        if topic == "resync":
+            self.cache.invalidate("/market_prices")
+            self.cache.invalidate("/negotiations")
+        else:
+            self.cache.invalidate(f"/{topic}")
+
+
+class _Watcher:
+    """One /events listener and the tokens of the sessions it listens for."""
+
+    def __init__(self, token):
+        self.tokens = [token]
+        self.stopped = threading.Event()
+        self.response = None
@@ -1,8 +1,16 @@
+import os
 import streamlit as st
-import requests
-from datetime import date
+from datetime import date, timedelta
+from urllib.parse import quote
 
-API_URL = "http://127.0.0.1:8000"
+from api_client import ApiClient, ResponseCache
+
+API_URL = os.getenv("API_URL", "http://127.0.0.1:8000")
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "3.05"))
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", "10"))
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "10"))
+API_CACHE_SIZE = int(os.getenv("API_CACHE_SIZE", "512"))
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "20"))
 
 # -------------------------
 # Page Config & Branding
@@ -188,55 +196,100 @@ if 'logged_in' not in st.session_state:
     st.session_state.logged_in = False
 if 'user' not in st.session_state:
     st.session_state.user = None
+if 'token' not in st.session_state:
+    st.session_state.token = None
 if 'active_page' not in st.session_state:
     st.session_state.active_page = "Login"
 
 # -------------------------
 # API Helpers
 # -------------------------
+@st.cache_resource
+def get_api_client():
+    # One pooled client per Streamlit server process, shared by all sessions
+    return ApiClient(
+        API_URL,
+        connect_timeout=API_CONNECT_TIMEOUT,
+        read_timeout=API_READ_TIMEOUT,
+        pool_size=API_POOL_SIZE,
+        cache=ResponseCache(max_entries=API_CACHE_SIZE),
+    )
+
+def session_token():
+    return st.session_state.get('token')
+
+def checked(result):
+    """Pass ``result`` through, ending the session if the API no longer accepts its token."""
+    if result.get('unauthorized') and st.session_state.logged_in:
+        end_session()
+        st.warning("Your session has expired. Please log in again.")
+    return result
+
 def api_get(path, params=None):
-    try:
-        res = requests.get(f"{API_URL}{path}", params=params or {})
-        return res.json()
-    except Exception as e:
-        return {"success": False, "message": str(e), "data": []}
+    return checked(get_api_client().get(path, params=params or {}, token=session_token()))
+
+def api_get_many(calls):
+    """Fetch independent GETs concurrently; ``calls`` maps a name to (path, params)."""
+    results = get_api_client().get_many(calls, token=session_token())
+    return {name: checked(result) for name, result in results.items()}
 
 def api_post(path, payload):
-    try:
-        res = requests.post(f"{API_URL}{path}", json=payload)
-        return res.json()
-    except Exception as e:
-        return {"success": False, "message": str(e)}
+    return checked(get_api_client().post(path, payload, token=session_token()))
 
 def api_put(path, payload):
-    try:
-        res = requests.put(f"{API_URL}{path}", json=payload)
-        return res.json()
-    except Exception as e:
-        return {"success": False, "message": str(e)}
+    return checked(get_api_client().put(path, payload, token=session_token()))
 
 def api_delete(path):
-    try:
-        res = requests.delete(f"{API_URL}{path}")
-        return res.json()
-    except Exception as e:
-        return {"success": False, "message": str(e)}
+    return checked(get_api_client().delete(path, token=session_token()))
+
+def api_get_page(path, params, state_key):
+    """Fetch the current page of a list endpoint.
+
+    The cursors of the pages visited so far are kept in session state under
+    ``state_key``; include any filter values in the key so a new filter
+    starts again from the first page.
+    """
+    cursors = st.session_state.setdefault(f"_cursors_{state_key}", [None])
+    return api_get(path, params={**(params or {}), "limit": PAGE_SIZE, "after": cursors[-1]})
+
+def render_pager(result, state_key):
+    cursors = st.session_state.setdefault(f"_cursors_{state_key}", [None])
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        if len(cursors) > 1 and st.button("Previous", key=f"prev_{state_key}"):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        if result.get('next_cursor') and st.button("Next", key=f"next_{state_key}"):
+            cursors.append(result['next_cursor'])
+            st.rerun()
+    with col3:
+        st.caption(f"Page {len(cursors)}")
+
+def report_download(label, path, file_name, mime, key):
+    """Fetch a report only when asked, then offer it as a download."""
+    state_key = f"_report_{key}"
+    if st.button(f"Prepare {label}", key=f"prepare_{key}"):
+        st.session_state[state_key] = get_api_client().download(path, token=session_token())
+        if st.session_state[state_key] is None:
+            st.error(f"Could not generate {label}")
+    if st.session_state.get(state_key) is not None:
+        st.download_button(f"Download {label}", st.session_state[state_key], file_name=file_name, mime=mime, key=f"download_{key}")
 
 # -------------------------
 # Auth
 # -------------------------
 def login(phone, password):
-    users = api_get("/users")
-    if not users.get('success'):
-        st.error(users.get('message', 'Unable to fetch users'))
+    res = api_post("/auth/login", {"phone": phone, "password": password})
+    if not res.get('success'):
+        st.error(res.get('detail') or res.get('message') or "Invalid phone or password")
         return False
-    for user in users.get('data', []):
-        if user.get('phone') == phone and user.get('password') == password:
-            st.session_state.logged_in = True
-            st.session_state.user = user
-            return True
-    st.error("Invalid phone or password")
-    return False
+    st.session_state.logged_in = True
+    st.session_state.user = res.get('data')
+    st.session_state.token = res.get('token')
+    user = st.session_state.user or {}
+    get_api_client().watch(user.get('id'), "buyer" if user.get('is_admin') else "farmer", res.get('token'))
+    return True
 
 def register(name, phone, password, is_admin=False):
     payload = {"name": name, "phone": phone, "password": password, "is_admin": is_admin}
@@ -247,11 +300,19 @@ def register(name, phone, password, is_admin=False):
     st.error(res.get('message', 'Registration failed'))
     return False
 
-def logout():
+def end_session():
+    user = st.session_state.user or {}
+    if st.session_state.token:
+        get_api_client().unwatch(user.get('id'), "buyer" if user.get('is_admin') else "farmer", st.session_state.token)
     st.session_state.logged_in = False
     st.session_state.user = None
+    st.session_state.token = None
     st.session_state.active_page = "Login"
 
+def logout():
+    api_post("/auth/logout", {})
+    end_session()
+
 # -------------------------
 # Pages
 # -------------------------
@@ -381,15 +442,13 @@ def page_farmer_dashboard():
     
     user_id = st.session_state.user.get('id')
     
-    # Get actual data
-    crops = api_get(f"/crops/{user_id}")
-    market_prices = api_get("/market_prices")
-    weather = api_get("/weather")
-    
-    # Calculate actual counts
-    crop_count = len(crops.get('data', [])) if crops.get('success') else 0
-    market_count = len(market_prices.get('data', [])) if market_prices.get('success') else 0
-    weather_count = len(weather.get('data', [])) if weather.get('success') else 0
+    # Counts and insights do not depend on each other, so fetch them together
+    results = api_get_many({"summary": (f"/dashboard/{user_id}", None), "insights": ("/insights/crops", None)})
+    summary, insights = results["summary"], results["insights"]
+    counts = summary.get('data', {}) if summary.get('success') else {}
+    crop_count = counts.get('crops', 0)
+    market_count = counts.get('market_prices', 0)
+    weather_count = counts.get('weather', 0)
     
     # Quick stats with real data
     col1, col2, col3, col4 = st.columns(4)
@@ -402,6 +461,19 @@ def page_farmer_dashboard():
     with col4:
         st.metric("Account Status", "Active", "✓")
     
+    if insights.get('success') and insights.get('data'):
+        st.markdown("**Most planted crops**")
+        st.dataframe(
+            [{
+                "Crop": i.get('crop_name'),
+                "Farms": i.get('crop_count'),
+                "Area (acres)": i.get('total_area'),
+                "Avg Expected Yield (kg)": i.get('average_expected_yield'),
+            } for i in insights['data'][:10]],
+            hide_index=True,
+            use_container_width=True,
+        )
+    
     st.divider()
     
     # Navigation to specific pages
@@ -442,15 +514,12 @@ def page_buyer_dashboard():
     
     user_id = st.session_state.user.get('id')
     
-    # Get actual data
-    market_prices = api_get("/market_prices")
-    weather = api_get("/weather")
-    users = api_get("/users")
-    
-    # Calculate actual counts
-    market_count = len(market_prices.get('data', [])) if market_prices.get('success') else 0
-    weather_count = len(weather.get('data', [])) if weather.get('success') else 0
-    farmer_count = len([u for u in users.get('data', []) if not u.get('is_admin')]) if users.get('success') else 0
+    # Get actual counts
+    summary = api_get(f"/dashboard/{user_id}")
+    counts = summary.get('data', {}) if summary.get('success') else {}
+    market_count = counts.get('market_prices', 0)
+    weather_count = counts.get('weather', 0)
+    farmer_count = counts.get('farmers', 0)
     
     # Quick stats with real data
     col1, col2, col3, col4 = st.columns(4)
@@ -497,7 +566,7 @@ def page_crops():
         return
 
     user_id = st.session_state.user.get('id')
-    crops = api_get(f"/crops/{user_id}")
+    crops = api_get_page(f"/crops/{user_id}", None, f"crops:{user_id}")
     if crops.get('success'):
         data = crops.get('data', [])
         if data:
@@ -514,11 +583,18 @@ def page_crops():
                                 st.rerun()
                             else:
                                 st.error(del_res.get('message', 'Delete failed'))
+            render_pager(crops, f"crops:{user_id}")
         else:
             st.write("No crops yet. Add your first crop below.")
     else:
         st.error(crops.get('message', 'Could not fetch crops'))
 
+    col1, col2 = st.columns(2)
+    with col1:
+        report_download("CSV report", f"/reports/crops/{user_id}.csv", "my_crops.csv", "text/csv", "crops_csv")
+    with col2:
+        report_download("NDJSON report", f"/reports/crops/{user_id}.ndjson", "my_crops.ndjson", "application/x-ndjson", "crops_ndjson")
+
     st.divider()
     st.subheader("Add a Crop")
     col1, col2 = st.columns(2)
@@ -548,6 +624,16 @@ def page_crops():
 
 def page_market():
     st.subheader("Market Prices")
+    latest = api_get("/market_prices/latest", {"fields": "crop_name,date,price_per_kg"})
+    if latest.get('success') and latest.get('data'):
+        st.markdown("**Latest price per crop**")
+        st.dataframe(
+            [{"Crop": p.get('crop_name'), "Date": p.get('date'), "Price (₹/kg)": p.get('price_per_kg')} for p in latest['data']],
+            hide_index=True,
+            use_container_width=True,
+        )
+        st.divider()
+
     col1, col2 = st.columns([2, 1])
     with col1:
         search_crop = st.text_input("Search by Crop Name")
@@ -557,10 +643,13 @@ def page_market():
         st.empty()
 
     search_value = st.session_state.get("_search_crop", "")
-    prices = api_get("/market_prices", params={"crop_name": search_value or None})
+    prices = api_get_page("/market_prices", {"crop_name": search_value or None, "fields": "crop_name,date,price_per_kg"}, f"market:{search_value}")
     if prices.get('success'):
         for p in prices.get('data', []):
             st.write(f"{p.get('crop_name', '')}: {p.get('date', '')} - ₹{p.get('price_per_kg', '-')}/kg")
+        render_pager(prices, f"market:{search_value}")
+        report_path = "/reports/market_prices.csv" + (f"?crop_name={quote(search_value)}" if search_value else "")
+        report_download("price history CSV", report_path, "market_prices.csv", "text/csv", f"prices_csv:{search_value}")
     else:
         st.error(prices.get('message', 'Could not fetch prices'))
 
@@ -592,17 +681,40 @@ def page_weather():
             st.session_state["_weather_date"] = str(dt)
 
     q_date = st.session_state.get("_weather_date")
-    result = api_get("/weather", params={"date": q_date} if q_date else None)
+    result = api_get_page("/weather", {"date": q_date, "fields": "date,temperature,rainfall,humidity"}, f"weather:{q_date}")
     if result.get('success'):
         data = result.get('data', [])
         if data:
             for w in data:
                 st.write(f"Date: {w.get('date')} | Temp: {w.get('temperature', '-')} | Rainfall: {w.get('rainfall', '-')} | Humidity: {w.get('humidity', '-')}")
+            render_pager(result, f"weather:{q_date}")
         else:
             st.info("No records for selected date.")
     else:
         st.error(result.get('message', 'Could not fetch weather'))
 
+    st.divider()
+    st.subheader("Weather Trends")
+    t1, t2, t3 = st.columns(3)
+    with t1:
+        t_from = st.date_input("From", key="w_from", value=date.today() - timedelta(days=90))
+    with t2:
+        t_to = st.date_input("To", key="w_to", value=date.today())
+    with t3:
+        granularity = st.selectbox("Group by", ["day", "week", "month"], index=1, key="w_granularity")
+    rollup = api_get("/weather", {"from": str(t_from), "to": str(t_to), "granularity": granularity})
+    if rollup.get('success') and rollup.get('data'):
+        periods = rollup['data']
+        st.line_chart({
+            "Mean temperature (°C)": {p['period']: p.get('mean_temperature_c') for p in periods},
+            "Mean humidity (%)": {p['period']: p.get('mean_humidity_pct') for p in periods},
+        })
+        st.bar_chart({"Total rainfall (mm)": {p['period']: p.get('total_rainfall_mm') for p in periods}})
+    elif rollup.get('success'):
+        st.info("No weather records in this range.")
+    else:
+        st.error(rollup.get('message', 'Could not fetch weather trends'))
+
     if st.session_state.logged_in and st.session_state.user.get('is_admin'):
         st.divider()
         st.subheader("Add Weather (Buyer)")
@@ -623,22 +735,76 @@ def page_weather():
             else:
                 st.error(res.get('message', 'Add failed'))
 
+NEGOTIATION_STATUSES = ["pending", "countered", "accepted", "rejected"]
+OPEN_NEGOTIATION_STATUSES = {"pending", "countered"}
+
+def negotiation_status_filter(role):
+    """Status selectbox labelled with the counts of the last fetch; None means all."""
+    counts = st.session_state.get(f"_neg_counts_{role}") or {}
+    def label(status):
+        if status is None:
+            return f"All ({sum(counts.values())})" if counts else "All"
+        return f"{status.title()} ({counts[status]})" if status in counts else status.title()
+    return st.selectbox("Status", [None] + NEGOTIATION_STATUSES, format_func=label, key=f"neg_status_{role}")
+
+def render_negotiation(n, role):
+    with st.container(border=True):
+        if role == "buyer":
+            st.write(f"Farmer #{n.get('farmer_id')} offers {n.get('quantity_kg')} kg {n.get('crop_name')} @ ₹{n.get('proposed_price')}/kg")
+        else:
+            st.write(f"Crop: {n.get('crop_name')} | Qty: {n.get('quantity_kg')} kg | Price: ₹{n.get('proposed_price')}/kg")
+        st.caption(f"Notes: {n.get('notes', '-')}")
+        st.write(f"Status: {n.get('status')}")
+        if n.get('status') not in OPEN_NEGOTIATION_STATUSES:
+            return
+        if n.get('last_actor_id') == (st.session_state.user or {}).get('id'):
+            # Only the other party may answer the offer on the table
+            st.caption("Waiting for the other party to respond")
+            return
+
+        def respond(data):
+            # The API rejects the change with 409 if someone else changed the offer first
+            res = api_put(f"/negotiations/{n['id']}", {"data": data, "version": n.get('version', 1)})
+            if res.get('success'):
+                st.success(res.get('message', 'Negotiation updated'))
+                st.rerun()
+            get_api_client().cache.invalidate("/negotiations")
+            st.error(res.get('detail') or res.get('message') or "Update failed")
+
+        c1, c2, c3, c4 = st.columns([1, 1, 1, 1])
+        with c1:
+            if st.button("Accept", key=f"accept_{n['id']}"):
+                respond({"status": "accepted"})
+        with c2:
+            if st.button("Reject", key=f"reject_{n['id']}"):
+                respond({"status": "rejected"})
+        with c3:
+            counter = st.number_input("Counter ₹/kg", min_value=0.0, value=float(n.get('proposed_price') or 0), key=f"counter_price_{n['id']}")
+        with c4:
+            if st.button("Counter", key=f"counter_{n['id']}"):
+                respond({"status": "countered", "proposed_price": counter})
+
 def page_buyer():
     st.subheader("Buyer Dashboard")
     if not (st.session_state.logged_in and st.session_state.user and st.session_state.user.get('is_admin')):
         st.info("Buyer access only.")
         return
     st.write("Post crop prices, view negotiations, and respond to offers.")
+    # Fetch negotiations in the background while the market section renders;
+    # the status filter widget below keeps its value in session state
+    status = st.session_state.get("neg_status_buyer")
+    params = {"user_id": st.session_state.user.get('id'), "role": "buyer", "limit": PAGE_SIZE, "status": status}
+    negs_future = get_api_client().submit_get("/negotiations", params=params, token=session_token())
     page_market()
     st.divider()
     st.subheader("Negotiations")
-    negs = api_get("/negotiations", params={"user_id": st.session_state.user.get('id'), "role": "buyer"})
+    negs = checked(negs_future.result())
+    if negs.get('counts'):
+        st.session_state["_neg_counts_buyer"] = negs['counts']
+    negotiation_status_filter("buyer")
     if negs.get('success'):
         for n in negs.get('data', []):
-            with st.container(border=True):
-                st.write(f"Farmer #{n.get('farmer_id')} offers {n.get('quantity_kg')} kg {n.get('crop_name')} @ ₹{n.get('proposed_price')}/kg")
-                st.caption(f"Notes: {n.get('notes', '-')}")
-                st.write(f"Status: {n.get('status')}")
+            render_negotiation(n, "buyer")
     else:
         st.error(negs.get('message', 'Could not fetch negotiations'))
 
@@ -663,13 +829,14 @@ def page_negotiations():
         return
     user = st.session_state.user
     role = "buyer" if user.get('is_admin') else "farmer"
-    negs = api_get("/negotiations", params={"user_id": user.get('id'), "role": role})
+    status = negotiation_status_filter(role)
+    negs = api_get_page("/negotiations", {"user_id": user.get('id'), "role": role, "status": status}, f"negotiations:{role}:{status}")
+    if negs.get('counts'):
+        st.session_state[f"_neg_counts_{role}"] = negs['counts']
     if negs.get('success'):
         for n in negs.get('data', []):
-            with st.container(border=True):
-                st.write(f"Crop: {n.get('crop_name')} | Qty: {n.get('quantity_kg')} kg | Price: ₹{n.get('proposed_price')}/kg")
-                st.caption(f"Notes: {n.get('notes', '-')}")
-                st.write(f"Status: {n.get('status')}")
+            render_negotiation(n, role)
+        render_pager(negs, f"negotiations:{role}:{status}")
     else:
         st.error(negs.get('message', 'Could not fetch negotiations'))
 
@@ -0,0 +1,311 @@
+"""Drive the FastAPI app in-process with a mixed workload and record latencies.
+
+The app runs on the SQLite backend behind httpx's ASGI transport, so the
+numbers cover routing, the operations layer, the database and encoding,
+but not the network. Results go to a JSON file (see --output). The file
+is meant to be diffed between commits.
+
+    python bench/run.py --scale 0.01 --duration 30 --concurrency 32
+"""
+import argparse
+import asyncio
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "bench"))
+
+try:
+    import httpx
+except ImportError:
+    sys.exit("The benchmarks need httpx: pip install httpx")
+
+from seed import CROPS, END_DATE, phone, password, seed, volumes
+
+# Relative frequency of each scenario, roughly how often the Streamlit
+# pages trigger them
+SCENARIOS = {
+    "login": 5,
+    "farmer_dashboard": 15,
+    "buyer_dashboard": 5,
+    "market_search": 25,
+    "price_stats": 5,
+    "crop_crud": 10,
+    "weather": 10,
+    "farmer_negotiations": 10,
+    "buyer_negotiations": 10,
+    "add_price": 5,
+}
+
+
+def load_app():
+    spec = importlib.util.spec_from_file_location("api_main", os.path.join(ROOT, "API", "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    async def call(self, client, name, method, url, **kwargs):
+        """Send one request and record its latency under ``name``."""
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status = response.status_code
+        except Exception:
+            response, status = None, "exception"
+        self.latencies[name].append((time.perf_counter() - started) * 1000)
+        self.statuses[name][status] += 1
+        return response
+
+    def report(self, elapsed):
+        endpoints = {}
+        for name in sorted(self.latencies):
+            values = sorted(self.latencies[name])
+            statuses = self.statuses[name]
+            errors = sum(count for status, count in statuses.items() if status == "exception" or status >= 500)
+            endpoints[name] = {
+                "requests": len(values),
+                "errors": errors,
+                "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+                "throughput_rps": round(len(values) / elapsed, 2),
+                "mean_ms": round(sum(values) / len(values), 3),
+                "p50_ms": round(percentile(values, 50), 3),
+                "p95_ms": round(percentile(values, 95), 3),
+                "p99_ms": round(percentile(values, 99), 3),
+                "max_ms": round(values[-1], 3),
+            }
+        every = sorted(value for values in self.latencies.values() for value in values)
+        total = {
+            "requests": len(every),
+            "errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+            "throughput_rps": round(len(every) / elapsed, 2),
+            "p50_ms": round(percentile(every, 50), 3) if every else None,
+            "p95_ms": round(percentile(every, 95), 3) if every else None,
+            "p99_ms": round(percentile(every, 99), 3) if every else None,
+        }
+        return endpoints, total
+
+
+class Workload:
+    """Scenarios modelled on the Streamlit pages, for randomly chosen users.
+
+    Users log in the first time they act and reuse their session token after
+    that, as the app does; ``tokens`` is shared by every virtual user.
+    """
+
+    def __init__(self, client, recorder, sizes, rng, tokens):
+        self.client = client
+        self.rec = recorder
+        self.rng = rng
+        self.tokens = tokens
+        self.buyers = sizes["buyers"]
+        self.users = sizes["users"]
+
+    def farmer(self):
+        return self.rng.randint(self.buyers + 1, self.users)
+
+    def buyer(self):
+        return self.rng.randint(1, self.buyers)
+
+    async def get(self, name, url, headers=None, **params):
+        return await self.rec.call(self.client, name, "GET", url, params=params, headers=headers)
+
+    async def auth(self, user_id):
+        """Authorization header for ``user_id``, logging in on first use."""
+        token = self.tokens.get(user_id) or await self.login(user_id)
+        return {"Authorization": f"Bearer {token}"}
+
+    async def login(self, user_id=None):
+        n = user_id or self.rng.randint(1, self.users)
+        response = await self.rec.call(self.client, "POST /auth/login", "POST", "/auth/login", json={"phone": phone(n), "password": password(n)})
+        if response is not None and response.status_code == 200:
+            self.tokens[n] = response.json()["token"]
+        return self.tokens.get(n)
+
+    async def farmer_dashboard(self):
+        user_id = self.farmer()
+        auth = await self.auth(user_id)
+        await asyncio.gather(
+            self.get("GET /dashboard/{user_id}", f"/dashboard/{user_id}", auth),
+            self.get("GET /insights/crops", "/insights/crops"),
+        )
+
+    async def buyer_dashboard(self):
+        user_id = self.buyer()
+        await self.get("GET /dashboard/{user_id}", f"/dashboard/{user_id}", await self.auth(user_id))
+
+    async def market_search(self):
+        await self.get("GET /market_prices/latest", "/market_prices/latest", fields="crop_name,date,price_per_kg")
+        crop = self.rng.choice(CROPS)
+        page = await self.get("GET /market_prices", "/market_prices", crop_name=crop, limit=20, fields="crop_name,date,price_per_kg")
+        cursor = page is not None and page.status_code == 200 and page.json().get("next_cursor")
+        if cursor and self.rng.random() < 0.3:
+            await self.get("GET /market_prices", "/market_prices", crop_name=crop, limit=20, after=cursor, fields="crop_name,date,price_per_kg")
+
+    async def price_stats(self):
+        date_from = (END_DATE - datetime.timedelta(days=365)).isoformat()
+        await self.get("GET /market_prices/{crop_name}/stats", f"/market_prices/{self.rng.choice(CROPS)}/stats", **{"from": date_from, "window": 30})
+
+    async def crop_crud(self):
+        user_id = self.farmer()
+        auth = await self.auth(user_id)
+        await self.get("GET /crops/{user_id}", f"/crops/{user_id}", auth, limit=20)
+        created = await self.rec.call(self.client, "POST /crops", "POST", "/crops", headers=auth, json={
+            "user_id": user_id, "crop_name": self.rng.choice(CROPS), "area": round(self.rng.uniform(1, 10), 1),
+            "sow_date": END_DATE.isoformat(), "expected_yield": 1000.0,
+        })
+        rows = created.json().get("data") if created is not None and created.status_code == 200 else None
+        if not rows:
+            return
+        crop_id = rows[0]["id"]
+        await self.rec.call(self.client, "PUT /crops/{crop_id}", "PUT", f"/crops/{crop_id}", headers=auth, json={"data": {"expected_yield": 1200.0}})
+        await self.rec.call(self.client, "DELETE /crops/{crop_id}", "DELETE", f"/crops/{crop_id}", headers=auth)
+
+    async def weather(self):
+        offset = self.rng.randrange(5 * 365)
+        await self.get("GET /weather", "/weather", date=(END_DATE - datetime.timedelta(days=offset)).isoformat())
+        await self.get("GET /weather?granularity", "/weather", granularity=self.rng.choice(["week", "month"]),
+                       **{"from": (END_DATE - datetime.timedelta(days=365)).isoformat(), "to": END_DATE.isoformat()})
+
+    async def farmer_negotiations(self):
+        user_id = self.farmer()
+        auth = await self.auth(user_id)
+        await self.get("GET /negotiations", "/negotiations", auth, user_id=user_id, role="farmer", limit=20)
+        if self.rng.random() < 0.3:
+            await self.rec.call(self.client, "POST /negotiations", "POST", "/negotiations", headers=auth, json={
+                "farmer_id": user_id, "buyer_id": self.buyer(), "crop_name": self.rng.choice(CROPS),
+                "quantity_kg": 500.0, "proposed_price": round(self.rng.uniform(10, 120), 2),
+            })
+
+    async def buyer_negotiations(self):
+        buyer_id = self.buyer()
+        auth = await self.auth(buyer_id)
+        page = await self.get("GET /negotiations", "/negotiations", auth, user_id=buyer_id, role="buyer", status="pending", limit=20)
+        rows = page.json().get("data") if page is not None and page.status_code == 200 else None
+        if rows and self.rng.random() < 0.5:
+            row = self.rng.choice(rows)
+            status = self.rng.choice(["accepted", "rejected", "countered"])
+            data = {"status": status, "proposed_price": row["proposed_price"]} if status == "countered" else {"status": status}
+            await self.rec.call(self.client, "PUT /negotiations/{neg_id}", "PUT", f"/negotiations/{row['id']}", headers=auth, json={"data": data, "version": row["version"]})
+
+    async def add_price(self):
+        buyer_id = self.buyer()
+        await self.rec.call(self.client, "POST /market_prices", "POST", "/market_prices", headers=await self.auth(buyer_id), json={
+            "crop_name": self.rng.choice(CROPS), "date": END_DATE.isoformat(),
+            "price_per_kg": round(self.rng.uniform(10, 120), 2), "buyer_id": buyer_id,
+        })
+
+
+async def virtual_user(workload, rng, deadline, remaining):
+    names, weights = list(SCENARIOS), list(SCENARIOS.values())
+    while time.perf_counter() < deadline and remaining[0] > 0:
+        remaining[0] -= 1
+        await getattr(workload, rng.choices(names, weights)[0])()
+
+
+async def run(app, sizes, args):
+    recorder = Recorder()
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            tokens = {}
+            warmup = Workload(client, Recorder(), sizes, random.Random(args.seed), tokens)
+            for name in SCENARIOS:
+                await getattr(warmup, name)()
+
+            remaining = [args.scenarios or float("inf")]
+            started = time.perf_counter()
+            deadline = started + args.duration
+            await asyncio.gather(*(
+                virtual_user(Workload(client, recorder, sizes, random.Random(args.seed + n), tokens), random.Random(args.seed * 1000 + n), deadline, remaining)
+                for n in range(args.concurrency)
+            ))
+            elapsed = time.perf_counter() - started
+    return recorder, elapsed
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="bench.db", help="SQLite file; seeded first unless it exists")
+    parser.add_argument("--scale", type=float, default=0.01, help="data volume, 1.0 = 50k users and 1M prices")
+    parser.add_argument("--reseed", action="store_true", help="rebuild --db even if it exists")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run the workload")
+    parser.add_argument("--scenarios", type=int, default=0, help="stop after this many scenarios (0 = no limit)")
+    parser.add_argument("--concurrency", type=int, default=32, help="virtual users running scenarios at once")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench-results.json")
+    args = parser.parse_args()
+
+    # Read by src.db when the app builds its first database manager
+    os.environ["DB_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = os.path.abspath(args.db)
+
+    if args.reseed or not os.path.exists(args.db):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+        started = time.perf_counter()
+        seed(args.db, args.scale, args.seed)
+        print(f"Seeded {args.db} at scale {args.scale} in {time.perf_counter() - started:.1f}s")
+    sizes = volumes(args.scale)
+    app = load_app()
+
+    recorder, elapsed = asyncio.run(run(app, sizes, args))
+    endpoints, total = recorder.report(elapsed)
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": args.scale,
+            "volumes": sizes,
+            "concurrency": args.concurrency,
+            "duration_s": round(elapsed, 3),
+            "seed": args.seed,
+            "scenarios": SCENARIOS,
+        },
+        "total": total,
+        "endpoints": endpoints,
+    }
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+
+    print(f"{'endpoint':40} {'req':>7} {'rps':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'err':>5}")
+    for name, stats in endpoints.items():
+        print(f"{name:40} {stats['requests']:>7} {stats['throughput_rps']:>9} {stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8} {stats['errors']:>5}")
+    print(f"{'total':40} {total['requests']:>7} {total['throughput_rps']:>9} {total['p50_ms']:>8} {total['p95_ms']:>8} {total['p99_ms']:>8} {total['errors']:>5}")
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Seed a local SQLite database with realistic data volumes for the benchmarks.
+
+At --scale 1.0: 50k users (10% buyers), ~180k crops, 1M market prices,
+100k negotiations and five years of daily weather. Weather does not
+scale. The data is generated from --seed, so two runs with the same
+arguments produce the same database.
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.sqlite_db import SQLiteDatabaseManager
+
+CROPS = [
+    "rice", "wheat", "maize", "barley", "millet", "sorghum", "cotton", "sugarcane", "soybean", "groundnut",
+    "mustard", "sunflower", "chickpea", "lentil", "pigeon pea", "potato", "onion", "tomato", "chilli", "turmeric",
+    "ginger", "garlic", "banana", "mango", "grapes", "coffee", "tea", "jute", "coconut", "cardamom",
+]
+FERTILIZERS = ["urea", "DAP", "NPK 10-26-26", "potash", "compost", "vermicompost", None]
+
+# Last day of the seeded price and weather history
+END_DATE = datetime.date(2025, 12, 31)
+HISTORY_DAYS = 5 * 365
+
+# Rows per executemany() call while seeding
+INSERT_CHUNK = 10_000
+
+
+def volumes(scale):
+    users = max(20, int(50_000 * scale))
+    return {
+        "users": users,
+        "buyers": max(2, users // 10),
+        "crops_per_farmer": 4,
+        "market_prices": max(100, int(1_000_000 * scale)),
+        "negotiations": max(20, int(100_000 * scale)),
+        "weather_days": HISTORY_DAYS,
+    }
+
+
+def phone(n):
+    return f"9{n:09d}"
+
+
+def password(n):
+    return f"pass{n}"
+
+
+def _chunks(rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= INSERT_CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert(conn, sql, rows):
+    for chunk in _chunks(rows):
+        conn.executemany(sql, chunk)
+    conn.commit()
+
+
+def seed(path, scale=0.01, seed=42):
+    """Create ``path`` and fill it; returns the volumes that were seeded."""
+    rng = random.Random(seed)
+    sizes = volumes(scale)
+    users, buyers = sizes["users"], sizes["buyers"]
+    farmers = users - buyers
+
+    def day(offset):
+        return (END_DATE - datetime.timedelta(days=offset)).isoformat()
+
+    SQLiteDatabaseManager(path)  # creates the schema
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+
+    # Buyers get ids 1..buyers, farmers the rest
+    _insert(conn, "INSERT INTO users (id, name, phone, password, is_admin) VALUES (?, ?, ?, ?, ?)", (
+        (n, f"{'Buyer' if n <= buyers else 'Farmer'} {n}", phone(n), password(n), int(n <= buyers))
+        for n in range(1, users + 1)
+    ))
+
+    _insert(conn, "INSERT INTO crops (user_id, crop_name, area, sow_date, fertilizer, expected_yield) VALUES (?, ?, ?, ?, ?, ?)", (
+        (user_id, rng.choice(CROPS), round(rng.uniform(0.5, 20), 2), day(rng.randrange(365)),
+         rng.choice(FERTILIZERS), round(rng.uniform(200, 5000), 1) if rng.random() < 0.9 else None)
+        for user_id in range(buyers + 1, users + 1)
+        for _ in range(rng.randint(1, 2 * sizes["crops_per_farmer"] - 1))
+    ))
+
+    base_price = {crop: rng.uniform(10, 120) for crop in CROPS}
+    _insert(conn, "INSERT INTO market_prices (crop_name, date, price_per_kg, buyer_id) VALUES (?, ?, ?, ?)", (
+        (crop, day(offset), round(base_price[crop] * (1 + 0.3 * rng.uniform(-1, 1)), 2), rng.randint(1, buyers))
+        for crop, offset in ((rng.choice(CROPS), rng.randrange(HISTORY_DAYS)) for _ in range(sizes["market_prices"]))
+    ))
+
+    _insert(conn, (
+        "INSERT INTO weather (date, temperature, rainfall, humidity, temperature_c, rainfall_mm, humidity_pct)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?)"
+    ), (
+        (day(offset), f"{t} °C", f"{r} mm", f"{h}%", t, r, h)
+        for offset in range(sizes["weather_days"])
+        for t, r, h in [(round(rng.uniform(12, 42), 1), round(max(0.0, rng.gauss(3, 8)), 1), round(rng.uniform(30, 95)))]
+    ))
+
+    statuses = ["pending"] * 5 + ["countered"] * 2 + ["accepted", "rejected"]
+    _insert(conn, (
+        "INSERT INTO negotiations (farmer_id, buyer_id, crop_name, quantity_kg, proposed_price, notes, status, last_actor_id)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+    ), (
+        (farmer, rng.randint(1, buyers), rng.choice(CROPS),
+         rng.randrange(50, 5000, 50), round(rng.uniform(10, 120), 2), None, rng.choice(statuses), farmer)
+        for farmer in (rng.randint(buyers + 1, users) for _ in range(sizes["negotiations"]))
+    ))
+
+    # Summary tables the API keeps current on writes, built once here;
+    # crop_insights was filled by its triggers as the crops went in
+    conn.execute(
+        "INSERT INTO latest_market_prices (crop_name, buyer_id, price_id, date, price_per_kg)"
+        " SELECT crop_name, buyer_id, id, date, price_per_kg FROM ("
+        "   SELECT *, ROW_NUMBER() OVER (PARTITION BY crop_name, buyer_id ORDER BY date DESC, id DESC) AS rn"
+        "   FROM market_prices) WHERE rn = 1"
+    )
+    conn.execute(
+        "INSERT INTO latest_crop_prices (crop_name, buyer_id, price_id, date, price_per_kg)"
+        " SELECT crop_name, buyer_id, price_id, date, price_per_kg FROM ("
+        "   SELECT *, ROW_NUMBER() OVER (PARTITION BY crop_name ORDER BY date DESC, price_id DESC) AS rn"
+        "   FROM latest_market_prices) WHERE rn = 1"
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    return {**sizes, "farmers": farmers}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="bench.db", help="SQLite file to create (replaced if it exists)")
+    parser.add_argument("--scale", type=float, default=0.01, help="1.0 seeds 50k users and 1M prices")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    started = time.perf_counter()
+    sizes = seed(args.db, args.scale, args.seed)
+    print(f"Seeded {args.db} in {time.perf_counter() - started:.1f}s: {sizes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Measure how long a fresh API worker takes to become ready for traffic.
+
+Each run starts a new interpreter that imports the app, runs its startup
+hook and serves one request in-process on the SQLite backend. Phases are
+timed inside the child; ``ready_s`` is the wall clock seen by the parent,
+interpreter start-up included. Medians over --runs go to a JSON file.
+
+    python bench/startup.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; prints the phase timings as JSON
+CHILD = r"""
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+sys.path[:0] = [ROOT, ROOT + "/API", ROOT + "/Frontend"]
+import src.logic
+t1 = time.perf_counter()
+import main
+t2 = time.perf_counter()
+import httpx
+
+async def serve():
+    async with main.app.router.lifespan_context(main.app):
+        t3 = time.perf_counter()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://startup") as client:
+            response = await client.get("/market_prices/latest")
+            response.raise_for_status()
+        return t3, time.perf_counter()
+
+t3, t4 = asyncio.run(serve())
+t5 = time.perf_counter()
+import api_client
+t6 = time.perf_counter()
+print(json.dumps({
+    "import_logic_s": t1 - t0,
+    "import_app_s": t2 - t0,
+    "lifespan_s": t3 - t2,
+    "first_request_s": t4 - t3,
+    "import_frontend_client_s": t6 - t5,
+}))
+""".replace("ROOT", repr(ROOT))
+
+
+def run_once(env):
+    started = time.perf_counter()
+    child = subprocess.run([sys.executable, "-c", CHILD], env=env, capture_output=True, text=True)
+    ready = time.perf_counter() - started
+    if child.returncode != 0:
+        sys.exit(child.stderr)
+    phases = json.loads(child.stdout.strip().splitlines()[-1])
+    # The frontend import runs after the request, so leave it out of readiness
+    phases["ready_s"] = ready - phases["import_frontend_client_s"]
+    return phases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", default="bench-startup.json")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "DB_BACKEND": "sqlite", "SQLITE_PATH": os.path.join(tmp, "startup.db")}
+        run_once(env)  # creates the database and warms the OS file cache
+        runs = [run_once(env) for _ in range(args.runs)]
+
+    phases = {
+        name: {
+            "median_ms": round(statistics.median(run[name] for run in runs) * 1000, 1),
+            "min_ms": round(min(run[name] for run in runs) * 1000, 1),
+        }
+        for name in runs[0]
+    }
+    commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    with open(args.output, "w") as f:
+        json.dump({"meta": {"commit": commit or None, "python": sys.version.split()[0], "runs": args.runs}, "phases": phases}, f, indent=2, sort_keys=True)
+
+    for name, stats in phases.items():
+        print(f"{name:28} median {stats['median_ms']:>8} ms   min {stats['min_ms']:>8} ms")
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
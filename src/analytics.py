@@ -0,0 +1,57 @@
+import numpy as np
+
+# Rolling windows (in calendar days) always included in price statistics
+DEFAULT_WINDOWS = (7, 30)
+
+
+def price_stats(dates, prices, window=None):
+    """Daily and summary statistics for one crop's price series.
+
+    ``dates`` are ISO date strings and ``prices`` the matching price_per_kg
+    values, in any order. Everything is computed in whole-array NumPy passes:
+    one sort, per-day reductions with ``reduceat`` and rolling means from a
+    cumulative sum. Rolling averages cover the daily means observed within
+    the trailing ``w`` calendar days.
+    """
+    windows = sorted(set(DEFAULT_WINDOWS) | ({window} if window else set()))
+    d = np.asarray(dates, dtype="datetime64[D]")
+    p = np.asarray(prices, dtype=float)
+    if d.size == 0:
+        return {"summary": None, "daily": None}
+
+    order = np.argsort(d, kind="stable")
+    d, p = d[order], p[order]
+
+    days, starts, counts = np.unique(d, return_index=True, return_counts=True)
+    mean = np.add.reduceat(p, starts) / counts
+    low = np.minimum.reduceat(p, starts)
+    high = np.maximum.reduceat(p, starts)
+
+    daily = {
+        "date": days.astype(str).tolist(),
+        "mean": np.round(mean, 4).tolist(),
+        "min": low.tolist(),
+        "max": high.tolist(),
+        "count": counts.tolist(),
+    }
+
+    cumulative = np.concatenate(([0.0], np.cumsum(mean)))
+    end = np.arange(1, days.size + 1)
+    for w in windows:
+        start = np.searchsorted(days, days - np.timedelta64(w - 1, "D"), side="left")
+        daily[f"rolling_{w}"] = np.round((cumulative[end] - cumulative[start]) / (end - start), 4).tolist()
+
+    first, last = mean[0], mean[-1]
+    summary = {
+        "from": daily["date"][0],
+        "to": daily["date"][-1],
+        "days": int(days.size),
+        "observations": int(p.size),
+        "mean": round(float(p.mean()), 4),
+        "min": float(p.min()),
+        "max": float(p.max()),
+        "first_mean": round(float(first), 4),
+        "last_mean": round(float(last), 4),
+        "percent_change": round(float((last - first) / first * 100), 4) if first else None,
+    }
+    return {"summary": summary, "daily": daily}
@@ -0,0 +1,624 @@
+# The operations behind the FastAPI routes. Scripts use them through the
+# blocking wrappers in src/logic.py, which also holds their pure helpers.
+import asyncio
+import hmac
+
+from src.db import get_async_database_manager
+from src.query import split_page
+from src.cache import make_async_cache, MARKET_CACHE_TTL, WEATHER_CACHE_TTL
+from src.events import broker
+from src.logic import (
+    BULK_CHUNK_SIZE, EXPORT_PAGE_SIZE, validate_price_row, validate_weather_row, validate_weather_update,
+    validate_stats_query, validate_rollup_query, format_rollup_row,
+    NEGOTIATION_TRANSITIONS, NEGOTIATION_STATUSES, plan_negotiation_update, negotiation_conflict,
+    owned_by, without_password, newest_prices,
+)
+
+
+async def _iterate(rows):
+    """Yield from a plain or an async iterable of rows."""
+    if hasattr(rows, "__aiter__"):
+        async for row in rows:
+            yield row
+    else:
+        for row in rows:
+            yield row
+
+
+# ===================== USERS =====================
+class AsyncUserOperations:
+    """Bridge between frontend/FastAPI and Users table"""
+
+    def __init__(self):
+        self.db = get_async_database_manager()
+
+    async def add_user(self, name, phone, password, is_admin: bool = False):
+        if not name or not phone or not password:
+            return {"success": False, "message": "name, phone and password are required"}
+
+        try:
+            result = await self.db.add_user(name, phone, password, is_admin)
+        except Exception as exc:
+            return {"success": False, "message": str(exc)}
+
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        return {"success": True, "message": "User added successfully", "data": without_password(getattr(result, "data", None))}
+
+    async def login(self, phone, password):
+        if not phone or not password:
+            return {"success": False, "message": "phone and password are required"}
+
+        # Single-row lookup on the unique phone index
+        result = await self.db.get_user_by_phone(phone)
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+
+        rows = getattr(result, "data", None) or []
+        user = rows[0] if rows else None
+        if not user or not hmac.compare_digest(str(user.get("password", "")), str(password)):
+            return {"success": False, "message": "Invalid phone or password"}
+
+        user = {k: v for k, v in user.items() if k != "password"}
+        return {"success": True, "message": "Login successful", "data": user}
+
+    async def get_all(self, limit=None, after=None, order_by=None, fields=None):
+        try:
+            result = await self.db.get_all(limit, after, order_by, fields)
+        except ValueError as exc:
+            return {"success": False, "message": str(exc)}
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        rows, next_cursor = split_page(getattr(result, "data", None), "users", order_by, limit)
+        return {"success": True, "data": rows, "next_cursor": next_cursor}
+
+    async def update_user(self, user_id, data: dict):
+        result = await self.db.update_user(user_id, data)
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        return {"success": True, "message": "User updated successfully", "data": without_password(getattr(result, "data", None))}
+
+    async def delete_user(self, user_id):
+        result = await self.db.delete_user(user_id)
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        return {"success": True, "message": "User deleted successfully"}
+
+
+# ===================== CROPS =====================
+class AsyncCropsOperations:
+    """Bridge between frontend/FastAPI and Crops table"""
+
+    def __init__(self):
+        self.db = get_async_database_manager()
+
+    async def add_crop(self, user_id, crop_name, area=None, sow_date=None, fertilizer=None, expected_yield=None):
+        if not user_id or not crop_name:
+            return {"success": False, "message": "user_id and crop_name are required"}
+        
+        result = await self.db.add_crop(user_id, crop_name, area, sow_date, fertilizer, expected_yield)
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        return {"success": True, "message": "Crop added successfully", "data": getattr(result, "data", None)}
+
+    async def get_crops_by_user(self, user_id, limit=None, after=None, order_by=None, fields=None):
+        try:
+            result = await self.db.get_crops_by_user(user_id, limit, after, order_by, fields)
+        except ValueError as exc:
+            return {"success": False, "message": str(exc)}
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        rows, next_cursor = split_page(getattr(result, "data", None), "crops", order_by, limit)
+        return {"success": True, "data": rows, "next_cursor": next_cursor}
+
+    async def iter_crops(self, user_id, page_size=EXPORT_PAGE_SIZE, fields=None):
+        """Yield every crop of a user, one keyset page at a time, for exports."""
+        after = None
+        while True:
+            result = await self.db.get_crops_by_user(user_id, page_size, after, "id", fields)
+            if getattr(result, "error", None):
+                raise RuntimeError(str(result.error))
+            rows, after = split_page(getattr(result, "data", None), "crops", "id", page_size)
+            for row in rows:
+                yield row
+            if not after:
+                return
+
+    async def update_crop(self, crop_id, data: dict, owner_id=None):
+        """Update a crop; with ``owner_id`` only if that user owns it."""
+        if owner_id is not None:
+            before = await self.db.get_crop(crop_id)
+            if getattr(before, "error", None):
+                return {"success": False, "message": str(before.error)}
+            if not owned_by(getattr(before, "data", None), owner_id):
+                return {"success": False, "message": "Crop not found"}
+
+        result = await self.db.update_crop(crop_id, data)
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        if not getattr(result, "data", None):
+            return {"success": False, "message": "Crop not found"}
+        return {"success": True, "message": "Crop updated successfully", "data": getattr(result, "data", None)}
+
+    async def delete_crop(self, crop_id, owner_id=None):
+        """Delete a crop; with ``owner_id`` only if that user owns it."""
+        if owner_id is not None:
+            before = await self.db.get_crop(crop_id)
+            if getattr(before, "error", None):
+                return {"success": False, "message": str(before.error)}
+            if not owned_by(getattr(before, "data", None), owner_id):
+                return {"success": False, "message": "Crop not found"}
+
+        result = await self.db.delete_crop(crop_id)
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        return {"success": True, "message": "Crop deleted successfully"}
+
+    async def get_insights(self):
+        """Crop count, planted area and expected yield per crop_name.
+
+        Served from the crop_insights summary, which triggers on the crops
+        table keep current, so the cost does not grow with the crops table.
+        """
+        result = await self.db.get_crop_insights()
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+
+        insights = []
+        for row in getattr(result, "data", None) or []:
+            yield_count = row.get("yield_count") or 0
+            total_yield = float(row.get("total_yield") or 0)
+            insights.append({
+                "crop_name": row["crop_name"],
+                "crop_count": row.get("crop_count") or 0,
+                "total_area": float(row.get("total_area") or 0),
+                "total_expected_yield": total_yield,
+                "average_expected_yield": round(total_yield / yield_count, 4) if yield_count else None,
+            })
+        return {"success": True, "data": insights}
+
+
+# ===================== MARKET PRICES =====================
+class AsyncMarketOperations:
+    """Bridge between frontend/FastAPI and Market Prices table"""
+
+    def __init__(self):
+        self.db = get_async_database_manager()
+        # get_prices results keyed by (crop_name, limit, after, order_by, fields)
+        self.cache = make_async_cache("market_prices", MARKET_CACHE_TTL)
+
+    async def add_price(self, crop_name, date, price_per_kg, buyer_id):
+        if not crop_name or not date or price_per_kg is None or not buyer_id:
+            return {"success": False, "message": "All fields are required"}
+        
+        result = await self.db.add_market_price(crop_name, date, price_per_kg, buyer_id)
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        await self._invalidate_crops({crop_name})
+
+        error = await self._merge_latest(getattr(result, "data", None) or [])
+        if error:
+            return {"success": False, "message": f"Market price added but latest prices were not refreshed: {error}"}
+        await broker.publish("market_prices", {"action": "created", "data": getattr(result, "data", None)})
+        return {"success": True, "message": "Market price added successfully", "data": getattr(result, "data", None)}
+
+    async def get_prices(self, crop_name=None, limit=None, after=None, order_by=None, fields=None):
+        key = (crop_name or None, limit, after, order_by, fields or None)
+        cached, generation = await self.cache.lookup(key)
+        if cached is not None:
+            return cached
+        try:
+            result = await self.db.get_market_prices(crop_name, limit, after, order_by, fields)
+        except ValueError as exc:
+            return {"success": False, "message": str(exc)}
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        rows, next_cursor = split_page(getattr(result, "data", None), "market_prices", order_by, limit)
+        response = {"success": True, "data": rows, "next_cursor": next_cursor}
+        await self.cache.set(key, response, generation)
+        return response
+
+    async def iter_prices(self, crop_name=None, page_size=EXPORT_PAGE_SIZE, fields=None):
+        """Yield every matching price row page by page, bypassing the read cache."""
+        after = None
+        while True:
+            result = await self.db.get_market_prices(crop_name, page_size, after, "id", fields)
+            if getattr(result, "error", None):
+                raise RuntimeError(str(result.error))
+            rows, after = split_page(getattr(result, "data", None), "market_prices", "id", page_size)
+            for row in rows:
+                yield row
+            if not after:
+                return
+
+    async def update_price(self, price_id, data: dict, owner_id=None):
+        """Update a price; with ``owner_id`` only if that buyer posted it."""
+        # The old crop/buyer pair may lose its latest price if these fields change
+        before = await self.db.get_market_price(price_id)
+        if getattr(before, "error", None):
+            return {"success": False, "message": str(before.error)}
+        if not getattr(before, "data", None) or not owned_by(before.data, owner_id, "buyer_id"):
+            return {"success": False, "not_found": True, "message": "Market price not found"}
+        if owner_id is not None and data.get("buyer_id", owner_id) != owner_id:
+            return {"success": False, "message": "A price cannot be moved to another buyer"}
+
+        result = await self.db.update_market_price(price_id, data)
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+
+        rows = (getattr(before, "data", None) or []) + (getattr(result, "data", None) or [])
+        await self._invalidate_crops({row.get("crop_name") for row in rows})
+        error = await self._refresh_latest({(row.get("crop_name"), row.get("buyer_id")) for row in rows})
+        if error:
+            return {"success": False, "message": f"Market price updated but latest prices were not refreshed: {error}"}
+        await broker.publish("market_prices", {"action": "updated", "data": getattr(result, "data", None)})
+        return {"success": True, "message": "Market price updated successfully", "data": getattr(result, "data", None)}
+
+    async def delete_price(self, price_id, owner_id=None):
+        """Delete a price; with ``owner_id`` only if that buyer posted it."""
+        if owner_id is not None:
+            before = await self.db.get_market_price(price_id)
+            if getattr(before, "error", None):
+                return {"success": False, "message": str(before.error)}
+            if not owned_by(getattr(before, "data", None), owner_id, "buyer_id"):
+                return {"success": False, "not_found": True, "message": "Market price not found"}
+
+        result = await self.db.delete_market_price(price_id)
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+
+        rows = getattr(result, "data", None) or []
+        await self._invalidate_crops({row.get("crop_name") for row in rows})
+        error = await self._refresh_latest({(row.get("crop_name"), row.get("buyer_id")) for row in rows})
+        if error:
+            return {"success": False, "message": f"Market price deleted but latest prices were not refreshed: {error}"}
+        return {"success": True, "message": "Market price deleted successfully"}
+
+    async def add_prices_bulk(self, rows, buyer_id=None):
+        """Validate and insert many price rows in chunked multi-row inserts.
+
+        ``rows`` may be an async iterable, so a streamed upload is validated
+        and written chunk by chunk. Invalid rows, and the rows of a chunk the
+        database rejects, are reported by their 1-based position. With
+        ``buyer_id``, rows for any other buyer are invalid.
+        """
+        inserted, errors, chunk = 0, [], []
+
+        async def flush():
+            nonlocal inserted
+            result = await self.db.add_market_prices_bulk([row for _, row in chunk])
+            if getattr(result, "error", None):
+                errors.extend({"row": n, "message": str(result.error)} for n, _ in chunk)
+            else:
+                inserted += len(chunk)
+                await self._invalidate_crops({row["crop_name"] for _, row in chunk})
+                error = await self._merge_latest(getattr(result, "data", None) or [])
+                if error:
+                    errors.append({"row": None, "message": f"Latest prices were not refreshed: {error}"})
+            chunk.clear()
+
+        n = 0
+        async for row in _iterate(rows):
+            n += 1
+            clean, error = validate_price_row(row)
+            if not error and buyer_id is not None and clean["buyer_id"] != buyer_id:
+                error = "buyer_id must be your own user id"
+            if error:
+                errors.append({"row": n, "message": error})
+                continue
+            chunk.append((n, clean))
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                await flush()
+        if chunk:
+            await flush()
+        return {"success": True, "message": f"{inserted} market prices added, {len(errors)} errors", "inserted": inserted, "errors": errors}
+
+    async def get_latest_prices(self, buyer_id=None, fields=None):
+        """One row per crop with its most recent price, optionally for a single buyer.
+
+        Reads the latest_crop_prices summary, or latest_market_prices for a
+        buyer, so the cost follows the number of crops rather than the size
+        of the price history or the number of buyers.
+        """
+        try:
+            result = await self.db.get_latest_prices(buyer_id, fields)
+        except ValueError as exc:
+            return {"success": False, "message": str(exc)}
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        return {"success": True, "data": getattr(result, "data", None) or []}
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    async def _invalidate_crops(self, crop_names):
+        # Unfiltered listings include every crop, so they always go too
+        await self.cache.invalidate_partitions({None} | set(crop_names))
+
+    async def _merge_latest(self, rows):
+        """Fold newly inserted price rows into the latest price summaries.
+
+        New rows can only make a summary row newer, so the newest per pair
+        and per crop is picked here and written in one conditional upsert.
+        Returns an error message, or None.
+        """
+        pair_rows, crop_rows = newest_prices(row for row in rows if row.get("crop_name") and row.get("buyer_id"))
+        if not pair_rows:
+            return None
+        result = await self.db.merge_latest_prices(pair_rows, crop_rows)
+        return str(result.error) if getattr(result, "error", None) else None
+
+    async def _refresh_latest(self, keys):
+        """Recompute the summary rows of each (crop_name, buyer_id) pair and of its crop.
+
+        Returns an error message, or None when every row was refreshed.
+        """
+        keys = {(crop_name, buyer_id) for crop_name, buyer_id in keys if crop_name and buyer_id}
+        # (crop_name, None) stands for the crop's row over all buyers
+        for crop_name, buyer_id in sorted(keys) + sorted({(crop_name, None) for crop_name, _ in keys}):
+            newest = await self.db.get_newest_market_price(crop_name, buyer_id)
+            if getattr(newest, "error", None):
+                return str(newest.error)
+            rows = getattr(newest, "data", None) or []
+            if rows:
+                row = rows[0]
+                if buyer_id is None:
+                    result = await self.db.upsert_latest_crop_price(crop_name, row["buyer_id"], row["id"], row["date"], row["price_per_kg"])
+                else:
+                    result = await self.db.upsert_latest_price(crop_name, buyer_id, row["id"], row["date"], row["price_per_kg"])
+            elif buyer_id is None:
+                result = await self.db.delete_latest_crop_price(crop_name)
+            else:
+                result = await self.db.delete_latest_price(crop_name, buyer_id)
+            if getattr(result, "error", None):
+                return str(result.error)
+        return None
+
+
+# ===================== MARKET ANALYTICS =====================
+class AsyncMarketAnalyticsOperations:
+    """Price trend statistics computed over whole market price series"""
+
+    def __init__(self):
+        self.db = get_async_database_manager()
+
+    async def get_price_stats(self, crop_name, date_from=None, date_to=None, window=7):
+        try:
+            crop_name, date_from, date_to, window = validate_stats_query(crop_name, date_from, date_to, window)
+        except (TypeError, ValueError) as exc:
+            return {"success": False, "message": str(exc)}
+
+        # Load the series once, as two column lists, then hand it to NumPy
+        dates, prices, after = [], [], None
+        while True:
+            result = await self.db.get_price_series(crop_name, date_from, date_to, EXPORT_PAGE_SIZE, after)
+            if getattr(result, "error", None):
+                return {"success": False, "message": str(result.error)}
+            rows, after = split_page(getattr(result, "data", None), "market_prices", "id", EXPORT_PAGE_SIZE)
+            dates.extend(row["date"] for row in rows)
+            prices.extend(row["price_per_kg"] for row in rows)
+            if not after:
+                break
+
+        # Imported here: NumPy is most of the API's import time and only stats need it
+        from src.analytics import price_stats
+        stats = price_stats(dates, prices, window)
+        return {"success": True, "data": {"crop_name": crop_name, "window": window, **stats}}
+
+
+# ===================== WEATHER =====================
+class AsyncWeatherOperations:
+    """Bridge between frontend/FastAPI and Weather table"""
+
+    def __init__(self):
+        self.db = get_async_database_manager()
+        # get_weather results keyed by (date, limit, after, order_by, from, to, fields)
+        # and rollups keyed by (None, "rollup", from, to, granularity)
+        self.cache = make_async_cache("weather", WEATHER_CACHE_TTL)
+
+    async def add_weather(self, date, temperature=None, rainfall=None, humidity=None):
+        if not date:
+            return {"success": False, "message": "Date is required"}
+
+        row, error = validate_weather_row({"date": date, "temperature": temperature, "rainfall": rainfall, "humidity": humidity})
+        if error:
+            return {"success": False, "message": error}
+
+        result = await self.db.add_weather(**row)
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        await self._invalidate_dates({row["date"]})
+        return {"success": True, "message": "Weather data added successfully", "data": getattr(result, "data", None)}
+
+    async def add_weather_bulk(self, rows):
+        """Validate and insert many weather rows; see AsyncMarketOperations.add_prices_bulk."""
+        inserted, errors, chunk = 0, [], []
+
+        async def flush():
+            nonlocal inserted
+            result = await self.db.add_weather_bulk([row for _, row in chunk])
+            if getattr(result, "error", None):
+                errors.extend({"row": n, "message": str(result.error)} for n, _ in chunk)
+            else:
+                inserted += len(chunk)
+                await self._invalidate_dates({row["date"] for _, row in chunk})
+            chunk.clear()
+
+        n = 0
+        async for row in _iterate(rows):
+            n += 1
+            clean, error = validate_weather_row(row)
+            if error:
+                errors.append({"row": n, "message": error})
+                continue
+            chunk.append((n, clean))
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                await flush()
+        if chunk:
+            await flush()
+        return {"success": True, "message": f"{inserted} weather records added, {len(errors)} errors", "inserted": inserted, "errors": errors}
+
+    async def get_weather(self, date=None, limit=None, after=None, order_by=None, date_from=None, date_to=None, fields=None):
+        key = (date or None, limit, after, order_by, date_from or None, date_to or None, fields or None)
+        cached, generation = await self.cache.lookup(key)
+        if cached is not None:
+            return cached
+        try:
+            result = await self.db.get_weather(date, limit, after, order_by, date_from or None, date_to or None, fields)
+        except ValueError as exc:
+            return {"success": False, "message": str(exc)}
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        rows, next_cursor = split_page(getattr(result, "data", None), "weather", order_by, limit)
+        response = {"success": True, "data": rows, "next_cursor": next_cursor}
+        await self.cache.set(key, response, generation)
+        return response
+
+    async def get_rollup(self, date_from=None, date_to=None, granularity="day"):
+        """Mean temperature, total rainfall and mean humidity per day, week or month."""
+        try:
+            date_from, date_to, granularity = validate_rollup_query(date_from, date_to, granularity)
+        except (TypeError, ValueError) as exc:
+            return {"success": False, "message": str(exc)}
+
+        key = (None, "rollup", date_from, date_to, granularity)
+        cached, generation = await self.cache.lookup(key)
+        if cached is not None:
+            return cached
+        result = await self.db.weather_rollup(date_from, date_to, granularity)
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        rows = [format_rollup_row(row) for row in getattr(result, "data", None) or []]
+        response = {"success": True, "granularity": granularity, "data": rows}
+        await self.cache.set(key, response, generation)
+        return response
+
+    async def update_weather(self, weather_id, data: dict):
+        data, error = validate_weather_update(data)
+        if error:
+            return {"success": False, "message": error}
+
+        result = await self.db.update_weather(weather_id, data)
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        # The previous date of the record is unknown here, so drop everything
+        await self.cache.invalidate()
+        return {"success": True, "message": "Weather updated successfully", "data": getattr(result, "data", None)}
+
+    async def delete_weather(self, weather_id):
+        result = await self.db.delete_weather(weather_id)
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        await self._invalidate_dates({row.get("date") for row in getattr(result, "data", None) or []})
+        return {"success": True, "message": "Weather deleted successfully"}
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    async def _invalidate_dates(self, dates):
+        await self.cache.invalidate_partitions({None} | {str(date) for date in dates})
+
+
+# ===================== NEGOTIATIONS =====================
+class AsyncNegotiationOperations:
+    """Bridge between frontend/FastAPI and Negotiations table"""
+
+    def __init__(self):
+        self.db = get_async_database_manager()
+
+    async def add_negotiation(self, farmer_id, buyer_id, crop_name, quantity_kg, proposed_price, notes=None, created_by=None):
+        """Open a negotiation with an offer from ``created_by`` (the farmer by default); the other party answers it."""
+        if not farmer_id or not buyer_id or not crop_name or quantity_kg is None or proposed_price is None:
+            return {"success": False, "message": "All fields are required"}
+        result = await self.db.add_negotiation(farmer_id, buyer_id, crop_name, quantity_kg, proposed_price, notes, created_by or farmer_id)
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        await self._publish("created", getattr(result, "data", None) or [])
+        return {"success": True, "message": "Negotiation created", "data": getattr(result, "data", None)}
+
+    async def get_negotiations_for_user(self, user_id, role, limit=None, after=None, order_by=None, status=None, with_counts=False, fields=None):
+        if status and status not in NEGOTIATION_TRANSITIONS:
+            return {"success": False, "message": f"status must be one of: {', '.join(NEGOTIATION_STATUSES)}"}
+
+        async def page():
+            try:
+                return await self.db.get_negotiations_for_user(user_id, role, limit, after, order_by, status, fields)
+            except ValueError as exc:
+                return exc
+
+        if with_counts:
+            result, counts = await asyncio.gather(page(), self.get_status_counts(user_id, role))
+        else:
+            result, counts = await page(), None
+        if isinstance(result, ValueError):
+            return {"success": False, "message": str(result)}
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        if counts is not None and not counts["success"]:
+            return counts
+        rows, next_cursor = split_page(getattr(result, "data", None), "negotiations", order_by, limit)
+        response = {"success": True, "data": rows, "next_cursor": next_cursor}
+        if counts is not None:
+            response["counts"] = counts["data"]
+        return response
+
+    async def get_status_counts(self, user_id, role):
+        """Number of the user's negotiations in each status."""
+        result = await self.db.count_negotiations_by_status(user_id, role)
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        counts = dict.fromkeys(NEGOTIATION_STATUSES, 0)
+        for row in getattr(result, "data", None) or []:
+            counts[row["status"]] = row["count"]
+        return {"success": True, "data": counts}
+
+    async def update_negotiation(self, negotiation_id, data: dict, version=None, party_id=None, actor_id=None):
+        """Compare-and-set update; with ``party_id`` only if that user is the farmer or buyer.
+
+        ``actor_id`` is the user making the change, whose turn it must be;
+        see plan_negotiation_update().
+        """
+        update, conditions, error = plan_negotiation_update(data, version, actor_id)
+        if error:
+            return {"success": False, "message": error}
+
+        result = await self.db.update_negotiation(negotiation_id, update, version, party_id=party_id, **conditions)
+        if getattr(result, "error", None):
+            return {"success": False, "message": str(result.error)}
+        if not getattr(result, "data", None):
+            # Lost the race or an invalid transition; read once to say which
+            current = await self.db.get_negotiation(negotiation_id)
+            if getattr(current, "error", None):
+                return {"success": False, "message": str(current.error)}
+            return negotiation_conflict(current, negotiation_id, version, data.get("status"), party_id, conditions)
+        await self._publish("updated", getattr(result, "data", None) or [])
+        return {"success": True, "message": "Negotiation updated", "data": getattr(result, "data", None)}
+
+    @staticmethod
+    async def _publish(action, rows):
+        # Only the two parties of a negotiation are told about it
+        for row in rows:
+            recipients = [(row.get("farmer_id"), "farmer"), (row.get("buyer_id"), "buyer")]
+            await broker.publish("negotiations", {"action": action, "data": [row]}, recipients)
+
+
+# ===================== DASHBOARD =====================
+class AsyncDashboardOperations:
+    """Aggregated counts for the farmer and buyer dashboards"""
+
+    def __init__(self):
+        self.db = get_async_database_manager()
+
+    async def get_summary(self, user_id):
+        names = ["crops", "market_prices", "weather", "farmers"]
+        results = await asyncio.gather(
+            self.db.count_crops_by_user(user_id),
+            self.db.count_market_prices(),
+            self.db.count_weather(),
+            self.db.count_farmers(),
+        )
+        counts = dict(zip(names, results))
+        for result in counts.values():
+            if getattr(result, "error", None):
+                return {"success": False, "message": str(result.error)}
+        return {"success": True, "data": {name: getattr(result, "count", None) or 0 for name, result in counts.items()}}
@@ -0,0 +1,336 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+    import redis.asyncio
+except ImportError:  # optional: only needed for CACHE_BACKEND=redis
+    redis = None
+
+# Defaults for the read caches of the operations classes
+MARKET_CACHE_TTL = float(os.getenv("MARKET_CACHE_TTL", "300"))
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "600"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+
+# "memory" keeps caches, table versions and session revocations in each
+# process; "redis" shares them between API workers through REDIS_URL
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Prefix of every key this app writes to Redis
+REDIS_PREFIX = os.getenv("REDIS_PREFIX", "sfp:")
+
+_redis = None
+_redis_lock = threading.Lock()
+
+
+def redis_client():
+    """The process-wide Redis client, connected on first use."""
+    global _redis
+    if _redis is None:
+        with _redis_lock:
+            if _redis is None:
+                if redis is None:
+                    raise RuntimeError("CACHE_BACKEND=redis needs the redis package: pip install redis")
+                _redis = redis.Redis.from_url(REDIS_URL)
+    return _redis
+
+
+_async_redis = None
+
+
+def async_redis_client():
+    """The process-wide asyncio Redis client for code running on the API's event loop.
+
+    Its connections belong to the loop that first uses them, so every
+    caller must run on that same loop.
+    """
+    global _async_redis
+    if _async_redis is None:
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND=redis needs the redis package: pip install redis")
+        _async_redis = redis.asyncio.Redis.from_url(REDIS_URL)
+    return _async_redis
+
+
+class TTLCache:
+    """In-process LRU cache whose entries also expire ``ttl`` seconds after being set.
+
+    Tuple keys are partitioned by their first element. The cache and each
+    partition have a generation counter that invalidating bumps; a value
+    read before an invalidation is not stored after it (see generation()).
+    """
+
+    def __init__(self, ttl=300, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._partitions = {}   # partition -> generation
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Return the cached value, or None on a miss or an expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self, key):
+        """Snapshot to pass to set() for a value about to be read after a miss on ``key``.
+
+        Take it before reading from the database: if ``key`` is invalidated
+        while the read runs, set() then drops the value instead of caching
+        what may be a stale result for the rest of the TTL.
+        """
+        partition = key[0] if isinstance(key, tuple) else None
+        with self._lock:
+            return self._generation, self._partitions.get(partition, 0)
+
+    def lookup(self, key):
+        """Return (value, generation): get() and, on a miss, the generation() to pass to set()."""
+        value = self.get(key)
+        return value, None if value is not None else self.generation(key)
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None:
+                partition = key[0] if isinstance(key, tuple) else None
+                if generation != (self._generation, self._partitions.get(partition, 0)):
+                    return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, predicate=None):
+        """Drop the entries whose key matches ``predicate``, or every entry."""
+        with self._lock:
+            self._generation += 1
+            if predicate is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                keys = [key for key in self._entries if predicate(key)]
+                for key in keys:
+                    del self._entries[key]
+                dropped = len(keys)
+            self.invalidations += dropped
+
+    def invalidate_partitions(self, partitions):
+        """Drop the entries whose key starts with one of ``partitions``."""
+        partitions = set(partitions)
+        with self._lock:
+            for partition in partitions:
+                self._partitions[partition] = self._partitions.get(partition, 0) + 1
+            keys = [key for key in self._entries if isinstance(key, tuple) and key[0] in partitions]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class AsyncTTLCache(TTLCache):
+    """TTLCache with the awaitable interface of RedisCache.
+
+    Nothing here blocks; the methods are coroutines only so the async
+    operations can use either backend the same way.
+    """
+
+    async def lookup(self, key):
+        return super().lookup(key)
+
+    async def set(self, key, value, generation=None):
+        super().set(key, value, generation)
+
+    async def invalidate(self, predicate=None):
+        super().invalidate(predicate)
+
+    async def invalidate_partitions(self, partitions):
+        super().invalidate_partitions(partitions)
+
+
+class TableVersions:
+    """Per-table change markers behind the API's ETag/Last-Modified validators.
+
+    Versions start from a fresh boot token, so validators handed out by an
+    earlier process never match. The methods are coroutines, like those of
+    RedisTableVersions, though nothing here waits.
+    """
+
+    def __init__(self):
+        self._boot = format(time.time_ns(), "x")
+        self._started = time.time()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    async def bump(self, *tables):
+        now = time.time()
+        with self._lock:
+            for table in tables:
+                count, _ = self._versions.get(table, (0, now))
+                self._versions[table] = (count + 1, now)
+
+    async def get(self, table):
+        """Return (version, last_modified_timestamp) for ``table``."""
+        with self._lock:
+            count, modified = self._versions.get(table, (0, self._started))
+        return f"{self._boot}.{count}", modified
+
+
+# Reads an entry and the generations it must belong to in one round-trip
+_GET_ENTRY = """
+local generation = redis.call('GET', KEYS[1]) or '0'
+local partition = redis.call('GET', KEYS[2]) or '0'
+return {redis.call('GET', ARGV[1] .. generation .. ':' .. partition .. ':' .. ARGV[2]), generation, partition}
+"""
+
+
+class RedisCache:
+    """AsyncTTLCache counterpart shared by every API worker through Redis.
+
+    Keys are partitioned by their first element (crop_name, date), as the
+    operations classes invalidate them. Redis cannot drop keys by
+    predicate, so each partition and the cache as a whole have a generation
+    counter that is part of every entry's key. Invalidating bumps the
+    counter, which makes the old entries unreachable in every worker at
+    once; they then expire with their TTL. Values are stored as JSON, and
+    every call goes through the asyncio client so it never blocks the
+    event loop.
+    """
+
+    def __init__(self, name, ttl=300):
+        self.name = name
+        self.ttl = ttl
+        self._prefix = f"{REDIS_PREFIX}cache:{name}:"
+        self._script = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _partition_key(self, partition):
+        return f"{self._prefix}gen:{partition!r}"
+
+    def _digest(self, key):
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    async def lookup(self, key):
+        """Return (value, generation), read together in one round-trip; see TTLCache.lookup()."""
+        if self._script is None:
+            self._script = async_redis_client().register_script(_GET_ENTRY)
+        value, generation, partition = await self._script(
+            keys=[f"{self._prefix}gen", self._partition_key(key[0])],
+            args=[f"{self._prefix}entry:", self._digest(key)],
+        )
+        if value is None:
+            self.misses += 1
+            return None, (int(generation), int(partition))
+        self.hits += 1
+        return json.loads(value), None
+
+    async def set(self, key, value, generation=None):
+        # Stored under the generations the miss saw: if the key was
+        # invalidated since, the entry is unreachable and simply expires
+        if generation is None:
+            generation = tuple(int(g or 0) for g in await async_redis_client().mget(f"{self._prefix}gen", self._partition_key(key[0])))
+        entry = f"{self._prefix}entry:{generation[0]}:{generation[1]}:{self._digest(key)}"
+        await async_redis_client().set(entry, json.dumps(value, default=str), ex=max(1, int(self.ttl)))
+
+    async def invalidate(self):
+        """Drop every entry."""
+        await async_redis_client().incr(f"{self._prefix}gen")
+        self.invalidations += 1
+
+    async def invalidate_partitions(self, partitions):
+        pipe = async_redis_client().pipeline(transaction=False)
+        for partition in partitions:
+            pipe.incr(self._partition_key(partition))
+        await pipe.execute()
+        self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": "redis",
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+class RedisTableVersions:
+    """TableVersions kept in Redis, so every worker hands out the same validators.
+
+    The epoch is created once per Redis dataset; if Redis is flushed, a new
+    epoch means validators issued before never match. It uses the asyncio
+    client, as only the API's request handlers call it.
+    """
+
+    def __init__(self):
+        self._prefix = f"{REDIS_PREFIX}versions:"
+        self._epoch_key = f"{self._prefix}epoch"
+
+    async def bump(self, *tables):
+        now = time.time()
+        pipe = async_redis_client().pipeline(transaction=False)
+        for table in tables:
+            pipe.hincrby(f"{self._prefix}{table}", "count", 1)
+            pipe.hset(f"{self._prefix}{table}", "modified", now)
+        await pipe.execute()
+
+    async def get(self, table):
+        """Return (version, last_modified_timestamp) for ``table`` in one round-trip."""
+        pipe = async_redis_client().pipeline(transaction=False)
+        pipe.set(self._epoch_key, format(time.time_ns(), "x"), nx=True)
+        pipe.get(self._epoch_key)
+        pipe.hmget(f"{self._prefix}{table}", "count", "modified")
+        _, epoch, (count, modified) = await pipe.execute()
+        epoch = epoch.decode()
+        # A table not written since the epoch began was last modified when it began
+        modified = float(modified) if modified is not None else int(epoch, 16) / 1e9
+        return f"{epoch}.{int(count or 0)}", modified
+
+
+def make_async_cache(name, ttl, max_entries=CACHE_MAX_ENTRIES):
+    """A read cache for the configured CACHE_BACKEND; ``name`` separates caches in Redis.
+
+    Every method but stats() is awaited.
+    """
+    if CACHE_BACKEND == "redis":
+        return RedisCache(name, ttl)
+    return AsyncTTLCache(ttl, max_entries)
+
+
+table_versions = RedisTableVersions() if CACHE_BACKEND == "redis" else TableVersions()
@@ -0,0 +1,116 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+# Responses smaller than this are sent as they are
+COMPRESS_MIN_SIZE = 1024
+
+# Media types worth compressing; event streams are never buffered
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html")
+
+
+def choose_encoding(accept_encoding):
+    """Pick "br", "gzip" or None from an Accept-Encoding header, honouring q=0."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in (("br",) if brotli else ()) + ("gzip",):
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "br":
+            # Quality 4 keeps brotli's ratio ahead of gzip at a similar speed
+            self._c = brotli.Compressor(quality=4)
+        else:
+            self._c = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def chunk(self, data):
+        """Compress and flush ``data`` so the client can decode it right away."""
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.flush()
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data=b""):
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.finish()
+        return self._c.compress(data) + self._c.flush()
+
+
+class CompressionMiddleware:
+    """Pure ASGI gzip/brotli negotiation for JSON, NDJSON and CSV responses.
+
+    Single-message bodies are compressed in one pass; streamed bodies are
+    compressed chunk by chunk so exports keep streaming. Responses that are
+    small, already encoded or of another media type pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if compressor is None:
+                response_headers = dict(start["headers"])
+                media_type = response_headers.get(b"content-type", b"").decode("latin-1").split(";")[0].strip()
+                if (
+                    b"content-encoding" in response_headers
+                    or media_type not in COMPRESSIBLE_TYPES
+                    or (not more and len(body) < self.minimum_size)
+                ):
+                    passthrough = True
+                    await send(start)
+                    return await send(message)
+
+                compressor = _Compressor(encoding)
+                raw = [(k, v) for k, v in start["headers"] if k not in (b"content-length", b"vary")]
+                vary = response_headers.get(b"vary")
+                raw.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+                raw.append((b"content-encoding", encoding.encode()))
+                if not more:
+                    body = compressor.finish(body)
+                    raw.append((b"content-length", str(len(body)).encode()))
+                    await send({**start, "headers": raw})
+                    return await send({"type": "http.response.body", "body": body})
+                await send({**start, "headers": raw})
+
+            data = compressor.chunk(body) if more else compressor.finish(body)
+            await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, send_compressed)
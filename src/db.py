@@ -1,19 +1,199 @@
+import functools
 import os
-from supabase import create_client, Client
+import threading
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-url = os.getenv("SUPABASE_URL")
-key = os.getenv("SUPABASE_KEY")
-supabase = create_client(url, key)
+from src.metrics import instrument
+from src.query import apply_keyset, select_columns
+
+
+@functools.lru_cache(maxsize=None)
+def settings():
+    """Connection settings, read from the environment and .env on first use.
+
+    Nothing is read or connected at import time, so importing src.logic
+    works without credentials and costs no I/O.
+    """
+    load_dotenv()
+    return {
+        "url": os.getenv("SUPABASE_URL"),
+        "key": os.getenv("SUPABASE_KEY"),
+        # "supabase" (default) or "sqlite"
+        "backend": os.getenv("DB_BACKEND", "supabase").lower(),
+        "sqlite_path": os.getenv("SQLITE_PATH", "smart_farming.db"),
+    }
 
 
-# USERS
 class DatabaseManager:
+    """Storage interface used by the *Operations classes.
+
+    Backends return objects with ``.data`` (list of row dicts), ``.error``
+    and, for count queries, ``.count``. Use get_database_manager() or
+    get_async_database_manager() to get the configured backend.
+    """
+
+    # -------- USERS --------
+    def add_user(self, name, phone, password, is_admin: bool = False):
+        raise NotImplementedError
+
+    def get_user_by_phone(self, phone):
+        raise NotImplementedError
+
+    def get_all(self, limit=None, after=None, order_by=None, fields=None):
+        raise NotImplementedError
+
+    def update_user(self, user_id, update_data):
+        raise NotImplementedError
+
+    def delete_user(self, user_id):
+        raise NotImplementedError
+
+    # -------- CROPS --------
+    def add_crop(self, user_id, crop_name, area, sow_date, fertilizer, expected_yield):
+        raise NotImplementedError
+
+    def get_crops_by_user(self, user_id, limit=None, after=None, order_by=None, fields=None):
+        raise NotImplementedError
+
+    def get_crop(self, crop_id):
+        raise NotImplementedError
+
+    def update_crop(self, crop_id, update_data):
+        raise NotImplementedError
+
+    def delete_crop(self, crop_id):
+        raise NotImplementedError
+
+    # -------- CROP INSIGHTS (summary, one row per crop_name) --------
+    def get_crop_insights(self):
+        """Per-crop totals, kept current by triggers on the crops table."""
+        raise NotImplementedError
+
+    # -------- MARKET PRICES --------
+    def add_market_price(self, crop_name, date, price_per_kg, buyer_id):
+        raise NotImplementedError
+
+    def get_market_prices(self, crop_name: str = None, limit=None, after=None, order_by=None, fields=None):
+        raise NotImplementedError
+
+    def update_market_price(self, price_id, update_data):
+        raise NotImplementedError
+
+    def delete_market_price(self, price_id):
+        raise NotImplementedError
+
+    def add_market_prices_bulk(self, rows):
+        raise NotImplementedError
+
+    def get_market_price(self, price_id):
+        raise NotImplementedError
+
+    def get_price_series(self, crop_name, date_from=None, date_to=None, limit=None, after=None):
+        raise NotImplementedError
+
+    def get_newest_market_price(self, crop_name, buyer_id=None):
+        """Newest price of ``crop_name`` from ``buyer_id``, or from any buyer."""
+        raise NotImplementedError
+
+    # -------- LATEST MARKET PRICES (summary, one row per crop and buyer) --------
+    def upsert_latest_price(self, crop_name, buyer_id, price_id, date, price_per_kg):
+        raise NotImplementedError
+
+    def delete_latest_price(self, crop_name, buyer_id):
+        raise NotImplementedError
+
+    def merge_latest_prices(self, pair_rows, crop_rows):
+        """Upsert summary rows of both latest price tables, each only where it is newer
+        (by date, then price_id) than the stored row. One round-trip for new prices."""
+        raise NotImplementedError
+
+    def get_latest_prices(self, buyer_id=None, fields=None):
+        """One row per crop: the buyer's latest price, or without ``buyer_id`` the latest over all buyers."""
+        raise NotImplementedError
+
+    # -------- LATEST CROP PRICES (summary, one row per crop over all buyers) --------
+    def upsert_latest_crop_price(self, crop_name, buyer_id, price_id, date, price_per_kg):
+        raise NotImplementedError
+
+    def delete_latest_crop_price(self, crop_name):
+        raise NotImplementedError
+
+    # -------- NEGOTIATIONS --------
+    def add_negotiation(self, farmer_id, buyer_id, crop_name, quantity_kg, proposed_price, notes, last_actor_id=None):
+        raise NotImplementedError
+
+    def get_negotiations_for_user(self, user_id, role, limit=None, after=None, order_by=None, status=None, fields=None):
+        raise NotImplementedError
+
+    def get_negotiation(self, negotiation_id):
+        raise NotImplementedError
+
+    def count_negotiations_by_status(self, user_id, role):
+        """One row per status the user's negotiations are in: ``{"status", "count"}``."""
+        raise NotImplementedError
+
+    def update_negotiation(self, negotiation_id, update_data, version=None, from_statuses=None, party_id=None, turn_of=None, last_actor_id=None):
+        """Compare-and-set update: only applies while the row still has
+        ``version`` and one of ``from_statuses``, ``party_id`` is its
+        farmer or buyer, ``turn_of`` did not make its last move and
+        ``last_actor_id`` did. Returns no rows otherwise."""
+        raise NotImplementedError
+
+    # -------- WEATHER --------
+    def add_weather(self, date, temperature, rainfall, humidity, temperature_c=None, rainfall_mm=None, humidity_pct=None):
+        raise NotImplementedError
+
+    def add_weather_bulk(self, rows):
+        raise NotImplementedError
+
+    def get_weather(self, date: str = None, limit=None, after=None, order_by=None, date_from=None, date_to=None, fields=None):
+        raise NotImplementedError
+
+    def weather_rollup(self, date_from=None, date_to=None, granularity="day"):
+        raise NotImplementedError
+
+    def update_weather(self, weather_id, update_data: dict):
+        raise NotImplementedError
+
+    def delete_weather(self, weather_id):
+        raise NotImplementedError
+
+    # -------- COUNTS --------
+    def count_crops_by_user(self, user_id):
+        raise NotImplementedError
+
+    def count_market_prices(self):
+        raise NotImplementedError
+
+    def count_weather(self):
+        raise NotImplementedError
+
+    def count_farmers(self):
+        raise NotImplementedError
+
+
+class SupabaseDatabaseManager(DatabaseManager):
+    """Queries on one supabase client shared by the process, created on first use."""
+
+    _client = None
+    _client_lock = threading.Lock()
+
+    def __init__(self):
+        pass
+
+    @property
+    def client(self):
+        if SupabaseDatabaseManager._client is None:
+            with SupabaseDatabaseManager._client_lock:
+                if SupabaseDatabaseManager._client is None:
+                    from supabase import create_client
+                    config = settings()
+                    SupabaseDatabaseManager._client = create_client(config["url"], config["key"])
+        return SupabaseDatabaseManager._client
+
     # -------- USERS --------
     def add_user(self, name, phone, password, is_admin: bool = False):
-        return supabase.table("users").insert({
+        return self.client.table("users").insert({
             "name": name,
             "phone": phone,
             "password": password,
@@ -21,20 +201,21 @@ class DatabaseManager:
         }).execute()
 
     def get_user_by_phone(self, phone):
-        return supabase.table("users").select("*").eq("phone", phone).execute()
+        return self.client.table("users").select("*").eq("phone", phone).limit(1).execute()
 
-    def get_all(self):
-        return supabase.table("users").select("*").execute()
+    def get_all(self, limit=None, after=None, order_by=None, fields=None):
+        query = self.client.table("users").select(select_columns("users", fields, order_by))
+        return apply_keyset(query, "users", order_by, limit, after).execute()
 
     def update_user(self, user_id, update_data):
-        return supabase.table("users").update(update_data).eq("id", user_id).execute()
+        return self.client.table("users").update(update_data).eq("id", user_id).execute()
 
     def delete_user(self, user_id):
-        return supabase.table("users").delete().eq("id", user_id).execute()
+        return self.client.table("users").delete().eq("id", user_id).execute()
 
     # -------- CROPS --------
     def add_crop(self, user_id, crop_name, area, sow_date, fertilizer, expected_yield):
-        return supabase.table("crops").insert({
+        return self.client.table("crops").insert({
             "user_id": user_id,
             "crop_name": crop_name,
             "area": area,
@@ -43,76 +224,291 @@ class DatabaseManager:
             "expected_yield": expected_yield
         }).execute()
 
-    def get_crops_by_user(self, user_id):
-        return supabase.table("crops").select("*").eq("user_id", user_id).execute()
+    def get_crops_by_user(self, user_id, limit=None, after=None, order_by=None, fields=None):
+        query = self.client.table("crops").select(select_columns("crops", fields, order_by)).eq("user_id", user_id)
+        return apply_keyset(query, "crops", order_by, limit, after).execute()
+
+    def get_crop(self, crop_id):
+        return self.client.table("crops").select("*").eq("id", crop_id).limit(1).execute()
 
     def update_crop(self, crop_id, update_data):
-        return supabase.table("crops").update(update_data).eq("id", crop_id).execute()
+        return self.client.table("crops").update(update_data).eq("id", crop_id).execute()
 
     def delete_crop(self, crop_id):
-        return supabase.table("crops").delete().eq("id", crop_id).execute()
+        return self.client.table("crops").delete().eq("id", crop_id).execute()
+
+    # -------- CROP INSIGHTS (summary, one row per crop_name) --------
+    def get_crop_insights(self):
+        # Kept by the crops_adjust_insights trigger, see the README
+        return self.client.table("crop_insights").select("*").gt("crop_count", 0).order("crop_count", desc=True).execute()
 
     # -------- MARKET PRICES --------
     def add_market_price(self, crop_name, date, price_per_kg, buyer_id):
-        return supabase.table("market_prices").insert({
+        return self.client.table("market_prices").insert({
             "crop_name": crop_name,
             "date": date,
             "price_per_kg": price_per_kg,
             "buyer_id": buyer_id
         }).execute()
 
-    def get_market_prices(self, crop_name: str = None):
-        query = supabase.table("market_prices").select("*")
+    def get_market_prices(self, crop_name: str = None, limit=None, after=None, order_by=None, fields=None):
+        query = self.client.table("market_prices").select(select_columns("market_prices", fields, order_by))
         if crop_name:
             query = query.eq("crop_name", crop_name)
-        return query.execute()
+        return apply_keyset(query, "market_prices", order_by, limit, after).execute()
 
     def update_market_price(self, price_id, update_data):
-        return supabase.table("market_prices").update(update_data).eq("id", price_id).execute()
+        return self.client.table("market_prices").update(update_data).eq("id", price_id).execute()
 
     def delete_market_price(self, price_id):
-        return supabase.table("market_prices").delete().eq("id", price_id).execute()
+        return self.client.table("market_prices").delete().eq("id", price_id).execute()
+
+    def add_market_prices_bulk(self, rows):
+        # One multi-row INSERT; the new rows come back for the latest price summaries
+        return self.client.table("market_prices").insert(rows).execute()
+
+    def get_market_price(self, price_id):
+        return self.client.table("market_prices").select("*").eq("id", price_id).limit(1).execute()
+
+    def get_price_series(self, crop_name, date_from=None, date_to=None, limit=None, after=None):
+        # Only the two columns the analytics need; filtered on the (crop_name, date) index
+        query = self.client.table("market_prices").select("id, date, price_per_kg").eq("crop_name", crop_name)
+        if date_from:
+            query = query.gte("date", date_from)
+        if date_to:
+            query = query.lte("date", date_to)
+        return apply_keyset(query, "market_prices", "id", limit, after).execute()
+
+    def get_newest_market_price(self, crop_name, buyer_id=None):
+        # Served by the (crop_name, buyer_id, date DESC) or (crop_name, date) index
+        query = self.client.table("market_prices").select("id, crop_name, buyer_id, date, price_per_kg").eq("crop_name", crop_name)
+        if buyer_id is not None:
+            query = query.eq("buyer_id", buyer_id)
+        return (
+            query
+            .order("date", desc=True)
+            .order("id", desc=True)
+            .limit(1)
+            .execute()
+        )
+
+    # -------- LATEST MARKET PRICES (summary, one row per crop and buyer) --------
+    def upsert_latest_price(self, crop_name, buyer_id, price_id, date, price_per_kg):
+        return self.client.table("latest_market_prices").upsert({
+            "crop_name": crop_name,
+            "buyer_id": buyer_id,
+            "price_id": price_id,
+            "date": date,
+            "price_per_kg": price_per_kg
+        }, on_conflict="crop_name,buyer_id").execute()
+
+    def delete_latest_price(self, crop_name, buyer_id):
+        return self.client.table("latest_market_prices").delete().eq("crop_name", crop_name).eq("buyer_id", buyer_id).execute()
+
+    def merge_latest_prices(self, pair_rows, crop_rows):
+        # Conditional multi-row upserts in the database, see merge_latest_prices() in the README
+        return self.client.rpc("merge_latest_prices", {
+            "p_pairs": pair_rows,
+            "p_crops": crop_rows
+        }).execute()
+
+    def get_latest_prices(self, buyer_id=None, fields=None):
+        # Both summaries have the same columns; without a buyer, one row per crop
+        columns = select_columns("latest_market_prices", fields)
+        if buyer_id:
+            query = self.client.table("latest_market_prices").select(columns).eq("buyer_id", buyer_id)
+        else:
+            query = self.client.table("latest_crop_prices").select(columns)
+        return query.order("crop_name").execute()
+
+    # -------- LATEST CROP PRICES (summary, one row per crop over all buyers) --------
+    def upsert_latest_crop_price(self, crop_name, buyer_id, price_id, date, price_per_kg):
+        return self.client.table("latest_crop_prices").upsert({
+            "crop_name": crop_name,
+            "buyer_id": buyer_id,
+            "price_id": price_id,
+            "date": date,
+            "price_per_kg": price_per_kg
+        }, on_conflict="crop_name").execute()
+
+    def delete_latest_crop_price(self, crop_name):
+        return self.client.table("latest_crop_prices").delete().eq("crop_name", crop_name).execute()
 
     # -------- NEGOTIATIONS --------
-    def add_negotiation(self, farmer_id, buyer_id, crop_name, quantity_kg, proposed_price, notes):
-        return supabase.table("negotiations").insert({
+    def add_negotiation(self, farmer_id, buyer_id, crop_name, quantity_kg, proposed_price, notes, last_actor_id=None):
+        return self.client.table("negotiations").insert({
             "farmer_id": farmer_id,
             "buyer_id": buyer_id,
             "crop_name": crop_name,
             "quantity_kg": quantity_kg,
             "proposed_price": proposed_price,
             "notes": notes,
-            "status": "pending"
+            "status": "pending",
+            "version": 1,
+            "last_actor_id": last_actor_id
         }).execute()
 
-    def get_negotiations_for_user(self, user_id, role):
-        table = supabase.table("negotiations").select("*")
+    def get_negotiations_for_user(self, user_id, role, limit=None, after=None, order_by=None, status=None, fields=None):
+        table = self.client.table("negotiations").select(select_columns("negotiations", fields, order_by))
         if role == "buyer":
             table = table.eq("buyer_id", user_id)
         else:
             table = table.eq("farmer_id", user_id)
-        return table.execute()
+        if status:
+            table = table.eq("status", status)
+        return apply_keyset(table, "negotiations", order_by, limit, after).execute()
+
+    def get_negotiation(self, negotiation_id):
+        return self.client.table("negotiations").select("*").eq("id", negotiation_id).limit(1).execute()
 
-    def update_negotiation(self, negotiation_id, update_data):
-        return supabase.table("negotiations").update(update_data).eq("id", negotiation_id).execute()
+    def count_negotiations_by_status(self, user_id, role):
+        # GROUP BY status in the database, see negotiation_status_counts() in the README
+        return self.client.rpc("negotiation_status_counts", {
+            "p_user_id": user_id,
+            "p_role": role
+        }).execute()
+
+    def update_negotiation(self, negotiation_id, update_data, version=None, from_statuses=None, party_id=None, turn_of=None, last_actor_id=None):
+        query = self.client.table("negotiations").update(update_data).eq("id", negotiation_id)
+        if version is not None:
+            query = query.eq("version", version)
+        if from_statuses:
+            query = query.in_("status", list(from_statuses))
+        if party_id is not None:
+            query = query.or_(f"farmer_id.eq.{party_id},buyer_id.eq.{party_id}")
+        if turn_of is not None:
+            query = query.filter("last_actor_id", "isdistinct", turn_of)
+        if last_actor_id is not None:
+            query = query.eq("last_actor_id", last_actor_id)
+        return query.execute()
 
     # -------- WEATHER --------
-    def add_weather(self, date, temperature, rainfall, humidity):
-        return supabase.table("weather").insert({
+    def add_weather(self, date, temperature, rainfall, humidity, temperature_c=None, rainfall_mm=None, humidity_pct=None):
+        return self.client.table("weather").insert({
             "date": date,
             "temperature": temperature,
             "rainfall": rainfall,
-            "humidity": humidity
+            "humidity": humidity,
+            "temperature_c": temperature_c,
+            "rainfall_mm": rainfall_mm,
+            "humidity_pct": humidity_pct
         }).execute()
 
-    def get_weather(self, date: str = None):
-        query = supabase.table("weather").select("*")
+    def add_weather_bulk(self, rows):
+        return self.client.table("weather").insert(rows, returning="minimal").execute()
+
+    def get_weather(self, date: str = None, limit=None, after=None, order_by=None, date_from=None, date_to=None, fields=None):
+        query = self.client.table("weather").select(select_columns("weather", fields, order_by))
         if date:
             query = query.eq("date", date)
-        return query.execute()
+        if date_from:
+            query = query.gte("date", date_from)
+        if date_to:
+            query = query.lte("date", date_to)
+        return apply_keyset(query, "weather", order_by, limit, after).execute()
+
+    def weather_rollup(self, date_from=None, date_to=None, granularity="day"):
+        # GROUP BY date_trunc() in the database, see weather_rollup() in the README
+        return self.client.rpc("weather_rollup", {
+            "p_from": date_from,
+            "p_to": date_to,
+            "p_granularity": granularity
+        }).execute()
 
     def update_weather(self, weather_id, update_data: dict):
-        return supabase.table("weather").update(update_data).eq("id", weather_id).execute()
+        return self.client.table("weather").update(update_data).eq("id", weather_id).execute()
 
     def delete_weather(self, weather_id):
-        return supabase.table("weather").delete().eq("id", weather_id).execute()
+        return self.client.table("weather").delete().eq("id", weather_id).execute()
+
+    # -------- COUNTS --------
+    # head=True asks PostgREST for the count only, no rows are transferred
+    def count_crops_by_user(self, user_id):
+        return self.client.table("crops").select("id", count="exact", head=True).eq("user_id", user_id).execute()
+
+    def count_market_prices(self):
+        return self.client.table("market_prices").select("id", count="exact", head=True).execute()
+
+    def count_weather(self):
+        return self.client.table("weather").select("id", count="exact", head=True).execute()
+
+    def count_farmers(self):
+        return self.client.table("users").select("id", count="exact", head=True).eq("is_admin", False).execute()
+
+
+class AsyncSupabaseDatabaseManager(SupabaseDatabaseManager):
+    """The same queries as SupabaseDatabaseManager, run on the async supabase client.
+
+    Every method returns an awaitable. Await ``connect()`` once (at application
+    startup) before the first query.
+    """
+
+    _client = None
+
+    def __init__(self):
+        pass
+
+    async def connect(self):
+        if AsyncSupabaseDatabaseManager._client is None:
+            from supabase import acreate_client
+            config = settings()
+            AsyncSupabaseDatabaseManager._client = await acreate_client(config["url"], config["key"])
+        return AsyncSupabaseDatabaseManager._client
+
+    @property
+    def client(self):
+        if AsyncSupabaseDatabaseManager._client is None:
+            raise RuntimeError("AsyncSupabaseDatabaseManager.connect() must be awaited before querying")
+        return AsyncSupabaseDatabaseManager._client
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def _shared(kind, build):
+    with _managers_lock:
+        if kind not in _managers:
+            _managers[kind] = instrument(build())
+        return _managers[kind]
+
+
+def _build_manager():
+    config = settings()
+    if config["backend"] == "sqlite":
+        from src.sqlite_db import SQLiteDatabaseManager
+        return SQLiteDatabaseManager(config["sqlite_path"])
+    return SupabaseDatabaseManager()
+
+
+def _build_async_manager():
+    config = settings()
+    if config["backend"] == "sqlite":
+        from src.sqlite_db import AsyncSQLiteDatabaseManager
+        return AsyncSQLiteDatabaseManager(config["sqlite_path"])
+    return AsyncSupabaseDatabaseManager()
+
+
+def get_database_manager():
+    """The process-wide manager for the configured backend, built on first call."""
+    return _shared("sync", _build_manager)
+
+
+def get_async_database_manager():
+    """The process-wide async manager for the configured backend, built on first call."""
+    return _shared("async", _build_async_manager)
+
+
+async def warm_up():
+    """Connect the async manager and make one cheap query.
+
+    Run from the API's startup hook so the first request does not pay for
+    the client, the TLS handshake or the connection pool.
+    """
+    manager = get_async_database_manager()
+    await manager.connect()
+    try:
+        await manager.count_weather()
+    except Exception:
+        # The API still starts; requests will report the database error
+        pass
@@ -0,0 +1,189 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from src.cache import REDIS_PREFIX, async_redis_client, redis_client
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per subscriber before it is told to resync instead
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+
+# Topics a subscriber can listen to; each is named after the table it reports on
+TOPICS = ("market_prices", "negotiations")
+
+ROLES = ("farmer", "buyer")
+
+
+class Event:
+    __slots__ = ("id", "topic", "data")
+
+    def __init__(self, id, topic, data):
+        self.id = id
+        self.topic = topic
+        self.data = data
+
+
+class Subscription:
+    """One listener: a bounded queue of events for a user in a role."""
+
+    def __init__(self, user_id, role, topics, queue_size):
+        self.user_id = user_id
+        self.role = role
+        self.topics = frozenset(topics)
+        self.queue = asyncio.Queue(queue_size)
+        self.dropped = 0
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A slow reader must not hold up the publisher or grow without
+            # bound: drop its backlog and tell it to refetch instead.
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(Event(event.id, "resync", {"topics": sorted(self.topics)}))
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class EventBroker:
+    """In-process pub/sub fan-out for the API's push channel.
+
+    Subscribers are indexed by topic and by (user_id, role), so a publish
+    only touches the queues that should receive the event. Idle
+    subscribers cost one small queue each and nothing per publish on
+    other users' events. Publish and subscribe must run on the event
+    loop thread.
+    """
+
+    def __init__(self, queue_size=EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._by_topic = defaultdict(set)
+        self._by_user = defaultdict(set)
+        self._ids = itertools.count(1)
+        self.published = 0
+        self._relay = None
+
+    def subscribe(self, user_id, role, topics=TOPICS):
+        subscription = Subscription(user_id, role, topics, self.queue_size)
+        for topic in subscription.topics:
+            self._by_topic[topic].add(subscription)
+        self._by_user[(user_id, role)].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        for topic in subscription.topics:
+            self._by_topic[topic].discard(subscription)
+        key = (subscription.user_id, subscription.role)
+        self._by_user[key].discard(subscription)
+        if not self._by_user[key]:
+            del self._by_user[key]
+
+    async def publish(self, topic, data, recipients=None):
+        """Send ``data`` to the subscribers of ``topic``.
+
+        ``recipients`` limits delivery to the given (user_id, role) pairs;
+        None sends to every subscriber of the topic. With a relay, the event
+        goes out through Redis to the brokers of every worker, this one
+        included; the return value is then None.
+        """
+        if self._relay is not None:
+            await self._relay.send(topic, data, recipients)
+            self.published += 1
+            return None
+        return self._deliver(topic, data, recipients)
+
+    def _deliver(self, topic, data, recipients=None):
+        event = Event(next(self._ids), topic, data)
+        if recipients is None:
+            targets = list(self._by_topic.get(topic, ()))
+        else:
+            targets = [
+                subscription
+                for key in recipients
+                for subscription in self._by_user.get(key, ())
+                if topic in subscription.topics
+            ]
+        for subscription in targets:
+            subscription.deliver(event)
+        if self._relay is None:
+            self.published += 1
+        return len(targets)
+
+    def relay_through_redis(self, loop):
+        """Share events with the other API workers; call once from the event loop at startup."""
+        if self._relay is None:
+            self._relay = RedisEventRelay(self, loop)
+            self._relay.start()
+
+    def stats(self):
+        return {
+            "subscribers": sum(len(subs) for subs in self._by_user.values()),
+            "users": len(self._by_user),
+            "published": self.published,
+        }
+
+
+class RedisEventRelay:
+    """Carries a broker's events to the brokers of every API worker over Redis pub/sub.
+
+    Each worker listens on one channel in a background thread and hands
+    what it receives to its own event loop, which delivers to the local
+    subscribers.
+    """
+
+    def __init__(self, broker, loop, channel=f"{REDIS_PREFIX}events"):
+        self.broker = broker
+        self.loop = loop
+        self.channel = channel
+
+    def start(self):
+        threading.Thread(target=self._listen, daemon=True, name="event-relay").start()
+
+    async def send(self, topic, data, recipients=None):
+        message = {"topic": topic, "data": data, "recipients": None if recipients is None else [list(r) for r in recipients]}
+        await async_redis_client().publish(self.channel, json.dumps(message, default=str))
+
+    def _listen(self):
+        delay = 1
+        while True:
+            try:
+                pubsub = redis_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                delay = 1
+                for message in pubsub.listen():
+                    try:
+                        event = json.loads(message["data"])
+                        topic, data, recipients = event["topic"], event["data"], event["recipients"]
+                        if recipients is not None:
+                            recipients = [tuple(r) for r in recipients]
+                    except (ValueError, KeyError, TypeError):
+                        # One bad message is skipped; the subscription stays up
+                        logger.warning("Skipping malformed event on %s: %r", self.channel, message["data"], exc_info=True)
+                        continue
+                    self.loop.call_soon_threadsafe(self.broker._deliver, topic, data, recipients)
+            except Exception:
+                if self.loop.is_closed():
+                    return
+                logger.warning("Event relay lost its Redis subscription; retrying in %ss", delay, exc_info=True)
+            if self.loop.is_closed():
+                return
+            # Events published while disconnected are lost: ask everyone to refetch
+            self.loop.call_soon_threadsafe(self._resync)
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    def _resync(self):
+        for topic in TOPICS:
+            self.broker._deliver(topic, {"action": "resync"})
+
+
+broker = EventBroker()
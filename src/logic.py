@@ -1,173 +1,364 @@
-from src.db import DatabaseManager
+# Validation, planning and result shaping shared by the operations in
+# src/async_logic.py, and blocking wrappers of those operations for scripts
+import asyncio
+import datetime
+import inspect
+import re
+import threading
+
+# Rows per multi-row INSERT in the bulk endpoints
+BULK_CHUNK_SIZE = 500
+
+# Rows per keyset page when exporting whole tables
+EXPORT_PAGE_SIZE = 1000
+
+
+# ===================== BULK ROW VALIDATION =====================
+def _clean(value):
+    if isinstance(value, str):
+        value = value.strip()
+    return None if value == "" else value
+
+
+def _iso_date(value):
+    value = _clean(value)
+    if value is None:
+        raise ValueError("date is required")
+    return datetime.date.fromisoformat(str(value)).isoformat()
+
+
+def validate_price_row(row):
+    """Return (clean_row, None) or (None, error message) for one bulk price row."""
+    try:
+        crop_name = _clean(row.get("crop_name"))
+        if not crop_name:
+            raise ValueError("crop_name is required")
+        price = _clean(row.get("price_per_kg"))
+        if price is None:
+            raise ValueError("price_per_kg is required")
+        price = float(price)
+        if price < 0:
+            raise ValueError("price_per_kg must not be negative")
+        buyer_id = _clean(row.get("buyer_id"))
+        if buyer_id is None:
+            raise ValueError("buyer_id is required")
+        return {"crop_name": crop_name, "date": _iso_date(row.get("date")), "price_per_kg": price, "buyer_id": int(buyer_id)}, None
+    except (AttributeError, TypeError, ValueError) as exc:
+        return None, str(exc)
+
+
+def validate_stats_query(crop_name, date_from=None, date_to=None, window=7):
+    """Normalise the arguments of a price statistics query; raises ValueError."""
+    if not crop_name:
+        raise ValueError("crop_name is required")
+    date_from = _iso_date(date_from) if _clean(date_from) else None
+    date_to = _iso_date(date_to) if _clean(date_to) else None
+    if date_from and date_to and date_from > date_to:
+        raise ValueError("'from' must not be after 'to'")
+    window = int(window or 7)
+    if not 1 <= window <= 365:
+        raise ValueError("window must be between 1 and 365 days")
+    return crop_name, date_from, date_to, window
+
+
+# Free-text weather column -> (numeric column, lowest, highest accepted value)
+WEATHER_MEASURES = {
+    "temperature": ("temperature_c", -90.0, 60.0),
+    "rainfall": ("rainfall_mm", 0.0, 2000.0),
+    "humidity": ("humidity_pct", 0.0, 100.0),
+}
+
+WEATHER_GRANULARITIES = ("day", "week", "month")
+
+_NUMBER = re.compile(r"[-+]?\d+(?:\.\d+)?")
+
+
+def parse_measure(column, value):
+    """'31 °C' -> 31.0 for one free-text weather column; raises ValueError.
+
+    Temperatures ending in F are converted to Celsius. Returns None for
+    an empty value.
+    """
+    value = _clean(value)
+    if value is None:
+        return None
+    text = str(value)
+    match = _NUMBER.search(text)
+    if not match:
+        raise ValueError(f"{column} must be a number, got '{text}'")
+    number = float(match.group())
+    if column == "temperature" and text.upper().rstrip(" .").endswith("F"):
+        number = round((number - 32) * 5 / 9, 2)
+    _, low, high = WEATHER_MEASURES[column]
+    if not low <= number <= high:
+        raise ValueError(f"{column} must be between {low:g} and {high:g}, got {number:g}")
+    return number
+
+
+def validate_weather_update(data):
+    """Return (clean_update, None) or (None, error message) for a weather update.
+
+    Changing a free-text reading also rewrites its numeric column.
+    """
+    try:
+        clean = dict(data)
+        if "date" in clean:
+            clean["date"] = _iso_date(clean["date"])
+        for column, (typed, _, _) in WEATHER_MEASURES.items():
+            if column in clean:
+                value = _clean(clean[column])
+                clean[column] = None if value is None else str(value)
+                clean[typed] = parse_measure(column, value)
+        return clean, None
+    except (AttributeError, TypeError, ValueError) as exc:
+        return None, str(exc)
+
+
+def validate_weather_row(row):
+    """Return (clean_row, None) or (None, error message) for one weather row."""
+    try:
+        clean = {"date": _iso_date(row.get("date"))}
+        for column, (typed, _, _) in WEATHER_MEASURES.items():
+            value = _clean(row.get(column))
+            clean[column] = None if value is None else str(value)
+            clean[typed] = parse_measure(column, value)
+        return clean, None
+    except (AttributeError, TypeError, ValueError) as exc:
+        return None, str(exc)
+
+
+def validate_rollup_query(date_from=None, date_to=None, granularity="day"):
+    """Normalise the arguments of a weather rollup query; raises ValueError."""
+    date_from = _iso_date(date_from) if _clean(date_from) else None
+    date_to = _iso_date(date_to) if _clean(date_to) else None
+    if date_from and date_to and date_from > date_to:
+        raise ValueError("'from' must not be after 'to'")
+    granularity = granularity or "day"
+    if granularity not in WEATHER_GRANULARITIES:
+        raise ValueError(f"granularity must be one of: {', '.join(WEATHER_GRANULARITIES)}")
+    return date_from, date_to, granularity
+
+
+def format_rollup_row(row):
+    """Round the aggregates of one weather_rollup row for the API."""
+    def rounded(value):
+        return None if value is None else round(float(value), 2)
+
+    return {
+        "period": str(row["period"]),
+        "observations": row.get("observations") or 0,
+        "mean_temperature_c": rounded(row.get("mean_temperature_c")),
+        "total_rainfall_mm": rounded(row.get("total_rainfall_mm")),
+        "mean_humidity_pct": rounded(row.get("mean_humidity_pct")),
+    }
 
 
 # ===================== USERS =====================
-class UserOperations:
-    """Bridge between frontend/FastAPI and Users table"""
+def owned_by(rows, owner_id, column="user_id"):
+    """True if ``owner_id`` is None or the first of ``rows`` belongs to that user."""
+    return owner_id is None or bool(rows) and rows[0].get(column) == owner_id
 
-    def __init__(self):
-        self.db = DatabaseManager()
 
-    def add_user(self, name, phone, password, is_admin: bool = False):
-        if not name or not phone or not password:
-            return {"success": False, "message": "name, phone and password are required"}
+def without_password(rows):
+    """User rows as the API may return them."""
+    return [{k: v for k, v in row.items() if k != "password"} for row in rows or []]
 
-        try:
-            result = self.db.add_user(name, phone, password, is_admin)
-        except Exception as exc:
-            return {"success": False, "message": str(exc)}
 
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "message": "User added successfully", "data": getattr(result, "data", None)}
+# ===================== MARKET PRICES =====================
+def newest_prices(rows):
+    """Summary rows for the newest of ``rows`` per (crop_name, buyer_id) and per crop_name.
+
+    Newest means latest date, then highest id, as in get_newest_market_price().
+    Returns (pair_rows, crop_rows) for merge_latest_prices().
+    """
+    pairs, crops = {}, {}
+    for row in rows:
+        entry = {
+            "crop_name": row["crop_name"],
+            "buyer_id": row["buyer_id"],
+            "price_id": row["id"],
+            "date": str(row["date"]),
+            "price_per_kg": row["price_per_kg"],
+        }
+        rank = (entry["date"], entry["price_id"])
+        for newest, key in ((pairs, (entry["crop_name"], entry["buyer_id"])), (crops, entry["crop_name"])):
+            current = newest.get(key)
+            if current is None or rank > (current["date"], current["price_id"]):
+                newest[key] = entry
+    return list(pairs.values()), list(crops.values())
 
-    def get_all(self):
-        result = self.db.get_all()
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "data": getattr(result, "data", None)}
 
-    def update_user(self, user_id, data: dict):
-        result = self.db.update_user(user_id, data)
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "message": "User updated successfully", "data": getattr(result, "data", None)}
+# ===================== NEGOTIATIONS =====================
+# Allowed status changes; accepted and rejected are final
+NEGOTIATION_TRANSITIONS = {
+    "pending": {"countered", "accepted", "rejected"},
+    "countered": {"countered", "accepted", "rejected"},
+    "accepted": set(),
+    "rejected": set(),
+}
+
+NEGOTIATION_STATUSES = tuple(NEGOTIATION_TRANSITIONS)
+
+# Fields either party may change while a negotiation is open
+NEGOTIATION_FIELDS = {"status", "quantity_kg", "proposed_price", "notes"}
+
+# Fields that make up the offer on the table
+NEGOTIATION_TERMS = {"quantity_kg", "proposed_price"}
+
+
+def plan_negotiation_update(data, version, actor_id=None):
+    """Return (update, conditions, None) or (None, None, error message).
+
+    ``update`` includes the next version, and ``conditions`` the keyword
+    arguments of update_negotiation() that make the write a single
+    compare-and-set: the states the row must still be in and, for
+    ``actor_id``, whose move it must be. Parties take turns: only the
+    party that did not make the current offer may accept, reject or
+    counter it, and only the one that made it may change its terms
+    without countering.
+    """
+    if version is None:
+        return None, None, "version is required"
+    unknown = set(data) - NEGOTIATION_FIELDS
+    if unknown:
+        return None, None, f"Cannot change negotiation fields: {', '.join(sorted(unknown))}"
+    if not data:
+        return None, None, "Nothing to update"
+
+    status = data.get("status")
+    if status is None:
+        from_statuses = {state for state, targets in NEGOTIATION_TRANSITIONS.items() if targets}
+    elif status not in NEGOTIATION_TRANSITIONS:
+        return None, None, f"status must be one of: {', '.join(NEGOTIATION_STATUSES)}"
+    else:
+        from_statuses = {state for state, targets in NEGOTIATION_TRANSITIONS.items() if status in targets}
+    if status == "countered" and data.get("proposed_price") is None:
+        return None, None, "A counter-offer needs a proposed_price"
+
+    update = {**data, "version": int(version) + 1}
+    conditions = {"from_statuses": sorted(from_statuses)}
+    if actor_id is not None:
+        if status is not None:
+            conditions["turn_of"] = actor_id
+            update["last_actor_id"] = actor_id
+        elif NEGOTIATION_TERMS & set(data):
+            conditions["last_actor_id"] = actor_id
+    return update, conditions, None
+
+
+def negotiation_conflict(result, negotiation_id, version, status=None, party_id=None, conditions=None):
+    """Response for a compare-and-set update that matched no row, from a fresh read.
+
+    With ``party_id``, a negotiation that user is not part of is reported
+    as not found. ``conditions`` are those from plan_negotiation_update().
+    """
+    conditions = conditions or {}
+    rows = getattr(result, "data", None) or []
+    if rows and party_id is not None and party_id not in (rows[0].get("farmer_id"), rows[0].get("buyer_id")):
+        rows = []
+    if not rows:
+        return {"success": False, "not_found": True, "message": f"Negotiation {negotiation_id} not found"}
+    current = rows[0]
+    still_open = current.get("status") in conditions.get("from_statuses", ())
+    if current.get("version") != version:
+        message = f"Negotiation was changed by someone else (now version {current.get('version')}), reload it and try again"
+    elif still_open and "turn_of" in conditions:
+        message = "The other party has not answered your offer yet"
+    elif still_open and "last_actor_id" in conditions:
+        message = "Only the party that made the current offer can change its terms; counter it instead"
+    elif status:
+        message = f"Cannot move a negotiation from {current.get('status')} to {status}"
+    else:
+        message = f"Negotiation is {current.get('status')} and can no longer be changed"
+    return {"success": False, "conflict": True, "message": message, "data": rows}
+
+
+# ===================== BLOCKING OPERATIONS =====================
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def run(coro):
+    """Run ``coro`` on the background event loop of the blocking operations and return its result.
+
+    One long-lived loop rather than asyncio.run() per call: the async
+    database and Redis clients keep connections tied to the loop that
+    opened them.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            from src.db import get_async_database_manager
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, daemon=True, name="blocking-operations").start()
+            asyncio.run_coroutine_threadsafe(get_async_database_manager().connect(), loop).result()
+            _loop = loop
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+
+class _Blocking:
+    """Blocking facade over an operations class of src/async_logic.py.
+
+    Coroutine methods run to completion on the background loop, async
+    generators are turned into plain ones, and everything else is passed
+    through, so scripts get the exact behaviour of the API.
+    """
+
+    _async_class = None
 
-    def delete_user(self, user_id):
-        result = self.db.delete_user(user_id)
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "message": "User deleted successfully"}
+    def __init__(self):
+        # Imported here: src.async_logic imports the helpers above
+        from src import async_logic
+        self._operations = getattr(async_logic, self._async_class)()
 
+    def __getattr__(self, name):
+        method = getattr(self._operations, name)
+        if inspect.isasyncgenfunction(method):
+            def iterate(*args, **kwargs):
+                pages = method(*args, **kwargs)
+                while True:
+                    try:
+                        yield run(pages.__anext__())
+                    except StopAsyncIteration:
+                        return
+            return iterate
+        if inspect.iscoroutinefunction(method):
+            def call(*args, **kwargs):
+                return run(method(*args, **kwargs))
+            return call
+        return method
 
-# ===================== CROPS =====================
-class CropsOperations:
-    """Bridge between frontend/FastAPI and Crops table"""
 
-    def __init__(self):
-        self.db = DatabaseManager()
-
-    def add_crop(self, user_id, crop_name, area=None, sow_date=None, fertilizer=None, expected_yield=None):
-        if not user_id or not crop_name:
-            return {"success": False, "message": "user_id and crop_name are required"}
-        
-        result = self.db.add_crop(user_id, crop_name, area, sow_date, fertilizer, expected_yield)
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "message": "Crop added successfully", "data": getattr(result, "data", None)}
-
-    def get_crops_by_user(self, user_id):
-        result = self.db.get_crops_by_user(user_id)
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "data": getattr(result, "data", None)}
-
-    def update_crop(self, crop_id, data: dict):
-        result = self.db.update_crop(crop_id, data)
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "message": "Crop updated successfully", "data": getattr(result, "data", None)}
-
-    def delete_crop(self, crop_id):
-        result = self.db.delete_crop(crop_id)
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "message": "Crop deleted successfully"}
+class UserOperations(_Blocking):
+    """Bridge between scripts and Users table"""
+    _async_class = "AsyncUserOperations"
 
 
-# ===================== MARKET PRICES =====================
-class MarketOperations:
-    """Bridge between frontend/FastAPI and Market Prices table"""
+class CropsOperations(_Blocking):
+    """Bridge between scripts and Crops table"""
+    _async_class = "AsyncCropsOperations"
 
-    def __init__(self):
-        self.db = DatabaseManager()
-
-    def add_price(self, crop_name, date, price_per_kg, buyer_id):
-        if not crop_name or not date or price_per_kg is None or not buyer_id:
-            return {"success": False, "message": "All fields are required"}
-        
-        result = self.db.add_market_price(crop_name, date, price_per_kg, buyer_id)
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "message": "Market price added successfully", "data": getattr(result, "data", None)}
-
-    def get_prices(self, crop_name=None):
-        result = self.db.get_market_prices(crop_name)
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "data": getattr(result, "data", None)}
-
-    def update_price(self, price_id, data: dict):
-        result = self.db.update_market_price(price_id, data)
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "message": "Market price updated successfully", "data": getattr(result, "data", None)}
-
-    def delete_price(self, price_id):
-        result = self.db.delete_market_price(price_id)
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "message": "Market price deleted successfully"}
-
-
-# ===================== WEATHER =====================
-class WeatherOperations:
-    """Bridge between frontend/FastAPI and Weather table"""
 
-    def __init__(self):
-        self.db = DatabaseManager()
-
-    def add_weather(self, date, temperature=None, rainfall=None, humidity=None):
-        if not date:
-            return {"success": False, "message": "Date is required"}
-        
-        result = self.db.add_weather(date, temperature, rainfall, humidity)
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "message": "Weather data added successfully", "data": getattr(result, "data", None)}
-
-    def get_weather(self, date=None):
-        result = self.db.get_weather(date)
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "data": getattr(result, "data", None)}
-
-    def update_weather(self, weather_id, data: dict):
-        result = self.db.update_weather(weather_id, data)
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "message": "Weather updated successfully", "data": getattr(result, "data", None)}
-
-    def delete_weather(self, weather_id):
-        result = self.db.delete_weather(weather_id)
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "message": "Weather deleted successfully"}
+class MarketOperations(_Blocking):
+    """Bridge between scripts and Market Prices table"""
+    _async_class = "AsyncMarketOperations"
 
 
-# ===================== NEGOTIATIONS =====================
-class NegotiationOperations:
-    """Bridge between frontend/FastAPI and Negotiations table"""
+class MarketAnalyticsOperations(_Blocking):
+    """Price statistics for scripts"""
+    _async_class = "AsyncMarketAnalyticsOperations"
 
-    def __init__(self):
-        self.db = DatabaseManager()
-
-    def add_negotiation(self, farmer_id, buyer_id, crop_name, quantity_kg, proposed_price, notes=None):
-        if not farmer_id or not buyer_id or not crop_name or quantity_kg is None or proposed_price is None:
-            return {"success": False, "message": "All fields are required"}
-        result = self.db.add_negotiation(farmer_id, buyer_id, crop_name, quantity_kg, proposed_price, notes)
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "message": "Negotiation created", "data": getattr(result, "data", None)}
-
-    def get_negotiations_for_user(self, user_id, role):
-        result = self.db.get_negotiations_for_user(user_id, role)
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "data": getattr(result, "data", None)}
-
-    def update_negotiation(self, negotiation_id, data: dict):
-        result = self.db.update_negotiation(negotiation_id, data)
-        if getattr(result, "error", None):
-            return {"success": False, "message": str(result.error)}
-        return {"success": True, "message": "Negotiation updated", "data": getattr(result, "data", None)}
+
+class WeatherOperations(_Blocking):
+    """Bridge between scripts and Weather table"""
+    _async_class = "AsyncWeatherOperations"
+
+
+class NegotiationOperations(_Blocking):
+    """Bridge between scripts and Negotiations table"""
+    _async_class = "AsyncNegotiationOperations"
+
+
+class DashboardOperations(_Blocking):
+    """Aggregated counts for the farmer and buyer dashboards"""
+    _async_class = "AsyncDashboardOperations"
@@ -0,0 +1,287 @@
+import bisect
+import functools
+import inspect
+import os
+import threading
+import time
+
+from src.tracing import TRACING_ENABLED, record_query
+
+# Set METRICS_ENABLED=false to skip all timing
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() not in ("0", "false", "no")
+
+# Histogram bucket upper bounds in seconds, shared by requests and queries
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Routes are labelled by their template; anything that matched none shares one label
+UNMATCHED_ROUTE = "<unmatched>"
+
+# Words in a DatabaseManager method name and the table it queries, most specific first
+TABLE_WORDS = (
+    ("crop_insight", "crop_insights"),
+    ("latest_crop_price", "latest_crop_prices"),
+    ("latest_price", "latest_market_prices"),
+    ("market_price", "market_prices"),
+    ("price_series", "market_prices"),
+    ("negotiation", "negotiations"),
+    ("weather", "weather"),
+    ("crop", "crops"),
+    ("farmers", "users"),
+    ("user", "users"),
+    ("get_all", "users"),
+)
+
+# Leading verb of a DatabaseManager method name -> operation label
+OPERATION_VERBS = {
+    "add": "insert",
+    "get": "select",
+    "update": "update",
+    "delete": "delete",
+    "count": "count",
+    "upsert": "upsert",
+    "merge": "upsert",
+    "adjust": "rpc",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def db_labels(method):
+    """'get_crops_by_user' -> ('crops', 'select'); 'weather_rollup' -> ('weather', 'rollup')."""
+    table = next((table for word, table in TABLE_WORDS if word in method), "other")
+    verb = method.split("_", 1)[0]
+    return table, OPERATION_VERBS.get(verb, method.rsplit("_", 1)[-1])
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """Request and query counters and latency histograms, rendered for Prometheus.
+
+    Observing is a dict lookup, a bisect and a few additions under one lock,
+    so it is cheap enough for every request and every query.
+    """
+
+    REQUEST_LABELS = ("method", "route")
+    DB_LABELS = ("table", "op")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.requests = {}         # (method, route, status) -> count
+        self.request_errors = {}   # (method, route) -> count of 5xx and unhandled errors
+        self.request_latency = {}  # (method, route) -> Histogram
+        self.queries = {}          # (table, op) -> Histogram
+        self.query_errors = {}     # (table, op) -> count
+
+    def observe_request(self, method, route, status, seconds=None):
+        key = (method, route)
+        with self._lock:
+            status_key = (method, route, status)
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            if status >= 500:
+                self.request_errors[key] = self.request_errors.get(key, 0) + 1
+            if seconds is not None:
+                histogram = self.request_latency.get(key)
+                if histogram is None:
+                    histogram = self.request_latency[key] = Histogram()
+                histogram.observe(seconds)
+
+    def observe_query(self, table, op, seconds, failed=False):
+        key = (table, op)
+        with self._lock:
+            histogram = self.queries.get(key)
+            if histogram is None:
+                histogram = self.queries[key] = Histogram()
+            histogram.observe(seconds)
+            if failed:
+                self.query_errors[key] = self.query_errors.get(key, 0) + 1
+
+    def _histogram_lines(self, name, label_names, histograms):
+        for values, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), histogram.counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                yield f"{name}_bucket{_labels(label_names, values, le)} {cumulative}"
+            yield f"{name}_sum{_labels(label_names, values)} {histogram.sum:.6f}"
+            yield f"{name}_count{_labels(label_names, values)} {histogram.count}"
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            requests = dict(self.requests)
+            request_errors = dict(self.request_errors)
+            request_latency = {key: _copy(h) for key, h in self.request_latency.items()}
+            queries = {key: _copy(h) for key, h in self.queries.items()}
+            query_errors = dict(self.query_errors)
+
+        lines = [
+            "# HELP process_start_time_seconds Start time of the process since the Unix epoch.",
+            "# TYPE process_start_time_seconds gauge",
+            f"process_start_time_seconds {self.started:.3f}",
+            "# HELP http_requests_total HTTP requests by route template and status code.",
+            "# TYPE http_requests_total counter",
+        ]
+        lines += [
+            f"http_requests_total{_labels(self.REQUEST_LABELS + ('status',), key)} {count}"
+            for key, count in sorted(requests.items())
+        ]
+        lines += [
+            "# HELP http_request_errors_total HTTP requests that failed with a 5xx status or an unhandled error.",
+            "# TYPE http_request_errors_total counter",
+        ]
+        lines += [
+            f"http_request_errors_total{_labels(self.REQUEST_LABELS, key)} {count}"
+            for key, count in sorted(request_errors.items())
+        ]
+        lines += [
+            "# HELP http_request_duration_seconds Time from receiving a request to sending the last byte of its response.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        lines += self._histogram_lines("http_request_duration_seconds", self.REQUEST_LABELS, request_latency)
+        lines += [
+            "# HELP db_query_duration_seconds Time spent in DatabaseManager calls by table and operation.",
+            "# TYPE db_query_duration_seconds histogram",
+        ]
+        lines += self._histogram_lines("db_query_duration_seconds", self.DB_LABELS, queries)
+        lines += [
+            "# HELP db_query_errors_total DatabaseManager calls that raised or returned an error.",
+            "# TYPE db_query_errors_total counter",
+        ]
+        lines += [
+            f"db_query_errors_total{_labels(self.DB_LABELS, key)} {count}"
+            for key, count in sorted(query_errors.items())
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def _copy(histogram):
+    copy = Histogram()
+    copy.counts = list(histogram.counts)
+    copy.sum = histogram.sum
+    copy.count = histogram.count
+    return copy
+
+
+metrics = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware that counts and times every HTTP request.
+
+    The route label is the matched path template (``/crops/{user_id}``), so
+    ids in URLs do not create new series. Event streams are counted but not
+    timed, since they stay open for as long as the client listens.
+    """
+
+    def __init__(self, app, registry=metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = 500
+        streaming = False
+
+        async def send_and_record(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                streaming = any(
+                    k == b"content-type" and v.startswith(b"text/event-stream") for k, v in message.get("headers", ())
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            route = scope.get("route")
+            self.registry.observe_request(
+                scope["method"],
+                getattr(route, "path", UNMATCHED_ROUTE),
+                status,
+                None if streaming else time.perf_counter() - started,
+            )
+
+
+class InstrumentedDatabaseManager:
+    """Proxy that times every call on a sync or async DatabaseManager.
+
+    Calls are labelled with db_labels(method name), recorded in the metrics
+    registry and added to the current request's trace. For async managers
+    the time runs until the returned awaitable completes. A call counts as
+    an error when it raises or its result carries an ``error``.
+    """
+
+    def __init__(self, manager, registry=metrics):
+        self._manager = manager
+        self._registry = registry
+
+    def __getattr__(self, name):
+        method = getattr(self._manager, name)
+        if not callable(method) or name.startswith("_") or name == "connect":
+            return method
+        table, op = db_labels(name)
+        registry = self._registry
+
+        def done(started, args, kwargs, result=None, failed=True):
+            seconds = time.perf_counter() - started
+            if METRICS_ENABLED:
+                registry.observe_query(table, op, seconds, failed)
+            record_query(table, op, name, args, kwargs, seconds, result)
+
+        async def timed_await(awaitable, started, args, kwargs):
+            result, failed = None, True
+            try:
+                result = await awaitable
+                failed = getattr(result, "error", None) is not None
+                return result
+            finally:
+                done(started, args, kwargs, result, failed)
+
+        def call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except Exception:
+                done(started, args, kwargs)
+                raise
+            if inspect.isawaitable(result):
+                return timed_await(result, started, args, kwargs)
+            done(started, args, kwargs, result, getattr(result, "error", None) is not None)
+            return result
+
+        # Later lookups find the wrapper directly and skip __getattr__
+        setattr(self, name, call)
+        return call
+
+
+def instrument(manager):
+    """Wrap ``manager`` in InstrumentedDatabaseManager unless metrics and tracing are both off."""
+    return InstrumentedDatabaseManager(manager) if METRICS_ENABLED or TRACING_ENABLED else manager
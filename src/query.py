@@ -0,0 +1,143 @@
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Columns each table can be ordered by. Orderings are made unique by
+# breaking ties on "id", which is why the cursor carries both values.
+# NULLs sort as if larger than any value: last ascending, first descending,
+# which is Postgres' default and is spelled out for SQLite.
+ORDER_COLUMNS = {
+    "users": {"id", "name", "created_at"},
+    "crops": {"id", "crop_name", "sow_date", "created_at"},
+    "market_prices": {"id", "crop_name", "date", "price_per_kg"},
+    "weather": {"id", "date"},
+    "negotiations": {"id", "crop_name", "status"},
+}
+
+DEFAULT_ORDER = {
+    "users": "id",
+    "crops": "id",
+    "market_prices": "-date",
+    "weather": "-date",
+    "negotiations": "id",
+}
+
+
+# Columns each table may return through ``fields=``. Anything not listed,
+# such as users.password, is never selected for API reads.
+SELECTABLE_COLUMNS = {
+    "users": ("id", "name", "phone", "is_admin", "created_at"),
+    "crops": ("id", "user_id", "crop_name", "area", "sow_date", "fertilizer", "expected_yield", "created_at"),
+    "market_prices": ("id", "crop_name", "date", "price_per_kg", "buyer_id"),
+    "latest_market_prices": ("crop_name", "buyer_id", "price_id", "date", "price_per_kg"),
+    "weather": ("id", "date", "temperature", "rainfall", "humidity", "temperature_c", "rainfall_mm", "humidity_pct", "created_at"),
+    "negotiations": ("id", "farmer_id", "buyer_id", "crop_name", "quantity_kg", "proposed_price", "notes", "status", "version", "last_actor_id", "created_at"),
+}
+
+# Columns the operations layer needs on every row, whatever was asked for
+REQUIRED_COLUMNS = {
+    "latest_market_prices": ("crop_name", "date"),
+}
+
+
+def select_columns(table, fields=None, order_by=None):
+    """'name,phone' -> 'id,name,phone' for select(). Raises ValueError for unknown columns.
+
+    Without ``fields`` every selectable column is returned. The id and the
+    order column are always included, so keyset cursors can be built.
+    """
+    allowed = SELECTABLE_COLUMNS[table]
+    if fields:
+        wanted = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = wanted - set(allowed)
+        if unknown:
+            raise ValueError(f"Cannot select {', '.join(sorted(unknown))} from {table}, expected some of: {', '.join(allowed)}")
+    else:
+        wanted = set(allowed)
+    if table in ORDER_COLUMNS:
+        wanted |= {"id", parse_order(table, order_by)[0]}
+    wanted |= set(REQUIRED_COLUMNS.get(table, ()))
+    return ",".join(column for column in allowed if column in wanted)
+
+
+def parse_order(table, order_by=None):
+    """'-date' -> ('date', True). Raises ValueError for columns not in ORDER_COLUMNS."""
+    order_by = order_by or DEFAULT_ORDER[table]
+    desc = order_by.startswith("-")
+    column = order_by.lstrip("-")
+    if column not in ORDER_COLUMNS[table]:
+        allowed = ", ".join(sorted(ORDER_COLUMNS[table]))
+        raise ValueError(f"Cannot order {table} by '{column}', expected one of: {allowed}")
+    return column, desc
+
+
+def encode_cursor(row, column):
+    raw = json.dumps([row.get(column), row.get("id")], default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, last_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    return value, last_id
+
+
+def _quote(value):
+    # PostgREST treats , . : ( ) as syntax inside or=(...) unless quoted
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def apply_keyset(query, table, order_by=None, limit=None, after=None):
+    """Add ordering, the keyset condition for ``after`` and a look-ahead limit.
+
+    One extra row is requested so split_page() can tell whether another
+    page exists without a second round-trip.
+    """
+    column, desc = parse_order(table, order_by)
+    op = "lt" if desc else "gt"
+    if after:
+        value, last_id = decode_cursor(after)
+        if column == "id":
+            query = query.filter("id", op, last_id)
+        elif value is None:
+            # Ascending, the NULLs come last; descending, every non-NULL follows them
+            rest = "" if not desc else f",{column}.not.is.null"
+            query = query.or_(f"and({column}.is.null,id.{op}.{_quote(last_id)}){rest}")
+        else:
+            # Ascending, the NULLs are still to come
+            rest = "" if desc else f",{column}.is.null"
+            query = query.or_(
+                f"{column}.{op}.{_quote(value)},"
+                f"and({column}.eq.{_quote(value)},id.{op}.{_quote(last_id)}){rest}"
+            )
+    query = query.order(column, desc=desc, nullsfirst=desc)
+    if column != "id":
+        query = query.order("id", desc=desc)
+    if limit:
+        query = query.limit(limit + 1)
+    return query
+
+
+def split_page(rows, table, order_by=None, limit=None):
+    """Drop the look-ahead row and return (rows, next_cursor)."""
+    rows = rows or []
+    if not limit or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    column, _ = parse_order(table, order_by)
+    return rows, encode_cursor(rows[-1], column)
+
+
+def to_columns(rows):
+    """[{"a": 1, "b": 2}, {"a": 3}] -> {"a": [1, 3], "b": [2, None]}"""
+    columns = {}
+    for row in rows:
+        for column in row:
+            columns.setdefault(column, None)
+    return {column: [row.get(column) for row in rows] for column in columns}
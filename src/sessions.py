@@ -0,0 +1,157 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+
+from src.cache import CACHE_BACKEND, REDIS_PREFIX, TTLCache, async_redis_client
+
+# Signs session tokens. Without it every process makes up its own, so
+# tokens stop working on restart and are not accepted by other workers.
+SESSION_SECRET = os.getenv("SESSION_SECRET") or secrets.token_hex(32)
+
+# Seconds a session token stays valid after login
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(12 * 3600)))
+
+# Identities kept in memory; a token missing from the cache is verified again
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class Identity:
+    __slots__ = ("user_id", "is_admin", "session_id", "issued_at", "expires_at")
+
+    def __init__(self, user_id, is_admin, session_id, issued_at, expires_at):
+        self.user_id = user_id
+        self.is_admin = is_admin
+        self.session_id = session_id
+        self.issued_at = issued_at
+        self.expires_at = expires_at
+
+    @property
+    def role(self):
+        return "buyer" if self.is_admin else "farmer"
+
+
+class SessionStore:
+    """Issues, resolves and revokes signed session tokens.
+
+    A token is ``payload.signature`` where the payload carries the user id,
+    the admin flag, a random session id and the issue and expiry times,
+    signed with HMAC-SHA256. Resolving one is a dict lookup in the identity
+    cache, or a signature check on a miss; neither touches the database.
+    Revoked sessions, and every session of a user issued before
+    revoke_user(), are refused until they would have expired anyway.
+
+    With ``shared`` the revocations live in Redis, so a logout handled by
+    one API worker is seen by all of them; resolving then costs one Redis
+    round-trip instead of none. That is why resolve() and the revoke
+    methods are coroutines: they run on the API's event loop.
+    """
+
+    def __init__(self, secret=SESSION_SECRET, ttl=SESSION_TTL, max_entries=SESSION_CACHE_SIZE, shared=CACHE_BACKEND == "redis"):
+        self._secret = secret.encode()
+        self.ttl = ttl
+        self.shared = shared
+        self._prefix = f"{REDIS_PREFIX}sessions:"
+        self._identities = TTLCache(ttl=ttl, max_entries=max_entries)
+        self._revoked = {}      # session_id -> expires_at
+        self._not_before = {}   # user_id -> sessions issued at or before this time are refused
+        self._lock = threading.Lock()
+
+    def _sign(self, payload):
+        return _b64(hmac.new(self._secret, payload.encode(), hashlib.sha256).digest())
+
+    def issue(self, user):
+        """Return a new token for ``user`` (a users row)."""
+        now = time.time()
+        identity = Identity(int(user["id"]), bool(user.get("is_admin")), secrets.token_hex(8), now, now + self.ttl)
+        payload = _b64(f"{identity.user_id}:{int(identity.is_admin)}:{identity.session_id}:{now:.6f}:{identity.expires_at:.6f}".encode())
+        token = f"{payload}.{self._sign(payload)}"
+        self._identities.set(token, identity)
+        return token
+
+    def _verify(self, token):
+        payload, _, signature = token.partition(".")
+        if not signature or not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        try:
+            user_id, is_admin, session_id, issued_at, expires_at = _unb64(payload).decode().split(":")
+            return Identity(int(user_id), is_admin == "1", session_id, float(issued_at), float(expires_at))
+        except ValueError:
+            return None
+
+    async def resolve(self, token):
+        """Return the Identity behind ``token``, or None if it is invalid, expired or revoked."""
+        if not token:
+            return None
+        identity = self._identities.get(token)
+        if identity is None:
+            identity = self._verify(token)
+            if identity is None:
+                return None
+            self._identities.set(token, identity)
+        if identity.expires_at < time.time():
+            return None
+        if self.shared:
+            pipe = async_redis_client().pipeline(transaction=False)
+            pipe.exists(f"{self._prefix}revoked:{identity.session_id}")
+            pipe.get(f"{self._prefix}not_before:{identity.user_id}")
+            revoked, not_before = await pipe.execute()
+            if revoked:
+                return None
+            not_before = float(not_before) if not_before is not None else None
+        else:
+            with self._lock:
+                if identity.session_id in self._revoked:
+                    return None
+                not_before = self._not_before.get(identity.user_id)
+        if not_before is not None and identity.issued_at <= not_before:
+            return None
+        return identity
+
+    async def revoke(self, token):
+        """End the session of ``token``; returns False if it was not a valid session."""
+        identity = await self.resolve(token)
+        if identity is None:
+            return False
+        now = time.time()
+        if self.shared:
+            # Kept until the session would have expired anyway
+            await async_redis_client().set(f"{self._prefix}revoked:{identity.session_id}", 1, ex=max(1, int(identity.expires_at - now) + 1))
+            return True
+        with self._lock:
+            # Forget revocations of sessions that have expired by now
+            for session_id in [s for s, expires in self._revoked.items() if expires < now]:
+                del self._revoked[session_id]
+            self._revoked[identity.session_id] = identity.expires_at
+        return True
+
+    async def revoke_user(self, user_id):
+        """End every session of ``user_id`` issued so far, e.g. after a role or password change."""
+        now = time.time()
+        if self.shared:
+            await async_redis_client().set(f"{self._prefix}not_before:{int(user_id)}", now, ex=self.ttl)
+            return
+        with self._lock:
+            # Every session issued before now - ttl has expired anyway
+            for stale in [u for u, since in self._not_before.items() if since < now - self.ttl]:
+                del self._not_before[stale]
+            self._not_before[int(user_id)] = now
+
+    def stats(self):
+        with self._lock:
+            revoked = len(self._revoked)
+        return {"identities": self._identities.stats(), "revoked": revoked}
+
+
+sessions = SessionStore()
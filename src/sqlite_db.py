@@ -0,0 +1,625 @@
+import asyncio
+import sqlite3
+import threading
+
+from src.db import DatabaseManager
+from src.query import decode_cursor, parse_order, select_columns
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    phone TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL,
+    is_admin INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS users_is_admin_idx ON users (is_admin);
+
+CREATE TABLE IF NOT EXISTS crops (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    crop_name TEXT NOT NULL,
+    area REAL,
+    sow_date TEXT,
+    fertilizer TEXT,
+    expected_yield REAL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS crops_user_id_idx ON crops (user_id, id);
+CREATE INDEX IF NOT EXISTS crops_crop_name_idx ON crops (crop_name);
+
+CREATE TABLE IF NOT EXISTS crop_insights (
+    crop_name TEXT PRIMARY KEY,
+    crop_count INTEGER NOT NULL DEFAULT 0,
+    total_area REAL NOT NULL DEFAULT 0,
+    total_yield REAL NOT NULL DEFAULT 0,
+    yield_count INTEGER NOT NULL DEFAULT 0
+);
+
+-- crop_insights changes in the same transaction as the crop row, so it
+-- cannot drift from the crops table
+CREATE TRIGGER IF NOT EXISTS crops_insights_insert AFTER INSERT ON crops BEGIN
+    INSERT INTO crop_insights (crop_name, crop_count, total_area, total_yield, yield_count)
+    VALUES (NEW.crop_name, 1, COALESCE(NEW.area, 0), COALESCE(NEW.expected_yield, 0), NEW.expected_yield IS NOT NULL)
+    ON CONFLICT (crop_name) DO UPDATE SET
+        crop_count = crop_count + excluded.crop_count,
+        total_area = total_area + excluded.total_area,
+        total_yield = total_yield + excluded.total_yield,
+        yield_count = yield_count + excluded.yield_count;
+END;
+
+CREATE TRIGGER IF NOT EXISTS crops_insights_delete AFTER DELETE ON crops BEGIN
+    UPDATE crop_insights SET
+        crop_count = crop_count - 1,
+        total_area = total_area - COALESCE(OLD.area, 0),
+        total_yield = total_yield - COALESCE(OLD.expected_yield, 0),
+        yield_count = yield_count - (OLD.expected_yield IS NOT NULL)
+    WHERE crop_name = OLD.crop_name;
+END;
+
+CREATE TRIGGER IF NOT EXISTS crops_insights_update AFTER UPDATE OF crop_name, area, expected_yield ON crops BEGIN
+    UPDATE crop_insights SET
+        crop_count = crop_count - 1,
+        total_area = total_area - COALESCE(OLD.area, 0),
+        total_yield = total_yield - COALESCE(OLD.expected_yield, 0),
+        yield_count = yield_count - (OLD.expected_yield IS NOT NULL)
+    WHERE crop_name = OLD.crop_name;
+    INSERT INTO crop_insights (crop_name, crop_count, total_area, total_yield, yield_count)
+    VALUES (NEW.crop_name, 1, COALESCE(NEW.area, 0), COALESCE(NEW.expected_yield, 0), NEW.expected_yield IS NOT NULL)
+    ON CONFLICT (crop_name) DO UPDATE SET
+        crop_count = crop_count + excluded.crop_count,
+        total_area = total_area + excluded.total_area,
+        total_yield = total_yield + excluded.total_yield,
+        yield_count = yield_count + excluded.yield_count;
+END;
+
+CREATE TABLE IF NOT EXISTS market_prices (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    crop_name TEXT NOT NULL,
+    date TEXT NOT NULL,
+    price_per_kg REAL NOT NULL,
+    buyer_id INTEGER REFERENCES users(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS market_prices_crop_buyer_date_idx ON market_prices (crop_name, buyer_id, date DESC);
+CREATE INDEX IF NOT EXISTS market_prices_crop_date_idx ON market_prices (crop_name, date, id);
+CREATE INDEX IF NOT EXISTS market_prices_date_idx ON market_prices (date, id);
+
+CREATE TABLE IF NOT EXISTS latest_market_prices (
+    crop_name TEXT NOT NULL,
+    buyer_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    price_id INTEGER NOT NULL REFERENCES market_prices(id) ON DELETE CASCADE,
+    date TEXT NOT NULL,
+    price_per_kg REAL NOT NULL,
+    PRIMARY KEY (crop_name, buyer_id)
+);
+
+CREATE TABLE IF NOT EXISTS latest_crop_prices (
+    crop_name TEXT PRIMARY KEY,
+    buyer_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    price_id INTEGER NOT NULL REFERENCES market_prices(id) ON DELETE CASCADE,
+    date TEXT NOT NULL,
+    price_per_kg REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS weather (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    temperature TEXT,
+    rainfall TEXT,
+    humidity TEXT,
+    temperature_c REAL,
+    rainfall_mm REAL,
+    humidity_pct REAL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS weather_date_idx ON weather (date, id);
+
+CREATE TABLE IF NOT EXISTS negotiations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    farmer_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    buyer_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    crop_name TEXT NOT NULL,
+    quantity_kg REAL,
+    proposed_price REAL,
+    notes TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    version INTEGER NOT NULL DEFAULT 1,
+    last_actor_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS negotiations_buyer_idx ON negotiations (buyer_id, id);
+CREATE INDEX IF NOT EXISTS negotiations_farmer_idx ON negotiations (farmer_id, id);
+CREATE INDEX IF NOT EXISTS negotiations_buyer_status_idx ON negotiations (buyer_id, status, id);
+CREATE INDEX IF NOT EXISTS negotiations_farmer_status_idx ON negotiations (farmer_id, status, id);
+"""
+
+# Columns added after a table was first created: (table, column, type, backfill
+# SQL). Databases created by an older SCHEMA get them on open. Backfills can
+# call parse_measure(column, text), the parser new weather rows go through.
+MIGRATIONS = [
+    ("weather", "temperature_c", "REAL", "UPDATE weather SET temperature_c = parse_measure('temperature', temperature)"),
+    ("weather", "rainfall_mm", "REAL", "UPDATE weather SET rainfall_mm = parse_measure('rainfall', rainfall)"),
+    ("weather", "humidity_pct", "REAL", "UPDATE weather SET humidity_pct = parse_measure('humidity', humidity)"),
+    ("negotiations", "version", "INTEGER NOT NULL DEFAULT 1", None),
+    # Farmers open negotiations, so the offer on the table is taken to be theirs
+    ("negotiations", "last_actor_id", "INTEGER REFERENCES users(id) ON DELETE SET NULL", "UPDATE negotiations SET last_actor_id = farmer_id"),
+]
+
+# Tables and triggers added after the first SCHEMA and the statements that
+# (re)build their data from existing rows, run once when a database gets them
+SCHEMA_BACKFILLS = {
+    "latest_crop_prices": [
+        "INSERT INTO latest_crop_prices (crop_name, buyer_id, price_id, date, price_per_kg)"
+        " SELECT crop_name, buyer_id, id, date, price_per_kg FROM ("
+        "   SELECT *, ROW_NUMBER() OVER (PARTITION BY crop_name ORDER BY date DESC, id DESC) AS rn"
+        "   FROM market_prices) WHERE rn = 1",
+    ],
+    # Before the triggers the application kept crop_insights, and it may have drifted
+    "crops_insights_insert": [
+        "DELETE FROM crop_insights",
+        "INSERT INTO crop_insights (crop_name, crop_count, total_area, total_yield, yield_count)"
+        " SELECT crop_name, COUNT(*), COALESCE(SUM(area), 0), COALESCE(SUM(expected_yield), 0), COUNT(expected_yield)"
+        " FROM crops GROUP BY crop_name",
+    ],
+}
+
+# Start of the period a date falls in; weeks start on Monday like date_trunc('week')
+ROLLUP_PERIODS = {
+    "day": "date",
+    "week": "date(date, '-' || ((CAST(strftime('%w', date) AS INTEGER) + 6) % 7) || ' days')",
+    "month": "strftime('%Y-%m-01', date)",
+}
+
+# Columns callers may set through the update_* methods
+UPDATABLE_COLUMNS = {
+    "users": {"name", "phone", "password", "is_admin"},
+    "crops": {"crop_name", "area", "sow_date", "fertilizer", "expected_yield"},
+    "market_prices": {"crop_name", "date", "price_per_kg", "buyer_id"},
+    "weather": {"date", "temperature", "rainfall", "humidity", "temperature_c", "rainfall_mm", "humidity_pct"},
+    "negotiations": {"crop_name", "quantity_kg", "proposed_price", "notes", "status", "version", "last_actor_id"},
+}
+
+BOOLEAN_COLUMNS = {"is_admin"}
+
+
+def _parse_measure_or_null(column, text):
+    # Imported on first call, so only databases being migrated load src.logic
+    from src.logic import parse_measure
+    try:
+        return parse_measure(column, text)
+    except ValueError:
+        return None
+
+
+class QueryResult:
+    """Result shape of a postgrest APIResponse: ``.data``, ``.count`` and ``.error``."""
+
+    def __init__(self, data=None, count=None, error=None):
+        self.data = data if data is not None else []
+        self.count = count
+        self.error = error
+
+
+class SQLiteDatabaseManager(DatabaseManager):
+    """Local SQLite backend with the same tables and result shape as Supabase.
+
+    Meant for tests, load tests and small single-node deployments. All
+    managers opened on the same path share one connection.
+    """
+
+    _connections = {}
+    _locks = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, path="smart_farming.db"):
+        with SQLiteDatabaseManager._registry_lock:
+            if path not in SQLiteDatabaseManager._connections:
+                conn = sqlite3.connect(path, check_same_thread=False, uri=path.startswith("file:"))
+                conn.row_factory = sqlite3.Row
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA foreign_keys=ON")
+                existing = {row["name"] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+                conn.executescript(SCHEMA)
+                SQLiteDatabaseManager._migrate(conn, existing)
+                SQLiteDatabaseManager._connections[path] = conn
+                SQLiteDatabaseManager._locks[path] = threading.Lock()
+        self._conn = SQLiteDatabaseManager._connections[path]
+        self._lock = SQLiteDatabaseManager._locks[path]
+
+    @staticmethod
+    def _migrate(conn, existing_objects):
+        conn.create_function("parse_measure", 2, _parse_measure_or_null, deterministic=True)
+        if existing_objects:
+            for name, backfill in SCHEMA_BACKFILLS.items():
+                if name not in existing_objects:
+                    for statement in backfill:
+                        conn.execute(statement)
+        for table, column, column_type, backfill in MIGRATIONS:
+            existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                if backfill:
+                    conn.execute(backfill)
+        conn.commit()
+
+    # -------- HELPERS --------
+    @staticmethod
+    def _row(row):
+        data = dict(row)
+        for column in BOOLEAN_COLUMNS & data.keys():
+            data[column] = bool(data[column])
+        return data
+
+    def _run(self, sql, params=()):
+        try:
+            with self._lock:
+                rows = [self._row(r) for r in self._conn.execute(sql, params).fetchall()]
+                self._conn.commit()
+        except sqlite3.Error as exc:
+            return QueryResult(error=str(exc))
+        return QueryResult(data=rows)
+
+    def _count(self, sql, params=()):
+        try:
+            with self._lock:
+                count = self._conn.execute(sql, params).fetchone()[0]
+        except sqlite3.Error as exc:
+            return QueryResult(error=str(exc))
+        return QueryResult(count=count)
+
+    def _insert(self, table, values):
+        columns = ", ".join(values)
+        placeholders = ", ".join("?" for _ in values)
+        return self._run(f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) RETURNING *", tuple(values.values()))
+
+    def _insert_many(self, table, rows, returning=None):
+        if not rows:
+            return QueryResult(count=0)
+        columns = list(rows[0])
+        placeholders = ", ".join("?" for _ in columns)
+        if returning:
+            # One multi-row INSERT, so the new rows come back in a single statement
+            values = ", ".join(f"({placeholders})" for _ in rows)
+            return self._run(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES {values} RETURNING {returning}",
+                [row[c] for row in rows for c in columns],
+            )
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+        try:
+            with self._lock:
+                with self._conn:
+                    self._conn.executemany(sql, [tuple(row[c] for c in columns) for row in rows])
+        except sqlite3.Error as exc:
+            return QueryResult(error=str(exc))
+        return QueryResult(count=len(rows))
+
+    def _update(self, table, row_id, update_data, where=(), params=()):
+        unknown = set(update_data) - UPDATABLE_COLUMNS[table]
+        if unknown:
+            return QueryResult(error=f"Unknown {table} columns: {', '.join(sorted(unknown))}")
+        if not update_data:
+            return QueryResult(error="Nothing to update")
+        assignments = ", ".join(f"{column} = ?" for column in update_data)
+        conditions = " AND ".join(["id = ?", *where])
+        return self._run(
+            f"UPDATE {table} SET {assignments} WHERE {conditions} RETURNING *",
+            tuple(update_data.values()) + (row_id,) + tuple(params),
+        )
+
+    def _delete(self, table, row_id):
+        return self._run(f"DELETE FROM {table} WHERE id = ? RETURNING *", (row_id,))
+
+    def _select_page(self, table, where, params, order_by=None, limit=None, after=None, columns="*"):
+        # Mirrors src.query.apply_keyset: ordered keyset scan plus one look-ahead row
+        column, desc = parse_order(table, order_by)
+        direction = "DESC" if desc else "ASC"
+        clauses, params = list(where), list(params)
+        if after:
+            value, last_id = decode_cursor(after)
+            op = "<" if desc else ">"
+            if column == "id":
+                clauses.append(f"id {op} ?")
+                params.append(last_id)
+            elif value is None:
+                rest = f" OR {column} IS NOT NULL" if desc else ""
+                clauses.append(f"(({column} IS NULL AND id {op} ?){rest})")
+                params.append(last_id)
+            else:
+                rest = "" if desc else f" OR {column} IS NULL"
+                clauses.append(f"(({column}, id) {op} (?, ?){rest})")
+                params += [value, last_id]
+        sql = f"SELECT {columns} FROM {table}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {column} {direction}"
+        if column != "id":
+            # NULLs last ascending and first descending, as in Postgres
+            sql += (" NULLS FIRST" if desc else " NULLS LAST") + f", id {direction}"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+        return self._run(sql, params)
+
+    # -------- USERS --------
+    def add_user(self, name, phone, password, is_admin: bool = False):
+        return self._insert("users", {"name": name, "phone": phone, "password": password, "is_admin": is_admin})
+
+    def get_user_by_phone(self, phone):
+        return self._run("SELECT * FROM users WHERE phone = ? LIMIT 1", (phone,))
+
+    def get_all(self, limit=None, after=None, order_by=None, fields=None):
+        return self._select_page("users", [], [], order_by, limit, after, select_columns("users", fields, order_by))
+
+    def update_user(self, user_id, update_data):
+        return self._update("users", user_id, update_data)
+
+    def delete_user(self, user_id):
+        return self._delete("users", user_id)
+
+    # -------- CROPS --------
+    def add_crop(self, user_id, crop_name, area, sow_date, fertilizer, expected_yield):
+        return self._insert("crops", {
+            "user_id": user_id,
+            "crop_name": crop_name,
+            "area": area,
+            "sow_date": sow_date,
+            "fertilizer": fertilizer,
+            "expected_yield": expected_yield
+        })
+
+    def get_crops_by_user(self, user_id, limit=None, after=None, order_by=None, fields=None):
+        return self._select_page("crops", ["user_id = ?"], [user_id], order_by, limit, after, select_columns("crops", fields, order_by))
+
+    def get_crop(self, crop_id):
+        return self._run("SELECT * FROM crops WHERE id = ? LIMIT 1", (crop_id,))
+
+    def update_crop(self, crop_id, update_data):
+        return self._update("crops", crop_id, update_data)
+
+    def delete_crop(self, crop_id):
+        return self._delete("crops", crop_id)
+
+    # -------- CROP INSIGHTS (summary, one row per crop_name, kept by triggers) --------
+    def get_crop_insights(self):
+        return self._run("SELECT * FROM crop_insights WHERE crop_count > 0 ORDER BY crop_count DESC")
+
+    # -------- MARKET PRICES --------
+    def add_market_price(self, crop_name, date, price_per_kg, buyer_id):
+        return self._insert("market_prices", {
+            "crop_name": crop_name,
+            "date": date,
+            "price_per_kg": price_per_kg,
+            "buyer_id": buyer_id
+        })
+
+    def get_market_prices(self, crop_name: str = None, limit=None, after=None, order_by=None, fields=None):
+        where, params = ([], []) if not crop_name else (["crop_name = ?"], [crop_name])
+        return self._select_page("market_prices", where, params, order_by, limit, after, select_columns("market_prices", fields, order_by))
+
+    def update_market_price(self, price_id, update_data):
+        return self._update("market_prices", price_id, update_data)
+
+    def delete_market_price(self, price_id):
+        return self._delete("market_prices", price_id)
+
+    def add_market_prices_bulk(self, rows):
+        return self._insert_many("market_prices", rows, returning="id, crop_name, buyer_id, date, price_per_kg")
+
+    def get_market_price(self, price_id):
+        return self._run("SELECT * FROM market_prices WHERE id = ? LIMIT 1", (price_id,))
+
+    def get_price_series(self, crop_name, date_from=None, date_to=None, limit=None, after=None):
+        where, params = ["crop_name = ?"], [crop_name]
+        if date_from:
+            where.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("date <= ?")
+            params.append(date_to)
+        return self._select_page("market_prices", where, params, "id", limit, after, columns="id, date, price_per_kg")
+
+    def get_newest_market_price(self, crop_name, buyer_id=None):
+        if buyer_id is None:
+            return self._run(
+                "SELECT id, crop_name, buyer_id, date, price_per_kg FROM market_prices"
+                " WHERE crop_name = ? ORDER BY date DESC, id DESC LIMIT 1",
+                (crop_name,),
+            )
+        return self._run(
+            "SELECT id, crop_name, buyer_id, date, price_per_kg FROM market_prices"
+            " WHERE crop_name = ? AND buyer_id = ? ORDER BY date DESC, id DESC LIMIT 1",
+            (crop_name, buyer_id),
+        )
+
+    # -------- LATEST MARKET PRICES (summary, one row per crop and buyer) --------
+    def upsert_latest_price(self, crop_name, buyer_id, price_id, date, price_per_kg):
+        return self._run(
+            "INSERT INTO latest_market_prices (crop_name, buyer_id, price_id, date, price_per_kg)"
+            " VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT (crop_name, buyer_id) DO UPDATE SET"
+            " price_id = excluded.price_id, date = excluded.date, price_per_kg = excluded.price_per_kg"
+            " RETURNING *",
+            (crop_name, buyer_id, price_id, date, price_per_kg),
+        )
+
+    def delete_latest_price(self, crop_name, buyer_id):
+        return self._run(
+            "DELETE FROM latest_market_prices WHERE crop_name = ? AND buyer_id = ? RETURNING *",
+            (crop_name, buyer_id),
+        )
+
+    def merge_latest_prices(self, pair_rows, crop_rows):
+        # Same statements as merge_latest_prices() in the README, in one transaction
+        columns = ("crop_name", "buyer_id", "price_id", "date", "price_per_kg")
+        newer = " WHERE (excluded.date, excluded.price_id) > (date, price_id)"
+        try:
+            with self._lock:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT INTO latest_market_prices (crop_name, buyer_id, price_id, date, price_per_kg)"
+                        " VALUES (?, ?, ?, ?, ?)"
+                        " ON CONFLICT (crop_name, buyer_id) DO UPDATE SET"
+                        " price_id = excluded.price_id, date = excluded.date, price_per_kg = excluded.price_per_kg" + newer,
+                        [tuple(row[c] for c in columns) for row in pair_rows],
+                    )
+                    self._conn.executemany(
+                        "INSERT INTO latest_crop_prices (crop_name, buyer_id, price_id, date, price_per_kg)"
+                        " VALUES (?, ?, ?, ?, ?)"
+                        " ON CONFLICT (crop_name) DO UPDATE SET"
+                        " buyer_id = excluded.buyer_id, price_id = excluded.price_id, date = excluded.date,"
+                        " price_per_kg = excluded.price_per_kg" + newer,
+                        [tuple(row[c] for c in columns) for row in crop_rows],
+                    )
+        except sqlite3.Error as exc:
+            return QueryResult(error=str(exc))
+        return QueryResult(count=len(pair_rows) + len(crop_rows))
+
+    def get_latest_prices(self, buyer_id=None, fields=None):
+        columns = select_columns("latest_market_prices", fields)
+        if buyer_id:
+            return self._run(f"SELECT {columns} FROM latest_market_prices WHERE buyer_id = ? ORDER BY crop_name", (buyer_id,))
+        return self._run(f"SELECT {columns} FROM latest_crop_prices ORDER BY crop_name")
+
+    # -------- LATEST CROP PRICES (summary, one row per crop over all buyers) --------
+    def upsert_latest_crop_price(self, crop_name, buyer_id, price_id, date, price_per_kg):
+        return self._run(
+            "INSERT INTO latest_crop_prices (crop_name, buyer_id, price_id, date, price_per_kg)"
+            " VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT (crop_name) DO UPDATE SET"
+            " buyer_id = excluded.buyer_id, price_id = excluded.price_id, date = excluded.date, price_per_kg = excluded.price_per_kg"
+            " RETURNING *",
+            (crop_name, buyer_id, price_id, date, price_per_kg),
+        )
+
+    def delete_latest_crop_price(self, crop_name):
+        return self._run("DELETE FROM latest_crop_prices WHERE crop_name = ? RETURNING *", (crop_name,))
+
+    # -------- NEGOTIATIONS --------
+    def add_negotiation(self, farmer_id, buyer_id, crop_name, quantity_kg, proposed_price, notes, last_actor_id=None):
+        return self._insert("negotiations", {
+            "farmer_id": farmer_id,
+            "buyer_id": buyer_id,
+            "crop_name": crop_name,
+            "quantity_kg": quantity_kg,
+            "proposed_price": proposed_price,
+            "notes": notes,
+            "status": "pending",
+            "version": 1,
+            "last_actor_id": last_actor_id
+        })
+
+    def get_negotiations_for_user(self, user_id, role, limit=None, after=None, order_by=None, status=None, fields=None):
+        where = ["buyer_id = ?"] if role == "buyer" else ["farmer_id = ?"]
+        params = [user_id]
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        return self._select_page("negotiations", where, params, order_by, limit, after, select_columns("negotiations", fields, order_by))
+
+    def get_negotiation(self, negotiation_id):
+        return self._run("SELECT * FROM negotiations WHERE id = ? LIMIT 1", (negotiation_id,))
+
+    def count_negotiations_by_status(self, user_id, role):
+        column = "buyer_id" if role == "buyer" else "farmer_id"
+        return self._run(f"SELECT status, COUNT(*) AS count FROM negotiations WHERE {column} = ? GROUP BY status", (user_id,))
+
+    def update_negotiation(self, negotiation_id, update_data, version=None, from_statuses=None, party_id=None, turn_of=None, last_actor_id=None):
+        where, params = [], []
+        if version is not None:
+            where.append("version = ?")
+            params.append(version)
+        if from_statuses:
+            where.append(f"status IN ({', '.join('?' for _ in from_statuses)})")
+            params += list(from_statuses)
+        if party_id is not None:
+            where.append("(farmer_id = ? OR buyer_id = ?)")
+            params += [party_id, party_id]
+        if turn_of is not None:
+            where.append("last_actor_id IS NOT ?")
+            params.append(turn_of)
+        if last_actor_id is not None:
+            where.append("last_actor_id = ?")
+            params.append(last_actor_id)
+        return self._update("negotiations", negotiation_id, update_data, where, params)
+
+    # -------- WEATHER --------
+    def add_weather(self, date, temperature, rainfall, humidity, temperature_c=None, rainfall_mm=None, humidity_pct=None):
+        return self._insert("weather", {
+            "date": date,
+            "temperature": temperature,
+            "rainfall": rainfall,
+            "humidity": humidity,
+            "temperature_c": temperature_c,
+            "rainfall_mm": rainfall_mm,
+            "humidity_pct": humidity_pct
+        })
+
+    def add_weather_bulk(self, rows):
+        return self._insert_many("weather", rows)
+
+    def get_weather(self, date: str = None, limit=None, after=None, order_by=None, date_from=None, date_to=None, fields=None):
+        where, params = [], []
+        for clause, value in (("date = ?", date), ("date >= ?", date_from), ("date <= ?", date_to)):
+            if value:
+                where.append(clause)
+                params.append(value)
+        return self._select_page("weather", where, params, order_by, limit, after, select_columns("weather", fields, order_by))
+
+    def weather_rollup(self, date_from=None, date_to=None, granularity="day"):
+        where, params = [], []
+        for clause, value in (("date >= ?", date_from), ("date <= ?", date_to)):
+            if value:
+                where.append(clause)
+                params.append(value)
+        sql = (
+            f"SELECT {ROLLUP_PERIODS[granularity]} AS period, COUNT(*) AS observations,"
+            " AVG(temperature_c) AS mean_temperature_c, SUM(rainfall_mm) AS total_rainfall_mm,"
+            " AVG(humidity_pct) AS mean_humidity_pct FROM weather"
+        )
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return self._run(sql + " GROUP BY period ORDER BY period", params)
+
+    def update_weather(self, weather_id, update_data: dict):
+        return self._update("weather", weather_id, update_data)
+
+    def delete_weather(self, weather_id):
+        return self._delete("weather", weather_id)
+
+    # -------- COUNTS --------
+    def count_crops_by_user(self, user_id):
+        return self._count("SELECT COUNT(*) FROM crops WHERE user_id = ?", (user_id,))
+
+    def count_market_prices(self):
+        return self._count("SELECT COUNT(*) FROM market_prices")
+
+    def count_weather(self):
+        return self._count("SELECT COUNT(*) FROM weather")
+
+    def count_farmers(self):
+        return self._count("SELECT COUNT(*) FROM users WHERE is_admin = 0")
+
+
+class AsyncSQLiteDatabaseManager:
+    """Awaitable facade over SQLiteDatabaseManager for the async operations.
+
+    Each query runs in a worker thread so the event loop never blocks on disk.
+    """
+
+    def __init__(self, path="smart_farming.db"):
+        self._sync = SQLiteDatabaseManager(path)
+
+    async def connect(self):
+        # The schema is created when the connection is opened
+        return None
+
+    def __getattr__(self, name):
+        method = getattr(self._sync, name)
+        if not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+
+        return call
@@ -0,0 +1,119 @@
+import contextvars
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Set TRACING_ENABLED=false to stop tracing requests
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() not in ("0", "false", "no")
+
+# Queries slower than this many milliseconds are logged with their arguments
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+# Longest argument list kept per query in logs
+MAX_ARGS_LENGTH = 200
+
+_current = contextvars.ContextVar("request_trace", default=None)
+
+
+def _describe(method, args, kwargs):
+    """'get_crops_by_user(7, limit=21)', shortened to MAX_ARGS_LENGTH."""
+    parts = [repr(arg) for arg in args] + [f"{k}={v!r}" for k, v in kwargs.items() if v is not None]
+    described = ", ".join(parts)
+    if len(described) > MAX_ARGS_LENGTH:
+        described = described[:MAX_ARGS_LENGTH - 3] + "..."
+    return f"{method}({described})"
+
+
+def _row_count(result):
+    count = getattr(result, "count", None)
+    if count is not None:
+        return count
+    data = getattr(result, "data", None)
+    return len(data) if isinstance(data, list) else None
+
+
+class Trace:
+    """Database calls made while serving one request."""
+
+    __slots__ = ("label", "started", "queries", "db_seconds", "_seen", "repeated")
+
+    def __init__(self, label):
+        self.label = label
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self._seen = {}
+        self.repeated = {}
+
+    def record(self, table, op, method, args, kwargs, seconds, result):
+        self.queries += 1
+        self.db_seconds += seconds
+        try:
+            key = (method, args, tuple(sorted(kwargs.items())))
+            seen = self._seen[key] = self._seen.get(key, 0) + 1
+            if seen > 1:
+                self.repeated[key] = seen
+        except TypeError:
+            # Unhashable arguments (bulk row lists) are never compared
+            pass
+        if seconds * 1000 >= SLOW_QUERY_MS:
+            logger.warning(
+                "slow query %.1fms %s.%s %s rows=%s during %s",
+                seconds * 1000, table, op, _describe(method, args, kwargs), _row_count(result), self.label,
+            )
+
+    def server_timing(self):
+        """Value for the Server-Timing header, measured up to now.
+
+        ``db`` adds up every query, so it can exceed ``total`` when the
+        request ran queries concurrently.
+        """
+        total = (time.perf_counter() - self.started) * 1000
+        return f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries", total;dur={total:.1f}'
+
+    def finish(self):
+        logger.debug("%s: %d queries, %.1fms in the database", self.label, self.queries, self.db_seconds * 1000)
+        for (method, args, kwargs), count in self.repeated.items():
+            logger.warning("repeated query %dx %s during %s", count, _describe(method, args, dict(kwargs)), self.label)
+
+
+def record_query(table, op, method, args, kwargs, seconds, result=None):
+    """Add one database call to the current request's trace, if there is one."""
+    trace = _current.get()
+    if trace is not None:
+        trace.record(table, op, method, args, kwargs, seconds, result)
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware that traces the database calls of each request.
+
+    Adds a ``Server-Timing`` header with the time spent in the database, the
+    number of round-trips and the time until the response started, logs
+    queries slower than SLOW_QUERY_MS and, once the request is done, any
+    query that was sent more than once with the same arguments.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            return await self.app(scope, receive, send)
+
+        trace = Trace(f"{scope['method']} {scope['path']}")
+        token = _current.set(trace)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", ()))
+                headers.append((b"server-timing", trace.server_timing().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            trace.finish()
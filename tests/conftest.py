@@ -0,0 +1,42 @@
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Every test runs against one throwaway SQLite file; set before src is imported
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="smart-farming-tests-"), "test.db")
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ.setdefault("SESSION_SECRET", "test-secret")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "API"))
+
+_phones = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def signup(client):
+    """Create a user and log in; returns (user_id, auth headers)."""
+
+    def signup(is_admin=False, password="secret"):
+        phone = f"test-{next(_phones)}"
+        res = client.post("/users", json={"name": phone, "phone": phone, "password": password, "is_admin": is_admin})
+        assert res.status_code == 200, res.text
+        res = client.post("/auth/login", json={"phone": phone, "password": password})
+        assert res.status_code == 200, res.text
+        return res.json()["data"]["id"], {"Authorization": f"Bearer {res.json()['token']}"}
+
+    return signup
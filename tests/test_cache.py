@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from src.async_logic import AsyncMarketOperations
+
+
+@pytest.fixture
+def buyer_id(signup):
+    return signup(is_admin=True)[0]
+
+
+def test_read_racing_a_write_is_not_cached(monkeypatch, buyer_id):
+    """A read that started before a write must not put its stale rows in the cache."""
+    market = AsyncMarketOperations()
+    read = market.db.get_market_prices
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def slow_read(*args, **kwargs):
+            result = await read(*args, **kwargs)
+            await gate.wait()
+            return result
+
+        monkeypatch.setattr(market.db, "get_market_prices", slow_read)
+        racing = asyncio.create_task(market.get_prices("cache-race"))
+        await asyncio.sleep(0.1)
+        assert (await market.add_price("cache-race", "2024-01-01", 10, buyer_id))["success"]
+        gate.set()
+        stale = await racing
+        monkeypatch.setattr(market.db, "get_market_prices", read)
+        return stale, await market.get_prices("cache-race")
+
+    stale, fresh = asyncio.run(scenario())
+    assert stale["data"] == []
+    assert [row["price_per_kg"] for row in fresh["data"]] == [10]
+
+
+def test_write_invalidates_cached_reads(buyer_id):
+    market = AsyncMarketOperations()
+
+    async def scenario():
+        assert (await market.add_price("cache-write", "2024-01-01", 10, buyer_id))["success"]
+        before = await market.get_prices("cache-write")
+        everything = await market.get_prices()
+        price_id = before["data"][0]["id"]
+        assert (await market.update_price(price_id, {"price_per_kg": 11}))["success"]
+        return before, everything, await market.get_prices("cache-write"), await market.get_prices()
+
+    before, everything, after, everything_after = asyncio.run(scenario())
+    assert [row["price_per_kg"] for row in before["data"]] == [10]
+    assert [row["price_per_kg"] for row in after["data"]] == [11]
+    assert after is not before and everything_after is not everything
+    assert any(row["crop_name"] == "cache-write" and row["price_per_kg"] == 11 for row in everything_after["data"])
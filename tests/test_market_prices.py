@@ -0,0 +1,62 @@
+import pytest
+
+
+@pytest.fixture
+def buyers(signup):
+    return signup(is_admin=True), signup(is_admin=True)
+
+
+def post_price(client, buyer, crop_name, date, price):
+    buyer_id, headers = buyer
+    res = client.post("/market_prices", json={"crop_name": crop_name, "date": date, "price_per_kg": price, "buyer_id": buyer_id}, headers=headers)
+    assert res.status_code == 200, res.text
+    return res.json()["data"][0]["id"]
+
+
+def latest(client, crop_name, buyer_id=None):
+    """Latest price of ``crop_name`` over all buyers, or of one buyer; None if there is none."""
+    params = {"buyer_id": buyer_id} if buyer_id else {}
+    res = client.get("/market_prices/latest", params=params)
+    assert res.status_code == 200, res.text
+    rows = [row for row in res.json()["data"] if row["crop_name"] == crop_name]
+    assert len(rows) <= 1
+    return rows[0]["price_per_kg"] if rows else None
+
+
+def test_latest_price_follows_updates(client, buyers):
+    first, second = buyers
+    post_price(client, first, "latest-update", "2024-01-01", 10)
+    newest = post_price(client, second, "latest-update", "2024-01-05", 12)
+    assert latest(client, "latest-update") == 12
+    assert latest(client, "latest-update", first[0]) == 10
+
+    res = client.put(f"/market_prices/{newest}", json={"data": {"price_per_kg": 13}}, headers=second[1])
+    assert res.status_code == 200, res.text
+    assert latest(client, "latest-update") == 13
+
+    # Moved before the other buyer's price, it is no longer the latest overall
+    res = client.put(f"/market_prices/{newest}", json={"data": {"date": "2023-12-31"}}, headers=second[1])
+    assert res.status_code == 200, res.text
+    assert latest(client, "latest-update") == 10
+    assert latest(client, "latest-update", second[0]) == 13
+
+
+def test_latest_price_follows_deletes(client, buyers):
+    first, second = buyers
+    older = post_price(client, first, "latest-delete", "2024-01-01", 10)
+    newest = post_price(client, second, "latest-delete", "2024-01-05", 12)
+
+    assert client.delete(f"/market_prices/{newest}", headers=second[1]).status_code == 200
+    assert latest(client, "latest-delete") == 10
+    assert latest(client, "latest-delete", second[0]) is None
+
+    assert client.delete(f"/market_prices/{older}", headers=first[1]).status_code == 200
+    assert latest(client, "latest-delete") is None
+
+
+def test_prices_of_other_buyers_cannot_be_changed(client, buyers):
+    first, second = buyers
+    price_id = post_price(client, first, "latest-owner", "2024-01-01", 10)
+    assert client.put(f"/market_prices/{price_id}", json={"data": {"price_per_kg": 1}}, headers=second[1]).status_code == 404
+    assert client.delete(f"/market_prices/{price_id}", headers=second[1]).status_code == 404
+    assert latest(client, "latest-owner") == 10
@@ -0,0 +1,39 @@
+import pytest
+
+
+@pytest.fixture
+def negotiation(client, signup):
+    farmer_id, farmer = signup()
+    buyer_id, buyer = signup(is_admin=True)
+    res = client.post("/negotiations", json={"farmer_id": farmer_id, "buyer_id": buyer_id, "crop_name": "rice", "quantity_kg": 100, "proposed_price": 20}, headers=farmer)
+    assert res.status_code == 200, res.text
+    return res.json()["data"][0], farmer, buyer
+
+
+def test_stale_version_is_a_conflict(client, negotiation):
+    row, farmer, buyer = negotiation
+    res = client.put(f"/negotiations/{row['id']}", json={"data": {"status": "countered", "proposed_price": 22}, "version": row["version"]}, headers=buyer)
+    assert res.status_code == 200, res.text
+    assert res.json()["data"][0]["version"] == row["version"] + 1
+
+    # The farmer still holds the version read before the counter-offer
+    res = client.put(f"/negotiations/{row['id']}", json={"data": {"status": "accepted"}, "version": row["version"]}, headers=farmer)
+    assert res.status_code == 409
+    assert "reload" in res.json()["detail"]
+
+    res = client.put(f"/negotiations/{row['id']}", json={"data": {"status": "accepted"}, "version": row["version"] + 1}, headers=farmer)
+    assert res.status_code == 200, res.text
+    assert res.json()["data"][0]["status"] == "accepted"
+
+
+def test_a_party_cannot_answer_its_own_offer(client, negotiation):
+    row, farmer, _ = negotiation
+    res = client.put(f"/negotiations/{row['id']}", json={"data": {"status": "accepted"}, "version": row["version"]}, headers=farmer)
+    assert res.status_code == 409
+
+
+def test_outsiders_do_not_see_the_negotiation(client, signup, negotiation):
+    row, _, _ = negotiation
+    _, stranger = signup()
+    res = client.put(f"/negotiations/{row['id']}", json={"data": {"status": "rejected"}, "version": row["version"]}, headers=stranger)
+    assert res.status_code == 404
@@ -0,0 +1,63 @@
+import pytest
+
+SOW_DATES = ["2024-01-02", None, "2024-01-01", None, "2024-01-02"]
+
+
+@pytest.fixture
+def crops(client, signup):
+    user_id, headers = signup()
+    ids = []
+    for number, sow_date in enumerate(SOW_DATES, 1):
+        crop = {"user_id": user_id, "crop_name": f"crop-{number}"}
+        if sow_date:
+            crop["sow_date"] = sow_date
+        res = client.post("/crops", json=crop, headers=headers)
+        assert res.status_code == 200, res.text
+        ids.append(res.json()["data"][0]["id"])
+    return user_id, headers, ids
+
+
+def walk(client, user_id, headers, order_by, limit):
+    """Names of every crop, following next_cursor one page at a time."""
+    names, after = [], None
+    while True:
+        params = {"order_by": order_by, "limit": limit}
+        if after:
+            params["after"] = after
+        res = client.get(f"/crops/{user_id}", params=params, headers=headers)
+        assert res.status_code == 200, res.text
+        page = res.json()
+        assert len(page["data"]) <= limit
+        names += [row["crop_name"] for row in page["data"]]
+        after = page["next_cursor"]
+        if not after:
+            return names
+
+
+@pytest.mark.parametrize("limit", [1, 2, 10])
+def test_nulls_come_last_ascending(client, crops, limit):
+    user_id, headers, _ = crops
+    # Ties on sow_date are broken by id, and the NULLs follow every date
+    assert walk(client, user_id, headers, "sow_date", limit) == ["crop-3", "crop-1", "crop-5", "crop-2", "crop-4"]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 10])
+def test_nulls_come_first_descending(client, crops, limit):
+    user_id, headers, _ = crops
+    assert walk(client, user_id, headers, "-sow_date", limit) == ["crop-4", "crop-2", "crop-5", "crop-1", "crop-3"]
+
+
+def test_cursor_survives_a_deleted_row(client, crops):
+    user_id, headers, ids = crops
+    res = client.get(f"/crops/{user_id}", params={"order_by": "sow_date", "limit": 3}, headers=headers)
+    after = res.json()["next_cursor"]
+    # crop-5 ended the first page; the next one still starts after it
+    assert client.delete(f"/crops/{ids[4]}", headers=headers).status_code == 200
+    res = client.get(f"/crops/{user_id}", params={"order_by": "sow_date", "limit": 3, "after": after}, headers=headers)
+    assert [row["crop_name"] for row in res.json()["data"]] == ["crop-2", "crop-4"]
+
+
+def test_unknown_order_column_is_rejected(client, crops):
+    user_id, headers, _ = crops
+    res = client.get(f"/crops/{user_id}", params={"order_by": "fertilizer"}, headers=headers)
+    assert res.status_code == 400
@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+from src.sessions import SessionStore
+
+USER = {"id": 7, "is_admin": False}
+
+
+def test_logout_revokes_only_that_token(client):
+    client.post("/users", json={"name": "two logins", "phone": "two-logins", "password": "secret"})
+    first, second = (client.post("/auth/login", json={"phone": "two-logins", "password": "secret"}).json() for _ in range(2))
+    user_id = first["data"]["id"]
+    headers = {"Authorization": f"Bearer {first['token']}"}
+    other = {"Authorization": f"Bearer {second['token']}"}
+
+    assert client.get(f"/crops/{user_id}", headers=headers).status_code == 200
+    assert client.post("/auth/logout", headers=headers).status_code == 200
+    assert client.get(f"/crops/{user_id}", headers=headers).status_code == 401
+    assert client.post("/auth/logout", headers=headers).status_code == 401
+    assert client.get(f"/crops/{user_id}", headers=other).status_code == 200
+
+
+def test_password_change_ends_every_session(client, signup):
+    user_id, headers = signup()
+    res = client.put(f"/users/{user_id}", json={"data": {"password": "changed"}}, headers=headers)
+    assert res.status_code == 200, res.text
+    assert client.get(f"/crops/{user_id}", headers=headers).status_code == 401
+
+
+def test_missing_or_forged_token_is_refused(client, signup):
+    user_id, headers = signup()
+    assert client.get(f"/crops/{user_id}").status_code == 401
+    payload, _, signature = headers["Authorization"].partition(".")
+    forged = {"Authorization": f"{payload}.{signature[::-1]}"}
+    assert client.get(f"/crops/{user_id}", headers=forged).status_code == 401
+
+
+def test_token_expires_after_ttl(monkeypatch):
+    store = SessionStore(secret="s", ttl=60, shared=False)
+    token = store.issue(USER)
+    assert asyncio.run(store.resolve(token)).user_id == 7
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert asyncio.run(store.resolve(token)) is None
+    # Also when the identity is not cached, e.g. on another worker
+    assert asyncio.run(SessionStore(secret="s", ttl=60, shared=False).resolve(token)) is None
+
+
+def test_revoked_token_stays_revoked():
+    store = SessionStore(secret="s", ttl=60, shared=False)
+    token, other = store.issue(USER), store.issue(USER)
+    assert asyncio.run(store.revoke(token))
+    assert asyncio.run(store.resolve(token)) is None
+    assert asyncio.run(store.resolve(other)) is not None
+    assert not asyncio.run(store.revoke(token))
+
+
+def test_revoke_user_spares_later_sessions():
+    store = SessionStore(secret="s", ttl=60, shared=False)
+    before = store.issue(USER)
+    asyncio.run(store.revoke_user(USER["id"]))
+    time.sleep(0.01)
+    after = store.issue(USER)
+    assert asyncio.run(store.resolve(before)) is None
+    assert asyncio.run(store.resolve(after)) is not None